@@ -0,0 +1,405 @@
+import bisect
+import csv
+import hashlib
+import json
+import os
+import sys
+
+import base58
+
+from horizen_dump_scripts import instrumentation
+from horizen_dump_scripts.artifacts import iter_artifact, write_artifact
+from horizen_dump_scripts.eon_dump_stream import CHUNK_SIZE, iter_dump_chunks
+from horizen_dump_scripts.migrationhash import ZERO_HASH, update_hash_bytes
+from horizen_dump_scripts.utils import dict_raise_on_duplicates, pop_cli_option
+
+"""
+This script updates the restore artifacts created by zend_to_horizen and setup_eon2_json with the changes
+between two dumps, without converting the whole dumps again (e.g. from a rehearsal run to the final height).
+
+zend: artifact_delta zend <previous zend vault file> <output zend vault file>
+ - --diff <file>: csv file with the changed rows of the zend dump, with the format:
+    <zend address, previous balance in satoshi, new balance in satoshi>
+   The previous balance is empty for new addresses and the new balance is empty for removed addresses.
+ - or --old-dump <file> --new-dump <file>: the two zend dump csv files, the diff is calculated from them.
+   With --diff-out <file>, the calculated diff is saved in the format above.
+ - (optional) --mapping <file> --previous-automappings <file> --output-automappings <file>: the mapping file
+   used by zend_to_horizen, the eon vault automappings file created by the previous run and the updated one.
+   The mapping file must be the same used for the previous artifacts.
+
+eon: artifact_delta eon <previous eon file> <output eon file>
+ - --old-dump <file> --new-dump <file>: the two Eon dump json files
+ - --old-stakes <file> --new-stakes <file>: the two Eon stakes json files
+ - (optional) --old-automappings <file> --new-automappings <file>: the two eon vault automappings files
+
+Each changed row is converted to a balance delta for its artifact key (the decoded address for zend, also when
+more addresses collide on the same key, the mapped Ethereum address for the automapped ones, the account for
+eon), following the same rules of the full conversion. The deltas are merged with the previous artifact,
+adding, updating or removing (balance 0) its items, and the updated artifact is written.
+
+The migration hash of the updated artifact is printed. A hash index is saved next to each artifact
+(<artifact>.hashindex), with the hash calculated every HASH_INDEX_INTERVAL keys: when the index of the previous
+artifact is available, the hash is recalculated only from the last checkpoint before the first changed key.
+"""
+
+HASH_INDEX_SUFFIX = ".hashindex"
+HASH_INDEX_INTERVAL = 4096
+
+# 10 ^ 10
+SATOSHI_TO_WEI_MULTIPLIER = 10 ** 10
+NULL_ACCOUNT = "0x0000000000000000000000000000000000000000"
+
+
+def file_sha256(file_name):
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashIndex:
+    """Migration hash after every "interval" items of an artifact, as a list of (count, key, hash)."""
+    def __init__(self, is_eon, interval=HASH_INDEX_INTERVAL):
+        self.is_eon = is_eon
+        self.interval = interval
+        self.checkpoints = []
+
+    @staticmethod
+    def load(artifact_file_name, is_eon):
+        """Return the index of the artifact, or None if it is missing or was created for a different file."""
+        file_name = artifact_file_name + HASH_INDEX_SUFFIX
+        if not os.path.exists(file_name):
+            return None
+        with open(file_name, 'r') as index_file:
+            data = json.load(index_file)
+        if data["type"] != ("eon" if is_eon else "zend") or data["artifact_sha256"] != file_sha256(artifact_file_name):
+            print(f"Hash index {file_name} does not belong to {artifact_file_name}, ignored")
+            return None
+        index = HashIndex(is_eon, data["interval"])
+        index.checkpoints = [(count, key, bytes.fromhex(hash_hex)) for count, key, hash_hex in data["checkpoints"]]
+        return index
+
+    def write(self, artifact_file_name, final_hash, count):
+        with open(artifact_file_name + HASH_INDEX_SUFFIX, 'w') as index_file:
+            json.dump({
+                "type": "eon" if self.is_eon else "zend",
+                "artifact_sha256": file_sha256(artifact_file_name),
+                "interval": self.interval,
+                "count": count,
+                "final_hash": final_hash.hex(),
+                "checkpoints": [[count, key, checkpoint_hash.hex()] for count, key, checkpoint_hash in self.checkpoints],
+            }, index_file, indent=4)
+
+    def start_checkpoint(self, first_changed_key):
+        """Return the last checkpoint before the first changed key (all of them if no key changed), or None."""
+        if first_changed_key is None:
+            position = len(self.checkpoints)
+        else:
+            position = bisect.bisect_left([key for _, key, _ in self.checkpoints], first_changed_key)
+        return self.checkpoints[position - 1] if position > 0 else None
+
+
+def apply_deltas(items, deltas, counters):
+    """Merge the (key, balance) items, ordered by key, with the {key: balance delta} deltas."""
+    changes = sorted(deltas.items())
+    change_position = 0
+    for key, balance in items:
+        while change_position < len(changes) and changes[change_position][0] < key:
+            yield from _new_item(changes[change_position], counters)
+            change_position = change_position + 1
+        if change_position < len(changes) and changes[change_position][0] == key:
+            new_balance = balance + changes[change_position][1]
+            change_position = change_position + 1
+            if new_balance < 0:
+                raise ValueError(f"Balance of {key} becomes negative ({new_balance}), the diff does not match the artifact")
+            if new_balance == 0:
+                counters["removed"] = counters["removed"] + 1
+                continue
+            if new_balance != balance:
+                counters["updated"] = counters["updated"] + 1
+            yield key, new_balance
+        else:
+            yield key, balance
+    for change in changes[change_position:]:
+        yield from _new_item(change, counters)
+
+
+def _new_item(change, counters):
+    key, delta = change
+    if delta < 0:
+        raise ValueError(f"Key {key} is not in the artifact but its balance decreases, the diff does not match the artifact")
+    if delta > 0:
+        counters["added"] = counters["added"] + 1
+        yield key, delta
+
+
+def update_artifact(previous_file_name, output_file_name, deltas, is_eon):
+    """Write the previous artifact updated with the deltas and its hash index. Return the migration hash."""
+    deltas = {key: delta for key, delta in deltas.items() if delta != 0}
+    previous_index = HashIndex.load(previous_file_name, is_eon)
+    start = None
+    if previous_index is not None:
+        start = previous_index.start_checkpoint(min(deltas) if len(deltas) > 0 else None)
+    index = HashIndex(is_eon, previous_index.interval if previous_index is not None else HASH_INDEX_INTERVAL)
+    if start is not None:
+        # The items before the first changed key are the same, so are their checkpoints
+        index.checkpoints = [checkpoint for checkpoint in previous_index.checkpoints if checkpoint[0] <= start[0]]
+
+    counters = {"added": 0, "updated": 0, "removed": 0}
+    state = {"hash": ZERO_HASH if start is None else None, "count": 0, "valid": True}
+
+    def hashed_items(items):
+        for key, balance in items:
+            state["count"] = state["count"] + 1
+            if state["hash"] is None:
+                if state["count"] == start[0]:
+                    if key != start[1]:
+                        # The index does not belong to the previous artifact, the hash is calculated from the output
+                        state["valid"] = False
+                    state["hash"] = start[2]
+                yield key, balance
+                continue
+            state["hash"] = update_hash_bytes(state["hash"], key, balance, is_eon)
+            if state["count"] % index.interval == 0:
+                index.checkpoints.append((state["count"], key, state["hash"]))
+            yield key, balance
+
+    with instrumentation.stage("update_artifact") as update_artifact_stage:
+        # The output can be the previous artifact itself
+        temporary_file_name = output_file_name + ".tmp"
+        try:
+            write_artifact(temporary_file_name, hashed_items(apply_deltas(iter_artifact(previous_file_name), deltas, counters)))
+        except ValueError:
+            os.remove(temporary_file_name)
+            raise
+        os.replace(temporary_file_name, output_file_name)
+        update_artifact_stage.rows = state["count"]
+
+    final_hash = state["hash"]
+    if not state["valid"] or final_hash is None:
+        print(f"Hash index of {previous_file_name} does not match the artifact, calculating the whole hash")
+        with instrumentation.stage("hash") as hash_stage:
+            index.checkpoints = []
+            state["hash"] = ZERO_HASH
+            state["count"] = 0
+            for _ in hashed_items(iter_artifact(output_file_name)):
+                pass
+            final_hash = state["hash"]
+            hash_stage.rows = state["count"]
+    index.write(output_file_name, final_hash, state["count"])
+
+    print(f"{output_file_name}: {counters['added']} keys added, {counters['updated']} updated, {counters['removed']} removed, {state['count']} keys in total")
+    print(f"Migration hash of {output_file_name}: {final_hash.hex()}")
+    return final_hash
+
+
+def read_zend_dump(zend_dump_file_name):
+    """Return the {zend address: balance in satoshi} of a zend dump csv file."""
+    balances = {}
+    with open(zend_dump_file_name, 'r') as zend_dump_file:
+        for (zend_address, balance_in_satoshi, _) in csv.reader(zend_dump_file):
+            if zend_address in balances:
+                print(f"Found duplicated address: {zend_address} in {zend_dump_file_name}. Exiting")
+                sys.exit(1)
+            balances[zend_address] = int(balance_in_satoshi)
+    return balances
+
+
+def iter_zend_dump_diff(old_dump_file_name, new_dump_file_name):
+    """Yield the (zend address, old balance, new balance) rows that changed. None means missing in the dump."""
+    old_balances = read_zend_dump(old_dump_file_name)
+    processed_zend_accounts = set()
+    with open(new_dump_file_name, 'r') as new_dump_file:
+        for (zend_address, balance_in_satoshi, _) in csv.reader(new_dump_file):
+            if zend_address in processed_zend_accounts:
+                print(f"Found duplicated address: {zend_address} in {new_dump_file_name}. Exiting")
+                sys.exit(1)
+            processed_zend_accounts.add(zend_address)
+            old_balance = old_balances.pop(zend_address, None)
+            if old_balance != int(balance_in_satoshi):
+                yield zend_address, old_balance, int(balance_in_satoshi)
+    for zend_address, old_balance in old_balances.items():
+        yield zend_address, old_balance, None
+
+
+def iter_zend_diff_file(diff_file_name):
+    with open(diff_file_name, 'r') as diff_file:
+        for (zend_address, old_balance, new_balance) in csv.reader(diff_file):
+            yield zend_address, int(old_balance) if old_balance != "" else None, int(new_balance) if new_balance != "" else None
+
+
+def zend_vault_key(zend_address):
+    """Decoded address without prefix, as saved by zend_to_horizen."""
+    return "0x" + base58.b58decode_check(zend_address).hex()[4:]
+
+
+def zend_deltas(diff_rows, mapped_addresses, diff_out_writer=None):
+    """Convert the diff rows to the balance deltas in wei of the zend vault and eon vault automappings keys."""
+    zend_vault_deltas = {}
+    eon_vault_deltas = {}
+    changed_rows = 0
+    for zend_address, old_balance, new_balance in diff_rows:
+        changed_rows = changed_rows + 1
+        if diff_out_writer is not None:
+            diff_out_writer.writerow((zend_address, "" if old_balance is None else old_balance, "" if new_balance is None else new_balance))
+        delta = ((new_balance or 0) - (old_balance or 0)) * SATOSHI_TO_WEI_MULTIPLIER
+        if delta == 0 or zend_address.startswith("unknown"):
+            # Unknown addresses are not migrated
+            continue
+        if zend_address in mapped_addresses:
+            mapped_eth_address = mapped_addresses[zend_address].lower()
+            eon_vault_deltas[mapped_eth_address] = eon_vault_deltas.get(mapped_eth_address, 0) + delta
+        else:
+            try:
+                decoded_address = zend_vault_key(zend_address)
+            except Exception as e:
+                print(f"Error {e} while processing the changed address {zend_address}. Exiting.")
+                sys.exit(1)
+            # Addresses colliding on the same decoded address add up their deltas
+            zend_vault_deltas[decoded_address] = zend_vault_deltas.get(decoded_address, 0) + delta
+    print(f"Changed zend dump rows: {changed_rows}")
+    return zend_vault_deltas, eon_vault_deltas
+
+
+def read_eon_accounts(eon_dump_file_name, accounts_filter=None):
+    """Return the {account: (balance, is contract)} of an Eon dump, parsed incrementally.
+    If accounts_filter is provided, only the accounts in it are returned."""
+    accounts = {}
+    with open(eon_dump_file_name, 'rb') as eon_dump_file:
+        for account, account_data in iter_dump_chunks(iter(lambda: eon_dump_file.read(CHUNK_SIZE), b"")):
+            account = account.lower()
+            if accounts_filter is None or account in accounts_filter:
+                accounts[account] = (int(account_data['balance']), 'code' in account_data)
+    return accounts
+
+
+def read_json_balances(file_name):
+    if file_name is None:
+        return {}
+    with open(file_name, 'r') as json_file:
+        data = json.load(json_file, object_pairs_hook=dict_raise_on_duplicates)
+    balances = {}
+    for account, amount in data.items():
+        balances[account.lower()] = balances.get(account.lower(), 0) + amount
+    return balances
+
+
+def eon_account_value(account, dump_entry, stake, mapped_amount):
+    """Balance of the account in the eon artifact, with the same rules of setup_eon2_json."""
+    value = mapped_amount
+    is_contract = dump_entry is not None and dump_entry[1]
+    if not is_contract and account != NULL_ACCOUNT:
+        if dump_entry is not None:
+            value = value + dump_entry[0]
+        value = value + stake
+    return value
+
+
+def eon_deltas(old_dump_file_name, new_dump_file_name, old_stakes, new_stakes, old_automappings, new_automappings):
+    changed_accounts = {account for account in old_stakes.keys() | new_stakes.keys() if old_stakes.get(account, 0) != new_stakes.get(account, 0)}
+    changed_accounts.update(account for account in old_automappings.keys() | new_automappings.keys()
+                            if old_automappings.get(account, 0) != new_automappings.get(account, 0))
+
+    with instrumentation.stage("load_old_dump") as load_old_dump_stage:
+        old_accounts = read_eon_accounts(old_dump_file_name)
+        load_old_dump_stage.rows = len(old_accounts)
+
+    # (old entry, new entry) of the accounts with a changed dump entry, or with changed stakes or automappings
+    entries = {}
+    with open(new_dump_file_name, 'rb') as new_dump_file, instrumentation.stage("diff_dump") as diff_dump_stage:
+        for account, account_data in iter_dump_chunks(iter(lambda: new_dump_file.read(CHUNK_SIZE), b"")):
+            account = account.lower()
+            new_entry = (int(account_data['balance']), 'code' in account_data)
+            old_entry = old_accounts.pop(account, None)
+            if old_entry != new_entry or account in changed_accounts:
+                entries[account] = (old_entry, new_entry)
+            diff_dump_stage.rows = diff_dump_stage.rows + 1
+    for account, old_entry in old_accounts.items():
+        entries[account] = (old_entry, None)
+    print(f"Changed Eon dump accounts: {sum(1 for old_entry, new_entry in entries.values() if old_entry != new_entry)}")
+
+    deltas = {}
+    for account in changed_accounts | entries.keys():
+        old_entry, new_entry = entries.get(account, (None, None))
+        old_value = eon_account_value(account, old_entry, old_stakes.get(account, 0), old_automappings.get(account, 0))
+        new_value = eon_account_value(account, new_entry, new_stakes.get(account, 0), new_automappings.get(account, 0))
+        if new_value != old_value:
+            deltas[account] = new_value - old_value
+    return deltas
+
+
+def update_zend(previous_file_name, output_file_name, options):
+    mapped_addresses = {}
+    if options["mapping"] is not None:
+        with open(options["mapping"], 'r') as mapping_file:
+            mapped_addresses = json.load(mapping_file, object_pairs_hook=dict_raise_on_duplicates)
+
+    with instrumentation.stage("diff") as diff_stage:
+        if options["diff"] is not None:
+            diff_rows = iter_zend_diff_file(options["diff"])
+        else:
+            diff_rows = iter_zend_dump_diff(options["old_dump"], options["new_dump"])
+        if options["diff_out"] is not None:
+            with open(options["diff_out"], 'w', newline='') as diff_out_file:
+                zend_vault_deltas, eon_vault_deltas = zend_deltas(diff_rows, mapped_addresses, csv.writer(diff_out_file))
+        else:
+            zend_vault_deltas, eon_vault_deltas = zend_deltas(diff_rows, mapped_addresses)
+        diff_stage.rows = len(zend_vault_deltas) + len(eon_vault_deltas)
+
+    update_artifact(previous_file_name, output_file_name, zend_vault_deltas, False)
+    if options["output_automappings"] is not None:
+        update_artifact(options["previous_automappings"], options["output_automappings"], eon_vault_deltas, True)
+
+
+def update_eon(previous_file_name, output_file_name, options):
+    deltas = eon_deltas(options["old_dump"], options["new_dump"],
+                        read_json_balances(options["old_stakes"]), read_json_balances(options["new_stakes"]),
+                        read_json_balances(options["old_automappings"]), read_json_balances(options["new_automappings"]))
+    update_artifact(previous_file_name, output_file_name, deltas, True)
+
+
+def valid_options(artifact_type, options):
+    def all_or_none(*names):
+        return len({options[name] is None for name in names}) == 1
+
+    if artifact_type == "zend":
+        # Either the diff file or the two dumps
+        return (options["diff"] is None) != (options["old_dump"] is None or options["new_dump"] is None) and \
+            all_or_none("old_dump", "new_dump") and all_or_none("mapping", "previous_automappings", "output_automappings") and \
+            options["old_stakes"] is None and options["new_stakes"] is None
+    return None not in (options["old_dump"], options["new_dump"], options["old_stakes"], options["new_stakes"]) and \
+        all_or_none("old_automappings", "new_automappings") and options["diff"] is None
+
+
+def print_usage():
+    print(
+        "Usage: \n"
+        "      artifact_delta zend <previous zend vault file> <output zend vault file> (--diff <file> | --old-dump <file> --new-dump <file> [--diff-out <file>]) [--mapping <file> --previous-automappings <file> --output-automappings <file>]\n"
+        "      artifact_delta eon <previous eon file> <output eon file> --old-dump <file> --new-dump <file> --old-stakes <file> --new-stakes <file> [--old-automappings <file> --new-automappings <file>]\n"
+    )
+
+
+def main():
+    instrumentation.setup("artifact_delta")
+    options = {
+        option_name: pop_cli_option("--" + option_name.replace("_", "-"))
+        for option_name in ("diff", "diff_out", "old_dump", "new_dump", "old_stakes", "new_stakes", "old_automappings",
+                            "new_automappings", "mapping", "previous_automappings", "output_automappings")
+    }
+
+    if len(sys.argv) != 4 or sys.argv[1] not in {"eon", "zend"} or not valid_options(sys.argv[1], options):
+        print_usage()
+        sys.exit(1)
+
+    artifact_type = sys.argv[1]
+    previous_file_name = sys.argv[2]
+    output_file_name = sys.argv[3]
+    try:
+        if artifact_type == "zend":
+            update_zend(previous_file_name, output_file_name, options)
+        else:
+            update_eon(previous_file_name, output_file_name, options)
+    except ValueError as e:
+        print(f"{e}. Exiting.")
+        sys.exit(1)
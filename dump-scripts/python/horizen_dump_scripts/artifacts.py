@@ -0,0 +1,99 @@
+import json
+from json.encoder import encode_basestring_ascii
+
+from horizen_dump_scripts.utils import dict_raise_on_duplicates
+
+"""
+Helpers for reading and writing the restore artifacts created by zend_to_horizen and setup_eon2_json.
+
+The artifacts are json objects with "key": balance items, ordered by key, written with indent=4, so each item
+is on its own line. The migration hash signers calculate depends on these files, so write_artifact() must
+produce exactly the same bytes as json.dump(collections.OrderedDict(sorted_items), file, indent=4).
+It formats the already sorted items directly, without building an intermediate dict and without the pure
+Python iterencode path used by json.dump, and writes them in large chunks.
+
+iter_artifact() streams the items line by line, without loading the whole file in memory.
+If the file is not in this format (e.g. it was reformatted), the whole file is loaded and sorted instead.
+"""
+
+ITEM_PREFIX = '    "'
+ITEM_SEPARATOR = '": '
+ITEMS_PER_WRITE = 16384
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def write_artifact(file_name, sorted_items):
+    """Write the (key, balance) items, already ordered by key, with the same format of json.dump(indent=4)."""
+    with open(file_name, "w", buffering=WRITE_BUFFER_SIZE) as artifact_file:
+        lines = []
+        separator = "{\n    "
+        for key, value in sorted_items:
+            # int.__repr__ is what json uses for int values
+            lines.append(encode_basestring_ascii(key) + ": " + int.__repr__(value))
+            if len(lines) == ITEMS_PER_WRITE:
+                artifact_file.write(separator + ",\n    ".join(lines))
+                separator = ",\n    "
+                lines = []
+        if len(lines) > 0:
+            artifact_file.write(separator + ",\n    ".join(lines))
+            separator = ",\n    "
+        if separator == "{\n    ":
+            artifact_file.write("{}")
+        else:
+            artifact_file.write("\n}")
+
+
+def _parse_item_line(line):
+    if not line.startswith(ITEM_PREFIX):
+        raise ValueError(f"Unexpected line: {line!r}")
+    key, separator, value = line[len(ITEM_PREFIX):].partition(ITEM_SEPARATOR)
+    if separator == "":
+        raise ValueError(f"Unexpected line: {line!r}")
+    if value.endswith(","):
+        value = value[:-1]
+    return key, int(value)
+
+
+def _is_end_line(line):
+    return line.rstrip() == "}"
+
+
+def _check_end_of_file(artifact_file):
+    """Only whitespace is accepted after the closing brace."""
+    if artifact_file.read().strip() != "":
+        raise ValueError("Unexpected data after the end of the artifact")
+
+
+def _is_formatted_artifact(file_name):
+    with open(file_name, 'r') as artifact_file:
+        first_line = artifact_file.readline().rstrip("\r\n")
+        second_line = artifact_file.readline()
+    return first_line == "{}" or (first_line == "{" and (second_line.startswith(ITEM_PREFIX) or _is_end_line(second_line)))
+
+
+def _iter_formatted_artifact(artifact_file):
+    if artifact_file.readline().rstrip("\r\n") == "{}":
+        _check_end_of_file(artifact_file)
+        return
+    previous_key = None
+    for line in artifact_file:
+        if _is_end_line(line):
+            _check_end_of_file(artifact_file)
+            return
+        key, value = _parse_item_line(line.rstrip("\r\n"))
+        if previous_key is not None and key <= previous_key:
+            raise ValueError(f"Key {key} is not ordered or duplicated")
+        previous_key = key
+        yield key, value
+    raise ValueError("Unexpected end of file")
+
+
+def iter_artifact(file_name):
+    """Yield the (key, balance) items of a restore artifact, ordered by key."""
+    if _is_formatted_artifact(file_name):
+        with open(file_name, 'r') as artifact_file:
+            yield from _iter_formatted_artifact(artifact_file)
+    else:
+        with open(file_name, 'r') as artifact_file:
+            data = json.load(artifact_file, object_pairs_hook=dict_raise_on_duplicates)
+        yield from sorted(data.items())
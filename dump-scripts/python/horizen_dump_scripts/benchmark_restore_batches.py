@@ -0,0 +1,285 @@
+import itertools
+import json
+import os
+import sys
+import time
+
+from web3 import Web3
+
+from horizen_dump_scripts import instrumentation
+from horizen_dump_scripts.artifacts import iter_artifact
+from horizen_dump_scripts.migrationhash import ZERO_HASH, update_hash_bytes
+from horizen_dump_scripts.utils import pop_cli_option
+
+"""
+This script measures the gas used by the restore transactions for different batch sizes, to choose the batch
+sizes of the restoreEON and restoreZEND tasks.
+It takes as input:
+ - the type of the artifact (eon or zend)
+ - the artifact json file (eon.json or zend.json, e.g. from the snapshots folder)
+ - the rpc url of a local development node (hardhat node, anvil, ...) with an unlocked funded account
+ - the hardhat artifacts folder of the erc20-migration project (erc20-migration/artifacts after "npx hardhat compile")
+ - (optional) --batch-sizes <n>[,<n>...]: batch sizes to measure (default 100,250,500,1000)
+ - (optional) --rounds <n>: number of batches sent for each batch size (default 3)
+ - (optional) --offset <n>: index of the first account of the artifact used (default 0)
+ - (optional) --block-gas-limit <n>: block gas limit used for the recommendation (default: gas limit of the latest block)
+ - (optional) --output <file>: json file where all the measurements and the recommendations are saved
+
+For each batch size, new ZenToken and vault contracts are deployed, the cumulative hash checkpoint is set to the
+hash of the replayed accounts and "rounds" batches of the artifact accounts are inserted with batchInsert.
+For eon, the same number of distribute(batch size) transactions is sent too.
+For each transaction the gas used, the calldata size and the wall time (from sending to receipt) are measured.
+The gas used is modelled as fixed cost + cost per account, with a least squares fit on the most expensive batch
+of each size, and the recommended batch size is the largest one whose transaction fills at most
+BLOCK_GAS_FILL_RATIO of the block gas limit and whose calldata is smaller than MAX_TX_SIZE.
+"""
+
+DEFAULT_BATCH_SIZES = "100,250,500,1000"
+DEFAULT_ROUNDS = 3
+
+# The transactions are not sent at the full block gas limit, to leave room for the gas price fluctuations of
+# the other transactions in the block and for the variance between batches
+BLOCK_GAS_FILL_RATIO = 0.9
+# Transactions larger than this size are rejected by the geth based nodes
+MAX_TX_SIZE = 128 * 1024
+# Size of the transaction fields other than the calldata (nonce, fees, gas, to, value, signature, ...)
+TX_ENVELOPE_SIZE = 200
+
+EON_VAULT_CONTRACT_NAME = "EONBackupVault"
+ZEND_VAULT_CONTRACT_NAME = "ZendBackupVault"
+ZEN_TOKEN_CONTRACT_NAME = "ZenToken"
+BASE_MESSAGE = "CLAIM"
+
+
+class BatchMeasurement:
+    def __init__(self, function_name, batch_size, gas_used, calldata_size, wall_time, succeeded):
+        self.function_name = function_name
+        self.batch_size = batch_size
+        self.gas_used = gas_used
+        self.calldata_size = calldata_size
+        self.wall_time = wall_time
+        self.succeeded = succeeded
+
+    def to_dict(self):
+        return {
+            "function": self.function_name,
+            "batch_size": self.batch_size,
+            "gas_used": self.gas_used,
+            "gas_per_account": self.gas_used / self.batch_size if self.batch_size > 0 else None,
+            "calldata_size": self.calldata_size,
+            "wall_time": self.wall_time,
+            "succeeded": self.succeeded,
+        }
+
+
+def load_contract_artifact(artifacts_dir, contract_name):
+    artifact_file_name = os.path.join(artifacts_dir, "contracts", f"{contract_name}.sol", f"{contract_name}.json")
+    with open(artifact_file_name, 'r') as artifact_file:
+        artifact = json.load(artifact_file)
+    return artifact["abi"], artifact["bytecode"]
+
+
+class RestoreBenchmark:
+    def __init__(self, w3, artifacts_dir, block_gas_limit):
+        self.w3 = w3
+        self.admin = w3.eth.accounts[0]
+        self.block_gas_limit = block_gas_limit
+        self.contract_artifacts = {
+            contract_name: load_contract_artifact(artifacts_dir, contract_name)
+            for contract_name in (EON_VAULT_CONTRACT_NAME, ZEND_VAULT_CONTRACT_NAME, ZEN_TOKEN_CONTRACT_NAME)
+        }
+
+    def deploy(self, contract_name, *args):
+        abi, bytecode = self.contract_artifacts[contract_name]
+        tx_hash = self.w3.eth.contract(abi=abi, bytecode=bytecode).constructor(*args).transact({"from": self.admin})
+        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        if receipt["status"] != 1:
+            raise RuntimeError(f"Deploying {contract_name} failed")
+        return self.w3.eth.contract(address=receipt["contractAddress"], abi=abi)
+
+    def send(self, contract, function_name, *args):
+        """Send a transaction with the whole block gas limit available, so a too large batch fails instead of
+        being rejected by the gas estimation. Return the measurement of the transaction."""
+        data = contract.encode_abi(function_name, args=list(args))
+        calldata_size = (len(data) - 2) // 2
+        start_time = time.perf_counter()
+        try:
+            tx_hash = self.w3.eth.send_transaction(
+                {"from": self.admin, "to": contract.address, "data": data, "gas": self.block_gas_limit}
+            )
+            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            gas_used = receipt["gasUsed"]
+            succeeded = receipt["status"] == 1
+        except Exception as e:
+            print(f"{function_name} failed: {e}")
+            gas_used = self.block_gas_limit
+            succeeded = False
+        return gas_used, calldata_size, time.perf_counter() - start_time, succeeded
+
+    def deploy_contracts(self, vault_contract_name, checkpoint):
+        eon_vault = self.deploy(EON_VAULT_CONTRACT_NAME, self.admin)
+        zend_vault = self.deploy(ZEND_VAULT_CONTRACT_NAME, self.admin, BASE_MESSAGE)
+        # The vesting contracts are only used when both the vaults have completed the minting, that never happens here
+        token = self.deploy(ZEN_TOKEN_CONTRACT_NAME, "ZEN", "ZEN", eon_vault.address, zend_vault.address, self.admin, self.admin)
+        for vault in (eon_vault, zend_vault):
+            _, _, _, succeeded = self.send(vault, "setERC20", token.address)
+            if not succeeded:
+                raise RuntimeError("Setting the ERC20 address failed")
+        vault = eon_vault if vault_contract_name == EON_VAULT_CONTRACT_NAME else zend_vault
+        _, _, _, succeeded = self.send(vault, "setCumulativeHashCheckpoint", checkpoint)
+        if not succeeded:
+            raise RuntimeError("Setting the cumulative hash checkpoint failed")
+        return vault
+
+    def run(self, is_eon, accounts, batch_size, rounds):
+        """Restore "rounds" batches of batch_size accounts on new contracts. Return the list of measurements."""
+        accounts = accounts[:batch_size * rounds]
+        checkpoint = ZERO_HASH
+        for key, balance in accounts:
+            checkpoint = update_hash_bytes(checkpoint, key, balance, is_eon)
+        vault = self.deploy_contracts(EON_VAULT_CONTRACT_NAME if is_eon else ZEND_VAULT_CONTRACT_NAME, checkpoint)
+
+        measurements = []
+        cumulative_hash = ZERO_HASH
+        completed = True
+        for start in range(0, len(accounts), batch_size):
+            batch = accounts[start:start + batch_size]
+            address_values = []
+            for key, balance in batch:
+                cumulative_hash = update_hash_bytes(cumulative_hash, key, balance, is_eon)
+                address_values.append((Web3.to_checksum_address(key) if is_eon else bytes.fromhex(key[2:]), balance))
+            gas_used, calldata_size, wall_time, succeeded = self.send(vault, "batchInsert", cumulative_hash, address_values)
+            measurements.append(BatchMeasurement("batchInsert", len(batch), gas_used, calldata_size, wall_time, succeeded))
+            if not succeeded:
+                # The following batches would not match the cumulative hash
+                completed = False
+                break
+
+        if is_eon and completed:
+            for start in range(0, len(accounts), batch_size):
+                count = min(batch_size, len(accounts) - start)
+                gas_used, calldata_size, wall_time, succeeded = self.send(vault, "distribute", batch_size)
+                measurements.append(BatchMeasurement("distribute", count, gas_used, calldata_size, wall_time, succeeded))
+                if not succeeded:
+                    break
+        return measurements
+
+
+def fit_gas_model(measurements):
+    """Least squares fit of gas used = fixed gas + gas per account * batch size, on the most expensive
+    successful batch of each size. Return (fixed gas, gas per account)."""
+    max_gas_by_size = {}
+    for measurement in measurements:
+        if measurement.succeeded:
+            max_gas_by_size[measurement.batch_size] = max(max_gas_by_size.get(measurement.batch_size, 0), measurement.gas_used)
+    if len(max_gas_by_size) == 0:
+        return None
+    if len(max_gas_by_size) == 1:
+        # A single size only allows to estimate the average cost per account
+        batch_size, gas_used = next(iter(max_gas_by_size.items()))
+        return 0, gas_used / batch_size
+    count = len(max_gas_by_size)
+    mean_size = sum(max_gas_by_size.keys()) / count
+    mean_gas = sum(max_gas_by_size.values()) / count
+    covariance = sum((size - mean_size) * (gas - mean_gas) for size, gas in max_gas_by_size.items())
+    variance = sum((size - mean_size) ** 2 for size in max_gas_by_size.keys())
+    gas_per_account = covariance / variance
+    return mean_gas - gas_per_account * mean_size, gas_per_account
+
+
+def recommend_batch_size(measurements, block_gas_limit):
+    model = fit_gas_model(measurements)
+    if model is None:
+        return None
+    fixed_gas, gas_per_account = model
+    if gas_per_account <= 0:
+        return None
+    max_gas_size = int((block_gas_limit * BLOCK_GAS_FILL_RATIO - fixed_gas) / gas_per_account)
+    # The calldata grows linearly with the batch size too (distribute has a constant calldata)
+    calldata_sizes = {}
+    for measurement in measurements:
+        calldata_sizes[measurement.batch_size] = measurement.calldata_size
+    recommended_size = max_gas_size
+    if len(calldata_sizes) > 1:
+        min_size, max_size = min(calldata_sizes), max(calldata_sizes)
+        calldata_per_account = (calldata_sizes[max_size] - calldata_sizes[min_size]) / (max_size - min_size)
+        if calldata_per_account > 0:
+            fixed_calldata = calldata_sizes[min_size] - calldata_per_account * min_size
+            max_calldata_size = int((MAX_TX_SIZE - TX_ENVELOPE_SIZE - fixed_calldata) / calldata_per_account)
+            recommended_size = min(recommended_size, max_calldata_size)
+    return {
+        "fixed_gas": fixed_gas,
+        "gas_per_account": gas_per_account,
+        "block_gas_limit": block_gas_limit,
+        "recommended_batch_size": max(recommended_size, 0),
+    }
+
+
+def print_measurements(contract_function, measurements):
+    print(f"{contract_function}:")
+    print(f"  {'batch size':>10} {'gas used':>12} {'gas/account':>12} {'calldata':>10} {'wall time':>10}")
+    for measurement in measurements:
+        gas_per_account = measurement.gas_used / measurement.batch_size if measurement.batch_size > 0 else 0
+        status = "" if measurement.succeeded else " FAILED"
+        print(f"  {measurement.batch_size:>10} {measurement.gas_used:>12} {gas_per_account:>12.0f} "
+              f"{measurement.calldata_size:>10} {measurement.wall_time:>9.3f}s{status}")
+
+
+def main():
+    instrumentation.setup("benchmark_restore_batches")
+    batch_sizes = [int(size) for size in pop_cli_option("--batch-sizes", DEFAULT_BATCH_SIZES).split(",")]
+    rounds = int(pop_cli_option("--rounds", DEFAULT_ROUNDS))
+    offset = int(pop_cli_option("--offset", 0))
+    block_gas_limit = pop_cli_option("--block-gas-limit")
+    output_file_name = pop_cli_option("--output")
+
+    if len(sys.argv) != 5 or sys.argv[1] not in {"eon", "zend"}:
+        print(
+            "Usage: benchmark_restore_batches <eon|zend> <json file> <rpc url> <hardhat artifacts dir> [--batch-sizes <n>[,<n>...]] [--rounds <n>] [--offset <n>] [--block-gas-limit <n>] [--output <file>]"
+        )
+        sys.exit(1)
+
+    is_eon = sys.argv[1] == "eon"
+    artifact_file_name = sys.argv[2]
+    rpc_url = sys.argv[3]
+    artifacts_dir = sys.argv[4]
+
+    w3 = Web3(Web3.HTTPProvider(rpc_url))
+    if block_gas_limit is None:
+        block_gas_limit = w3.eth.get_block("latest")["gasLimit"]
+    else:
+        block_gas_limit = int(block_gas_limit)
+
+    with instrumentation.stage("load_accounts") as load_accounts_stage:
+        accounts = list(itertools.islice(iter_artifact(artifact_file_name), offset, offset + max(batch_sizes) * rounds))
+        load_accounts_stage.rows = len(accounts)
+    if len(accounts) < max(batch_sizes) * rounds:
+        print(f"Only {len(accounts)} accounts available from offset {offset}, the largest batches will be smaller")
+
+    benchmark = RestoreBenchmark(w3, artifacts_dir, block_gas_limit)
+    measurements_by_function = {}
+    with instrumentation.stage("benchmark") as benchmark_stage:
+        for batch_size in batch_sizes:
+            print(f"Measuring batch size {batch_size}")
+            for measurement in benchmark.run(is_eon, accounts, batch_size, rounds):
+                contract_function = f"{EON_VAULT_CONTRACT_NAME if is_eon else ZEND_VAULT_CONTRACT_NAME}.{measurement.function_name}"
+                measurements_by_function.setdefault(contract_function, []).append(measurement)
+                benchmark_stage.rows = benchmark_stage.rows + 1
+
+    report = {}
+    for contract_function, measurements in measurements_by_function.items():
+        print_measurements(contract_function, measurements)
+        recommendation = recommend_batch_size(measurements, block_gas_limit)
+        if recommendation is None:
+            print(f"  No successful batch, no recommendation for {contract_function}")
+        else:
+            print(f"  Fixed gas: {recommendation['fixed_gas']:.0f}, gas per account: {recommendation['gas_per_account']:.0f}")
+            print(f"  Recommended batch size for block gas limit {block_gas_limit}: {recommendation['recommended_batch_size']}")
+        report[contract_function] = {
+            "measurements": [measurement.to_dict() for measurement in measurements],
+            "recommendation": recommendation,
+        }
+
+    if output_file_name is not None:
+        with open(output_file_name, 'w') as output_file:
+            json.dump(report, output_file, indent=4)
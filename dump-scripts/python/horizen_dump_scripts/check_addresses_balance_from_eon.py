@@ -2,6 +2,7 @@ import os
 import sys
 import json
 
+from horizen_dump_scripts import instrumentation
 from horizen_dump_scripts.utils import dict_raise_on_duplicates
 """
 This python script requires the following input parameters:
@@ -49,20 +50,17 @@ def update_eon_dump(eon_dump_data, additional_data):
     return eon_dump_data
 
 
-def validate_eon_data(eon_dump_file_name, eon_stakes_file_name, zend_file_name, horizen2_file_name):
-    with open(eon_dump_file_name, 'r') as eon_dump_file, open(horizen2_file_name, 'r') as horizen2_file, open(eon_stakes_file_name, 'r') as eon_stakes_file:
-        eon_dump = json.load(eon_dump_file, object_pairs_hook=dict_raise_on_duplicates)
-        horizen2_eon_data = json.load(horizen2_file, object_pairs_hook=dict_raise_on_duplicates)
-
-        eon_stakes_data = json.load(eon_stakes_file, object_pairs_hook=dict_raise_on_duplicates)
+def check_eon_data(eon_dump_data, eon_stakes_data, zend_data, horizen2_eon_data, eon_dump_file_name, horizen2_file_name):
+    """Check the Horizen2 data against the accounts of the EON dump, updated in place with the stakes and the
+    Zend data (None if not used). The file names are only used in the messages."""
+    with instrumentation.stage("update_eon_dump") as update_eon_dump_stage:
+        eon_dump_data = update_eon_dump(eon_dump_data, eon_stakes_data)
 
-        eon_dump_data = update_eon_dump(eon_dump["accounts"], eon_stakes_data)
-
-        if zend_file_name != "":
-            with open(zend_file_name, 'r') as zend_file:
-                zend_data = json.load(zend_file, object_pairs_hook=dict_raise_on_duplicates)
-                eon_dump_data = update_eon_dump(eon_dump_data, zend_data)
+        if zend_data is not None:
+            eon_dump_data = update_eon_dump(eon_dump_data, zend_data)
+        update_eon_dump_stage.rows = len(eon_dump_data)
 
+    with instrumentation.stage("check") as check_stage:
         counter = 0
 
         for horizen2_eon_address, horizen2_eon_address_balance in horizen2_eon_data.items():
@@ -76,7 +74,7 @@ def validate_eon_data(eon_dump_file_name, eon_stakes_file_name, zend_file_name,
                 set_failed_execution()
                 print(f"EON address {horizen2_eon_address} present in Horizen2 file {horizen2_file_name} not found in EON dump data file {eon_dump_file_name}.")
 
-        
+    
         counter_inverse = 0
         for eon_address in eon_dump_data:
             if not(is_filtered_account(eon_address, eon_dump_data)):
@@ -84,12 +82,32 @@ def validate_eon_data(eon_dump_file_name, eon_stakes_file_name, zend_file_name,
             if eon_address not in horizen2_eon_data and not is_filtered_account(eon_address, eon_dump_data):
                 set_failed_execution()
                 print(f"EON address {eon_address} present in EON dump data file {eon_dump_file_name} not found in Horizen2 file {horizen2_file_name}.")
-        
+    
+        check_stage.rows = counter + counter_inverse
         assert counter > 0, "No account found in Horizen2 file"
         assert counter == counter_inverse, "Different number of accounts in EON dump data than in Horizen 2"
         print(f"checked {counter} EON addresses")
 
+
+def validate_eon_data(eon_dump_file_name, eon_stakes_file_name, zend_file_name, horizen2_file_name):
+    with open(eon_dump_file_name, 'r') as eon_dump_file, open(horizen2_file_name, 'r') as horizen2_file, open(eon_stakes_file_name, 'r') as eon_stakes_file:
+        with instrumentation.stage("load_inputs") as load_inputs_stage:
+            eon_dump = json.load(eon_dump_file, object_pairs_hook=dict_raise_on_duplicates)
+            horizen2_eon_data = json.load(horizen2_file, object_pairs_hook=dict_raise_on_duplicates)
+
+            eon_stakes_data = json.load(eon_stakes_file, object_pairs_hook=dict_raise_on_duplicates)
+            load_inputs_stage.rows = len(eon_dump["accounts"]) + len(horizen2_eon_data) + len(eon_stakes_data)
+
+            zend_data = None
+            if zend_file_name != "":
+                with open(zend_file_name, 'r') as zend_file:
+                    zend_data = json.load(zend_file, object_pairs_hook=dict_raise_on_duplicates)
+
+    check_eon_data(eon_dump["accounts"], eon_stakes_data, zend_data, horizen2_eon_data, eon_dump_file_name, horizen2_file_name)
+
 def main():
+    instrumentation.setup("check_addresses_balance_from_eon")
+
     if len(sys.argv) != 4 and len(sys.argv) != 5:
         print(
             "Usage: check_addresses_balance_from_eon <Eon dump file name> <Eon stakes file name> <Zend accounts file name> <Horizen2 file>"
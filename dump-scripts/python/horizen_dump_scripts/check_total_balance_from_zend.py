@@ -1,7 +1,11 @@
 import sys
 import csv
+import multiprocessing
 import os
 
+from horizen_dump_scripts import instrumentation
+from horizen_dump_scripts.utils import pop_cli_option
+
 """
 This python script will require the following input parameters
 - mainchain block height related to the mainchain dump
@@ -16,8 +20,14 @@ This python script will require the following input parameters
 It does the following actions:
 - calculate the total balance from the height parameter through the calculate_total_supply_from_height and
   remove_shielded_pool_and_sidechains_balance functions.
-- calculate
+- calculate the total balance from the zend dump
 - compare these 2 values, if the difference is above a certain threshold print an error
+
+With "--batch <file>", the check is done for many dumps, taken at different heights: the file is a csv file with
+the rows <mainchain block height>,<zend dump file path>,<EON sidechain balance> and the only other parameter is the
+network. The supplies of all the heights are calculated together, and the dumps are read in parallel by a pool of
+processes, one dump for each process ("--workers <n>", default number of cpus). A table with the difference of each
+row is printed, and the check fails if any difference is above the threshold.
 """
 
 """
@@ -38,33 +48,52 @@ of all the sidechains and this leads to a difference of 2385.75181127 ZEN.
 
 DIFFERENCE_THRESHOLD = 5000000 # difference threshold in satoshis
 
-def calculate_total_supply_from_height(height):
-    HALVING_INTERVAL = 840000
-    HZN_EARLY_HISTORY_CORRECTION_MAINNET = 238575181127
-    HZN_EARLY_HISTORY_CORRECTION_TESTNET = 4773904298
-    HZN_EARLY_HISTORY_CORRECTION = HZN_EARLY_HISTORY_CORRECTION_MAINNET
-    if sys.argv[4] == "testnet":
-        HZN_EARLY_HISTORY_CORRECTION = HZN_EARLY_HISTORY_CORRECTION_TESTNET
-    if height == 0:
-        return 0
-
-    tot_halvings = (height - 1) // HALVING_INTERVAL
+HALVING_INTERVAL = 840000
+INITIAL_BLOCK_REWARD = 1250000000  # block reward in satoshis
+MAX_HALVINGS = 32
+MAX_SUPPLY = 2100000000000000
+HZN_EARLY_HISTORY_CORRECTION_MAINNET = 238575181127
+HZN_EARLY_HISTORY_CORRECTION_TESTNET = 4773904298
 
-    if tot_halvings >= 32:
-        return 2100000000000000  # max supply reached
 
+def halving_schedule():
+    """Return, for each halving period, the supply at its first block and the block reward."""
+    schedule = []
     supply = 0
-    reward = 1250000000  # block reward in satoshis
-
-    while height > (HALVING_INTERVAL - 1):
+    reward = INITIAL_BLOCK_REWARD
+    for _ in range(MAX_HALVINGS + 1):
+        schedule.append((supply, reward))
         supply += HALVING_INTERVAL * reward
         # Reward is cut in half every 840,000 blocks (~ every 4 years)
         reward >>= 1
-        height -= HALVING_INTERVAL
+    return schedule
+
+
+HALVING_SCHEDULE = halving_schedule()
+
+
+def calculate_total_supplies(heights, network):
+    """Return the supply at each height, calculated in a single pass with the halving schedule."""
+    early_history_correction = HZN_EARLY_HISTORY_CORRECTION_MAINNET
+    if network == "testnet":
+        early_history_correction = HZN_EARLY_HISTORY_CORRECTION_TESTNET
+
+    supplies = []
+    for height in heights:
+        if height == 0:
+            supplies.append(0)
+        elif (height - 1) // HALVING_INTERVAL >= MAX_HALVINGS:
+            supplies.append(MAX_SUPPLY)  # max supply reached
+        else:
+            halvings = height // HALVING_INTERVAL
+            (period_start_supply, reward) = HALVING_SCHEDULE[halvings]
+            total_supply = period_start_supply + (height - halvings * HALVING_INTERVAL) * reward
+            supplies.append(total_supply - early_history_correction)
+    return supplies
 
-    total_supply = (supply + (height * reward))
-    corrected_total_supply = total_supply - HZN_EARLY_HISTORY_CORRECTION
-    return corrected_total_supply
+
+def calculate_total_supply_from_height(height, network):
+    return calculate_total_supplies([height], network)[0]
 
 """
 To compare the calculated balance from the balance from the zend dump we need to subtract:
@@ -73,7 +102,7 @@ To compare the calculated balance from the balance from the zend dump we need to
 - the balance of EON at the height of the dump, it can be retrieved with the following endpoint passing its sidechain ID:
   https://explorer.horizen.io/insight-api/scinfo/37a6ec6f308ef03488f7c2affe56215469d936194ff71c2fe3086aedb718a9fa
 """
-def remove_shielded_pool_and_sidechains_balance(balance):
+def remove_shielded_pool_and_sidechains_balance(balance, network, eon_sidechain_balance):
     # mainnet
     SHIELDED_POOL_BALANCE_MAINNET = 2444216819948
     # every sidechain except eon is considered ceased on mainnet for the purpose of this script
@@ -86,45 +115,130 @@ def remove_shielded_pool_and_sidechains_balance(balance):
 
     SHIELDED_POOL_BALANCE = SHIELDED_POOL_BALANCE_MAINNET
     CEASED_SIDECHAINS_BALANCE = CEASED_SIDECHAINS_BALANCE_MAINNET
-    if sys.argv[4] == "testnet":
+    if network == "testnet":
         SHIELDED_POOL_BALANCE = SHIELDED_POOL_BALANCE_TESTNET
         CEASED_SIDECHAINS_BALANCE = CEASED_SIDECHAINS_BALANCE_TESTNET
-    EON_SIDECHAIN_BALANCE = int(sys.argv[3])
-    corrected_balance = balance - SHIELDED_POOL_BALANCE - EON_SIDECHAIN_BALANCE - CEASED_SIDECHAINS_BALANCE
+    corrected_balance = balance - SHIELDED_POOL_BALANCE - eon_sidechain_balance - CEASED_SIDECHAINS_BALANCE
     return corrected_balance
 
-def retrieve_balance_from_zend_dump(dump_file_path):
+def sum_zend_dump(dump_file_path):
+    """Return the sum of the balances of the zend dump and its number of rows."""
     balance_from_dump = 0
     with open(dump_file_path, 'r') as file:
         csv_reader = csv.reader(file)
         for row in csv_reader:
             balance_from_dump += int(row[1])
+        return balance_from_dump, csv_reader.line_num
+
+def retrieve_balance_from_zend_dump(dump_file_path):
+    with instrumentation.stage("retrieve_balance_from_zend_dump") as retrieve_balance_stage:
+        (balance_from_dump, retrieve_balance_stage.rows) = sum_zend_dump(dump_file_path)
     return balance_from_dump
 
+def retrieve_balances_from_zend_dumps(dump_file_paths, workers):
+    """Return {dump file path: balance}, reading each dump in a different process."""
+    dump_file_paths = list(dict.fromkeys(dump_file_paths))
+    with multiprocessing.Pool(min(workers, len(dump_file_paths))) as pool, \
+            instrumentation.stage("retrieve_balances_from_zend_dumps") as retrieve_balances_stage:
+        results = pool.map(sum_zend_dump, dump_file_paths, chunksize=1)
+        retrieve_balances_stage.rows = sum(rows for _, rows in results)
+    return {dump_file_path: balance for dump_file_path, (balance, _) in zip(dump_file_paths, results)}
+
+def read_batch_file(batch_file_path):
+    """Return the (height, zend dump file path, EON sidechain balance) rows of the batch file."""
+    batch = []
+    with open(batch_file_path, 'r') as file:
+        for row in csv.reader(file):
+            if len(row) == 0:
+                continue
+            if len(row) != 3:
+                raise ValueError(f"Wrong row {row} in {batch_file_path}, expected <height>,<zend dump file>,<EON sidechain balance>")
+            batch.append((int(row[0]), row[1].strip(), int(row[2])))
+    if len(batch) == 0:
+        raise ValueError(f"No rows in {batch_file_path}")
+    return batch
+
+def calculate_balance_without_sidechains_and_shielded_pool(height, eon_sidechain_balance, network):
+    """Print and return the supply calculated at the height, without the sidechains and shielded pool balances."""
+    calculated_total_supply = calculate_total_supply_from_height(height, network)
+    print(f"Calculated mainchain balance at block {height} is {calculated_total_supply} satoshis")
+    total_supply_without_sidechains_and_shielded_pool = remove_shielded_pool_and_sidechains_balance(calculated_total_supply, network, eon_sidechain_balance)
+    print(f"Mainchain balance at block {height} without sidechains and shielded pool balance is {total_supply_without_sidechains_and_shielded_pool} satoshis")
+    return total_supply_without_sidechains_and_shielded_pool
+
+def compare_balance_from_zend_dump(total_supply_without_sidechains_and_shielded_pool, balance_from_dump):
+    """Compare the balance of the zend dump with the calculated supply. Return True if the difference is below the threshold."""
+    print(f"The balance from zend dump is {balance_from_dump} satoshis")
+
+    difference = abs(total_supply_without_sidechains_and_shielded_pool - balance_from_dump)
+    if difference >= DIFFERENCE_THRESHOLD:
+        print(f"Difference between calculated total supply and balance from zend dump is {difference} satoshis, higher than the defined threshold {DIFFERENCE_THRESHOLD}")
+        return False
+    print(f"Difference between calculated total supply and balance from zend dump is {difference} satoshis, below the defined threshold {DIFFERENCE_THRESHOLD}")
+    return True
+
+def check_total_balance(height, balance_from_dump, eon_sidechain_balance, network):
+    """Compare the balance of the zend dump with the supply calculated at the height. Return True if the difference is below the threshold."""
+    total_supply_without_sidechains_and_shielded_pool = calculate_balance_without_sidechains_and_shielded_pool(height, eon_sidechain_balance, network)
+    return compare_balance_from_zend_dump(total_supply_without_sidechains_and_shielded_pool, balance_from_dump)
+
+def check_total_balances(batch, balances_from_dumps, network):
+    """Check each (height, dump, EON sidechain balance) row of the batch and print a table of the differences.
+    Return True if all the differences are below the threshold."""
+    calculated_total_supplies = calculate_total_supplies([height for height, _, _ in batch], network)
+    successful = True
+    print("height,zend dump,EON sidechain balance,calculated balance,balance from zend dump,difference,result")
+    for (height, dump_file_path, eon_sidechain_balance), calculated_total_supply in zip(batch, calculated_total_supplies):
+        total_supply_without_sidechains_and_shielded_pool = remove_shielded_pool_and_sidechains_balance(calculated_total_supply, network, eon_sidechain_balance)
+        balance_from_dump = balances_from_dumps[dump_file_path]
+        difference = abs(total_supply_without_sidechains_and_shielded_pool - balance_from_dump)
+        result = "ok"
+        if difference >= DIFFERENCE_THRESHOLD:
+            result = "above threshold"
+            successful = False
+        print(f"{height},{dump_file_path},{eon_sidechain_balance},{total_supply_without_sidechains_and_shielded_pool},{balance_from_dump},{difference},{result}")
+    return successful
+
+def check_batch(batch_file_path, network, workers):
+    batch = read_batch_file(batch_file_path)
+    balances_from_dumps = retrieve_balances_from_zend_dumps([dump_file_path for _, dump_file_path, _ in batch], workers)
+    if not check_total_balances(batch, balances_from_dumps, network):
+        print(f"Some differences between calculated total supply and balance from zend dump are higher than the defined threshold {DIFFERENCE_THRESHOLD} satoshis")
+        return False
+    print(f"All the {len(batch)} differences between calculated total supply and balance from zend dump are below the defined threshold {DIFFERENCE_THRESHOLD} satoshis")
+    return True
+
 def main():
-    if len(sys.argv) != 5:
+    instrumentation.setup("check_total_balance_from_zend")
+    batch_file_path = pop_cli_option("--batch")
+    workers = int(pop_cli_option("--workers", os.cpu_count() or 1))
+
+    if len(sys.argv) != (2 if batch_file_path is not None else 5) or workers < 1:
         print(
-            "Usage: check_total_balance_from_zend <mainchain block height> <Zend dump file name> <EON sidechain balance> <mainnet||testnet>"
+            "Usage: check_total_balance_from_zend <mainchain block height> <Zend dump file name> <EON sidechain balance> <mainnet||testnet>\n"
+            "       check_total_balance_from_zend --batch <batch csv file> <mainnet||testnet> [--workers <n>]"
         )
         sys.exit(1)
-    if sys.argv[4] not in ["mainnet", "testnet"]:
-        print("The 4th command line argument has to be either 'mainnet' or 'testnet'.")
+    if sys.argv[-1] not in ["mainnet", "testnet"]:
+        print("The network command line argument has to be either 'mainnet' or 'testnet'.")
         sys.exit(1)
 
-    height = int(sys.argv[1])
-
-    calculated_total_supply = calculate_total_supply_from_height(height)
-    print(f"Calculated mainchain balance at block {height} is {calculated_total_supply} satoshis")
-    total_supply_without_sidechains_and_shielded_pool = remove_shielded_pool_and_sidechains_balance(calculated_total_supply)
-    print(f"Mainchain balance at block {height} without sidechains and shielded pool balance is {total_supply_without_sidechains_and_shielded_pool} satoshis")
+    if batch_file_path is not None:
+        try:
+            successful = check_batch(batch_file_path, sys.argv[1], workers)
+        except ValueError as e:
+            print(f"{e}. Exiting.")
+            sys.exit(1)
+        if not successful:
+            sys.exit(1)
+        return
 
+    height = int(sys.argv[1])
     zend_dump_file_path = sys.argv[2]
-    balance_from_dump = retrieve_balance_from_zend_dump(zend_dump_file_path)
-    print(f"The balance from zend dump is {balance_from_dump} satoshis")
+    eon_sidechain_balance = int(sys.argv[3])
+    network = sys.argv[4]
 
-    difference = abs(total_supply_without_sidechains_and_shielded_pool - balance_from_dump)
-    if difference >= DIFFERENCE_THRESHOLD:
-        print(f"Difference between calculated total supply and balance from zend dump is {difference} satoshis, higher than the defined threshold {DIFFERENCE_THRESHOLD}")
+    total_supply_without_sidechains_and_shielded_pool = calculate_balance_without_sidechains_and_shielded_pool(height, eon_sidechain_balance, network)
+    balance_from_dump = retrieve_balance_from_zend_dump(zend_dump_file_path)
+    if not compare_balance_from_zend_dump(total_supply_without_sidechains_and_shielded_pool, balance_from_dump):
         sys.exit(1)
-    else:
-        print(f"Difference between calculated total supply and balance from zend dump is {difference} satoshis, below the defined threshold {DIFFERENCE_THRESHOLD}")
@@ -0,0 +1,180 @@
+import csv
+import json
+import os
+import sys
+
+import base58
+
+from horizen_dump_scripts import instrumentation
+from horizen_dump_scripts.artifacts import iter_artifact
+from horizen_dump_scripts.eon_dump_stream import CHUNK_SIZE, iter_dump_chunks
+from horizen_dump_scripts.utils import dict_raise_on_duplicates, pop_cli_option
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+"""
+This script exports the dumps and the restore artifacts to Parquet files, so that they can be analysed with
+columnar tools (e.g. with columnar_query, pandas or duckdb) instead of a Python loop over the json and csv files.
+It requires the pyarrow package, installed with the "columnar" extra of this package.
+It takes as input the output directory and one or more of:
+ - --zend-dump <file>: the zend dump csv file. With --mapping <file>, the zend - Ethereum addresses mapping file,
+   the Ethereum address each zend address is mapped to is exported too
+ - --eon-dump <file>: the Eon dump file
+ - --eon-stakes <file>: the Eon stakes file created by get_all_forger_stakes
+ - --zend-vault <file>: the zend vault file created by zend_to_horizen
+ - --automappings <file>: the eon vault automappings file created by zend_to_horizen
+ - --horizen2 <file>: the Horizen2 eon file created by setup_eon2_json
+
+Each input is saved in a file of the output directory, with one row for each account:
+ - zend_dump.parquet: address, address_type (t1, t3, zn, zs, ... or unknown), prefix (hex), hash (the decoded
+   address without prefix, as in the zend vault file), balance, eth_address (only with --mapping)
+ - eon_accounts.parquet: address, balance, is_contract
+ - eon_stakes.parquet: address, balance
+ - zend_vault.parquet, automappings.parquet, horizen2.parquet: address, balance
+All the balances are in wei, saved as decimal128(38, 0), so they are never rounded. The inputs are streamed and
+written in row groups of ROW_GROUP_SIZE rows.
+"""
+
+ROW_GROUP_SIZE = 1 << 16
+SATOSHI_TO_WEI_MULTIPLIER = 10 ** 10
+
+# Network prefixes of the zend addresses, as in Mainnet_Prefix_List and Testnet_Prefix_List of zend_to_horizen
+ADDRESS_TYPES = {
+    "2089": "zn",
+    "1CB8": "t1",
+    "2096": "zs",
+    "1CBD": "t3",
+    "2098": "zt",
+    "1D25": "tm",
+    "2092": "zr",
+    "1CBA": "t2",
+}
+UNKNOWN_ADDRESS_TYPE = "unknown"
+
+BALANCE_TYPE = None if pa is None else pa.decimal128(38, 0)
+ACCOUNT_SCHEMA = None if pa is None else pa.schema([("address", pa.string()), ("balance", BALANCE_TYPE)])
+EON_ACCOUNT_SCHEMA = None if pa is None else pa.schema([
+    ("address", pa.string()), ("balance", BALANCE_TYPE), ("is_contract", pa.bool_())
+])
+ZEND_DUMP_SCHEMA = None if pa is None else pa.schema([
+    ("address", pa.string()), ("address_type", pa.string()), ("prefix", pa.string()), ("hash", pa.string()),
+    ("balance", BALANCE_TYPE)
+])
+
+
+def require_pyarrow():
+    if pa is None:
+        print("This script requires pyarrow, install it with: pip install \"horizen_dump_scripts[columnar]\"")
+        sys.exit(1)
+
+
+def write_rows(file_name, schema, rows):
+    """Write the rows, tuples with the values of the schema columns, in row groups. Return the number of rows."""
+    count = 0
+    with pq.ParquetWriter(file_name, schema) as writer:
+        columns = [[] for _ in schema.names]
+        for row in rows:
+            for column, value in zip(columns, row):
+                column.append(value)
+            if len(columns[0]) == ROW_GROUP_SIZE:
+                writer.write_batch(pa.record_batch(columns, schema=schema))
+                count = count + len(columns[0])
+                columns = [[] for _ in schema.names]
+        if len(columns[0]) > 0:
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+            count = count + len(columns[0])
+    return count
+
+
+def decode_zend_address(zend_address):
+    """Return the (address type, prefix, hash) of a zend address, as decoded by zend_to_horizen."""
+    if zend_address.startswith("unknown"):
+        return UNKNOWN_ADDRESS_TYPE, None, None
+    decoded_address = base58.b58decode_check(zend_address).hex()
+    # The prefix lists use upper case hex digits
+    prefix = decoded_address[:4].upper()
+    return ADDRESS_TYPES.get(prefix, UNKNOWN_ADDRESS_TYPE), prefix, "0x" + decoded_address[4:]
+
+
+def iter_zend_dump(zend_dump_file_name, mapped_addresses):
+    with open(zend_dump_file_name, 'r') as zend_dump_file:
+        for row in csv.reader(zend_dump_file):
+            zend_address = row[0]
+            try:
+                (address_type, prefix, decoded_hash) = decode_zend_address(zend_address)
+            except ValueError as e:
+                raise ValueError(f"Error {e} while decoding the zend address {zend_address}")
+            balance = int(row[1]) * SATOSHI_TO_WEI_MULTIPLIER
+            if mapped_addresses is None:
+                yield zend_address, address_type, prefix, decoded_hash, balance
+            else:
+                eth_address = mapped_addresses.get(zend_address)
+                yield zend_address, address_type, prefix, decoded_hash, balance, None if eth_address is None else eth_address.lower()
+
+
+def iter_eon_dump(eon_dump_file_name):
+    with open(eon_dump_file_name, 'rb') as eon_dump_file:
+        chunks = iter(lambda: eon_dump_file.read(CHUNK_SIZE), b"")
+        for address, account_data in iter_dump_chunks(chunks):
+            yield address.lower(), int(account_data['balance']), 'code' in account_data
+
+
+def iter_json_accounts(file_name):
+    with open(file_name, 'r') as input_file:
+        for address, balance in json.load(input_file, object_pairs_hook=dict_raise_on_duplicates).items():
+            yield address.lower(), balance
+
+
+def export(output_dir, input_file_names, mapping_file_name):
+    """Export each input, {name: file name}, to <output_dir>/<name>.parquet."""
+    exports = {
+        "eon_dump": ("eon_accounts", EON_ACCOUNT_SCHEMA, iter_eon_dump),
+        "eon_stakes": ("eon_stakes", ACCOUNT_SCHEMA, iter_json_accounts),
+        "zend_vault": ("zend_vault", ACCOUNT_SCHEMA, iter_artifact),
+        "automappings": ("automappings", ACCOUNT_SCHEMA, iter_artifact),
+        "horizen2": ("horizen2", ACCOUNT_SCHEMA, iter_artifact),
+    }
+    if "zend_dump" in input_file_names:
+        mapped_addresses = None
+        schema = ZEND_DUMP_SCHEMA
+        if mapping_file_name is not None:
+            with open(mapping_file_name, 'r') as mapping_file:
+                mapped_addresses = json.load(mapping_file, object_pairs_hook=dict_raise_on_duplicates)
+            schema = schema.append(pa.field("eth_address", pa.string()))
+        exports["zend_dump"] = ("zend_dump", schema, lambda file_name: iter_zend_dump(file_name, mapped_addresses))
+
+    os.makedirs(output_dir, exist_ok=True)
+    for input_name, input_file_name in input_file_names.items():
+        (output_name, schema, iter_rows) = exports[input_name]
+        output_file_name = os.path.join(output_dir, output_name + ".parquet")
+        with instrumentation.stage("export_" + output_name) as export_stage:
+            export_stage.rows = write_rows(output_file_name, schema, iter_rows(input_file_name))
+        print(f"Exported {export_stage.rows} rows of {input_file_name} to {output_file_name}")
+
+
+def main():
+    instrumentation.setup("columnar_export")
+    input_file_names = {}
+    for input_name in ("zend_dump", "eon_dump", "eon_stakes", "zend_vault", "automappings", "horizen2"):
+        input_file_name = pop_cli_option("--" + input_name.replace("_", "-"))
+        if input_file_name is not None:
+            input_file_names[input_name] = input_file_name
+    mapping_file_name = pop_cli_option("--mapping")
+
+    if len(sys.argv) != 2 or len(input_file_names) == 0 or (mapping_file_name is not None and "zend_dump" not in input_file_names):
+        print(
+            "Usage: columnar_export <output directory> [--zend-dump <file> [--mapping <file>]] [--eon-dump <file>] "
+            "[--eon-stakes <file>] [--zend-vault <file>] [--automappings <file>] [--horizen2 <file>]"
+        )
+        sys.exit(1)
+    require_pyarrow()
+
+    try:
+        export(sys.argv[1], input_file_names, mapping_file_name)
+    except ValueError as e:
+        print(f"{e}. Exiting.")
+        sys.exit(1)
@@ -0,0 +1,134 @@
+import sys
+
+from horizen_dump_scripts import instrumentation
+from horizen_dump_scripts.columnar_export import require_pyarrow
+from horizen_dump_scripts.utils import pop_cli_option
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+"""
+Vectorized queries over the Parquet files created by columnar_export.
+The functions can be imported, or the script answers the most common questions:
+ - total <value column>: number of rows and sum of the column
+ - group <column> <value column>: number of rows and sum of the value column for each value of the column,
+   ordered by sum
+ - top <value column> <k>: the k rows with the largest values of the column
+The rows can be filtered with "--where <column>=<value>" (repeatable), a value "null" selects the missing values.
+The sums and the shares of the total are calculated on the filtered rows.
+"""
+
+
+def parse_where(where_list, schema):
+    """Return the (column, value) filters of the "<column>=<value>" strings, with the values converted to the column type."""
+    filters = []
+    for where in where_list:
+        (column, separator, value) = where.partition("=")
+        if separator == "" or column not in schema.names:
+            raise ValueError(f"Invalid filter {where}, expected <column>=<value> with a column in {schema.names}")
+        filters.append((column, None if value == "null" else pa.scalar(value).cast(schema.field(column).type)))
+    return filters
+
+
+def read_table(file_name, columns=None, filters=()):
+    """Read the columns of a Parquet file, keeping only the rows where each (column, value) filter matches."""
+    filter_columns = [column for column, _ in filters]
+    if columns is not None:
+        columns = list(dict.fromkeys(columns + filter_columns))
+    table = pq.read_table(file_name, columns=columns)
+    if len(filters) > 0:
+        mask = None
+        for column, value in filters:
+            column_mask = pc.is_null(table[column]) if value is None else pc.fill_null(pc.equal(table[column], value), False)
+            mask = column_mask if mask is None else pc.and_(mask, column_mask)
+        table = table.filter(mask)
+    return table
+
+
+def total(table, value_column):
+    """Return the sum of the column, 0 if there are no rows."""
+    value_sum = pc.sum(table[value_column]).as_py()
+    return 0 if value_sum is None else value_sum
+
+
+def group_sum(table, group_column, value_column):
+    """Return a table with the group column, the count and the sum of the value column, ordered by sum."""
+    grouped = table.group_by(group_column).aggregate([(value_column, "count"), (value_column, "sum")])
+    grouped = grouped.select([group_column, f"{value_column}_count", f"{value_column}_sum"]).rename_columns([group_column, "count", "sum"])
+    return grouped.sort_by([("sum", "descending"), (group_column, "ascending")])
+
+
+def top_k(table, value_column, k):
+    """Return the k rows with the largest values of the column, ordered by value."""
+    indices = pc.select_k_unstable(table, k, [(value_column, "descending")])
+    return table.take(indices).sort_by([(value_column, "descending")])
+
+
+def share(value, value_total):
+    return "" if value_total == 0 else f"{value / value_total:.4%}"
+
+
+def print_table(table, value_column, value_total):
+    """Print the rows as csv, with the share of the total of the value column."""
+    print(",".join(table.column_names + ["share"]))
+    values = table[value_column].to_pylist()
+    for row, value in zip(zip(*(table[column].to_pylist() for column in table.column_names)), values):
+        print(",".join("" if item is None else str(item) for item in row) + "," + share(value, value_total))
+
+
+def run_query(file_name, query, arguments, where_list):
+    schema = pq.read_schema(file_name)
+    filters = parse_where(where_list, schema)
+    value_column = arguments[1] if query == "group" else arguments[0]
+    if value_column not in schema.names:
+        raise ValueError(f"Unknown column {value_column}, the columns are {schema.names}")
+    value_type = schema.field(value_column).type
+    if not (pa.types.is_integer(value_type) or pa.types.is_decimal(value_type)):
+        raise ValueError(f"The value column {value_column} has type {value_type}, expected an integer or decimal column")
+
+    with instrumentation.stage("query") as query_stage:
+        if query == "total":
+            table = read_table(file_name, [value_column], filters)
+            query_stage.rows = table.num_rows
+            print(f"rows,{value_column}")
+            print(f"{table.num_rows},{total(table, value_column)}")
+        elif query == "group":
+            group_column = arguments[0]
+            if group_column not in schema.names:
+                raise ValueError(f"Unknown column {group_column}, the columns are {schema.names}")
+            table = read_table(file_name, [group_column, value_column], filters)
+            query_stage.rows = table.num_rows
+            print_table(group_sum(table, group_column, value_column), "sum", total(table, value_column))
+        else:
+            table = read_table(file_name, None, filters)
+            query_stage.rows = table.num_rows
+            print_table(top_k(table, value_column, int(arguments[1])), value_column, total(table, value_column))
+
+
+def main():
+    instrumentation.setup("columnar_query")
+    where_list = []
+    where = pop_cli_option("--where")
+    while where is not None:
+        where_list.append(where)
+        where = pop_cli_option("--where")
+
+    query_arguments = {"total": 1, "group": 2, "top": 2}
+    if len(sys.argv) < 3 or sys.argv[2] not in query_arguments or len(sys.argv) != 3 + query_arguments[sys.argv[2]]:
+        print(
+            "Usage: columnar_query <parquet file> total <value column> [--where <column>=<value> ...]\n"
+            "       columnar_query <parquet file> group <column> <value column> [--where <column>=<value> ...]\n"
+            "       columnar_query <parquet file> top <value column> <k> [--where <column>=<value> ...]"
+        )
+        sys.exit(1)
+    require_pyarrow()
+
+    try:
+        run_query(sys.argv[1], sys.argv[2], sys.argv[3:], where_list)
+    except (ValueError, pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        print(f"{e}. Exiting.")
+        sys.exit(1)
@@ -0,0 +1,105 @@
+import csv
+import multiprocessing
+import os
+import sys
+
+from horizen_dump_scripts import instrumentation
+from horizen_dump_scripts.artifacts import iter_artifact
+from horizen_dump_scripts.utils import pop_cli_option
+from horizen_dump_scripts.zend_keys import decode_hex, is_multisig_script, is_public_key, public_key_vault_keys, vault_key
+
+"""
+This script derives, for a large list of Zend public keys and multisig redeem scripts, the keys used by the
+ZendBackupVault contract (the decoded Zend address without prefix, as saved by zend_to_horizen in zend.json)
+and finds the balance that can be claimed with each of them.
+It takes as input:
+ - a text file with one hex encoded public key (compressed or uncompressed) or multisig redeem script per line
+ - the zend vault json file created by zend_to_horizen
+ - the output csv file name
+ - (optional) --workers <n>: number of processes used to derive the keys (default: number of cpus)
+
+For each public key both the compressed and the uncompressed addresses are derived, because the same key
+may have been used with both formats.
+The output csv file has the format:
+	<input, type (compressed, uncompressed or script), vault key, claimable balance in wei>
+Keys without a balance in the zend vault file are saved with balance 0.
+"""
+
+KEYS_PER_TASK = 10000
+
+
+def derive_keys(lines):
+    """Derive the vault keys of a chunk of input lines. Return the list of (input, type, vault key or error)."""
+    results = []
+    for line in lines:
+        line = line.strip()
+        if line == "":
+            continue
+        try:
+            data = decode_hex(line)
+            if is_public_key(data):
+                for key_type, key in public_key_vault_keys(data).items():
+                    results.append((line, key_type, key))
+            elif is_multisig_script(data):
+                results.append((line, "script", vault_key(data)))
+            else:
+                results.append((line, "error", "not a public key or a multisig redeem script"))
+        except ValueError as e:
+            results.append((line, "error", str(e)))
+    return results
+
+
+def read_chunks(keys_file):
+    chunk = []
+    for line in keys_file:
+        chunk.append(line)
+        if len(chunk) == KEYS_PER_TASK:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def main():
+    instrumentation.setup("derive_vault_keys")
+    workers = int(pop_cli_option("--workers", os.cpu_count()))
+
+    if len(sys.argv) != 4:
+        print(
+            "Usage: derive_vault_keys <public keys and scripts file> <zend vault file> <output csv file> [--workers <n>]"
+        )
+        sys.exit(1)
+
+    keys_file_name = sys.argv[1]
+    zend_vault_file_name = sys.argv[2]
+    output_file_name = sys.argv[3]
+
+    with instrumentation.stage("load_zend_vault") as load_zend_vault_stage:
+        zend_vault_data = dict(iter_artifact(zend_vault_file_name))
+        load_zend_vault_stage.rows = len(zend_vault_data)
+
+    invalid_inputs = 0
+    claimable_keys = set()
+    total_claimable_balance = 0
+    with open(keys_file_name, 'r') as keys_file, open(output_file_name, 'w', newline='') as output_file, \
+            multiprocessing.Pool(workers) as pool, instrumentation.stage("derive_keys") as derive_keys_stage:
+        output_writer = csv.writer(output_file)
+        for results in pool.imap(derive_keys, read_chunks(keys_file)):
+            for (line, key_type, key) in results:
+                if key_type == "error":
+                    invalid_inputs = invalid_inputs + 1
+                    print(f"Invalid input {line}: {key}")
+                    continue
+                balance = zend_vault_data.get(key, 0)
+                # The same vault key can be derived from different inputs, its balance is counted once
+                if balance != 0 and key not in claimable_keys:
+                    claimable_keys.add(key)
+                    total_claimable_balance = total_claimable_balance + balance
+                output_writer.writerow((line, key_type, key, balance))
+                derive_keys_stage.rows = derive_keys_stage.rows + 1
+
+    print(f"Keys with a claimable balance: {len(claimable_keys)}")
+    print(f"Total claimable balance: {total_claimable_balance} wei")
+    if invalid_inputs != 0:
+        print(f"Found {invalid_inputs} invalid inputs")
+        sys.exit(1)
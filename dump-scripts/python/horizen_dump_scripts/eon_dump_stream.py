@@ -0,0 +1,147 @@
+import codecs
+import json
+
+import requests
+
+from horizen_dump_scripts.rpc import DEFAULT_TIMEOUT, block_identifier
+
+"""
+Incremental parsing of an EON state dump received from a node.
+
+The dump is a json object with an "accounts" object, where each item is "address": {account data}.
+It can be the plain dump (as the one saved by zen_dump) or the JSON-RPC response of a dump method, where the
+dump is the "result" object. The accounts are returned as soon as they are received, while the rest of the
+response is still being downloaded, so the whole dump is never kept in memory.
+"""
+
+DEFAULT_DUMP_METHOD = "debug_dumpBlock"
+CHUNK_SIZE = 1 << 20
+# An account can be large (contract storage) but a buffer growing beyond this size means a malformed dump
+MAX_PENDING_SIZE = 1 << 30
+
+ACCOUNTS_KEY = '"accounts"'
+WHITESPACE = " \t\n\r"
+
+
+class DumpParseError(Exception):
+    pass
+
+
+class DumpStreamParser:
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pending = []
+        self.pending_size = 0
+        # When an item is not complete, it is parsed again only after the buffer has doubled, to avoid
+        # rescanning a large account (e.g. a contract with a big storage) for each chunk received
+        self.min_buffer_size = 0
+        self.in_accounts = False
+        self.done = False
+        self.seen_accounts = set()
+
+    def _skip_whitespace(self, position):
+        while position < len(self.buffer) and self.buffer[position] in WHITESPACE:
+            position = position + 1
+        return position
+
+    def _find_accounts(self):
+        start = self.buffer.find(ACCOUNTS_KEY)
+        if start == -1:
+            return False
+        position = self._skip_whitespace(start + len(ACCOUNTS_KEY))
+        if position < len(self.buffer) and self.buffer[position] == ":":
+            position = self._skip_whitespace(position + 1)
+        if position >= len(self.buffer):
+            return False
+        if self.buffer[position] != "{":
+            raise DumpParseError(f"Unexpected accounts format: {self.buffer[start:position + 20]!r}")
+        self.buffer = self.buffer[position + 1:]
+        self.in_accounts = True
+        return True
+
+    def _parse_accounts(self):
+        accounts = []
+        position = 0
+        complete = True
+        while True:
+            position = self._skip_whitespace(position)
+            if position < len(self.buffer) and self.buffer[position] == ",":
+                position = self._skip_whitespace(position + 1)
+            if position >= len(self.buffer):
+                break
+            if self.buffer[position] == "}":
+                self.done = True
+                position = position + 1
+                break
+            try:
+                account, value_position = self.decoder.raw_decode(self.buffer, position)
+                value_position = self._skip_whitespace(value_position)
+                if value_position >= len(self.buffer):
+                    complete = False
+                    break
+                if self.buffer[value_position] != ":":
+                    raise DumpParseError(f"Unexpected data after account {account}")
+                value_position = self._skip_whitespace(value_position + 1)
+                account_data, end_position = self.decoder.raw_decode(self.buffer, value_position)
+            except json.JSONDecodeError:
+                # The item is not complete yet, it will be parsed again when more data is received
+                complete = False
+                break
+            if account in self.seen_accounts:
+                raise ValueError("duplicate key: %r" % (account,))
+            self.seen_accounts.add(account)
+            accounts.append((account, account_data))
+            position = end_position
+        self.buffer = self.buffer[position:]
+        self.min_buffer_size = 0 if complete else 2 * len(self.buffer)
+        if len(self.buffer) > MAX_PENDING_SIZE:
+            raise DumpParseError("Malformed dump: account data too large")
+        return accounts
+
+    def feed(self, text, final=False):
+        """Add the received text and return the list of (address, account data) completely received."""
+        if self.done:
+            return []
+        self.pending.append(text)
+        self.pending_size = self.pending_size + len(text)
+        if not final and len(self.buffer) + self.pending_size < self.min_buffer_size:
+            return []
+        self.buffer = self.buffer + "".join(self.pending)
+        self.pending = []
+        self.pending_size = 0
+        if not self.in_accounts and not self._find_accounts():
+            return []
+        return self._parse_accounts()
+
+    def close(self):
+        if not self.done:
+            raise DumpParseError(f"Incomplete dump, no accounts or unexpected end of data: {self.buffer[:200]!r}")
+
+
+def iter_dump_chunks(chunks, tee_file=None):
+    """Yield the (address, account data) items of a dump received as a sequence of byte chunks."""
+    parser = DumpStreamParser()
+    utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        if tee_file is not None:
+            tee_file.write(chunk)
+        yield from parser.feed(utf8_decoder.decode(chunk))
+    yield from parser.feed(utf8_decoder.decode(b"", final=True), final=True)
+    parser.close()
+
+
+def iter_dump_from_rpc(rpc_url, block_height, method=DEFAULT_DUMP_METHOD, tee_file_name=None, timeout=DEFAULT_TIMEOUT):
+    """Call the dump RPC method at the given height and yield the accounts while the response is received.
+
+    If tee_file_name is provided, the raw JSON-RPC response is saved to that file too.
+    A JSON-RPC error response has no accounts, so it is reported by the DumpParseError message.
+    """
+    payload = {"jsonrpc": "2.0", "id": 0, "method": method, "params": [block_identifier(block_height)]}
+    with requests.post(rpc_url, json=payload, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        if tee_file_name is None:
+            yield from iter_dump_chunks(response.iter_content(chunk_size=CHUNK_SIZE))
+        else:
+            with open(tee_file_name, "wb") as tee_file:
+                yield from iter_dump_chunks(response.iter_content(chunk_size=CHUNK_SIZE), tee_file)
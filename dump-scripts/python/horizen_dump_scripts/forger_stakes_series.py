@@ -0,0 +1,253 @@
+import json
+import os
+
+from eth_abi import decode, encode
+from eth_utils import to_checksum_address
+
+from horizen_dump_scripts import instrumentation
+from horizen_dump_scripts.rpc import block_identifier, function_selector
+
+"""
+Forger stakes at several block heights, saved as a compact time series.
+
+The stakes of the forgers are read at all the requested heights together: the calls for the same page index of all
+the (height, forger) pairs are sent in the same JSON-RPC batches.
+Before reading the stakes, the stakeTotal of each forger is read at each height. The stakes of a forger whose
+stakeTotal did not change since the previous height are not read again, the ones of the previous height are used.
+A stake moved between two delegators of the same forger, with no change of its total, is not detected by the
+stakeTotal, so these forgers are saved as reused in the snapshot: when the stakes of a height are extracted, the
+stakes of its reused forgers are read again at that height.
+
+The series file is a json object with the list of the snapshots, ordered by height:
+    {"contract": <forger stakes contract>, "snapshots": [
+        {"height": <height>, "stake_total": <stakeTotal of all forgers>,
+         "forgers": {<forger>: <stakeTotal of the forger>, ...},
+         "stakes": {<forger>: [[<delegator>, <amount>], ...], ...},
+         "reused": [<forger whose stakes were not read at this height>, ...]},
+        ...
+    ]}
+where <forger> is the hex concatenation of signPubKey, vrf1 and vrf2. The first snapshot has the stakes of all its
+forgers, the next ones only the stakes of the forgers that changed since the previous snapshot. The forgers of each
+snapshot are in the order returned by the contract, so the stakes file of each height can be rebuilt exactly as
+get_all_forger_stakes creates it.
+"""
+
+FORGER_STAKES_NATIVE_SMART_CONTRACT = "0x0000000000000000000022222222222222222333"
+PAGE_SIZE = 10
+
+NULL_ADDRESS = "0x0000000000000000000000000000000000000000"
+ZERO_BYTES32 = bytes(32)
+ALL_FORGERS = (ZERO_BYTES32, ZERO_BYTES32, bytes(1))
+
+GET_PAGED_FORGERS_SELECTOR = function_selector("getPagedForgers(int32,int32)")
+GET_PAGED_FORGERS_STAKES_BY_FORGER_SELECTOR = function_selector("getPagedForgersStakesByForger(bytes32,bytes32,bytes1,int32,int32)")
+STAKE_TOTAL_SELECTOR = function_selector("stakeTotal(bytes32,bytes32,bytes1,address,uint32,uint32)")
+
+FORGER_INFO_LIST_TYPE = "(bytes32,bytes32,bytes1,uint32,address)[]"
+DELEGATOR_STAKE_LIST_TYPE = "(address,uint256)[]"
+
+
+def forger_id(sign_pub_key, vrf1, vrf2):
+    return "0x" + sign_pub_key.hex() + vrf1.hex() + vrf2.hex()
+
+
+def forger_key(forger):
+    """Return the (signPubKey, vrf1, vrf2) of a forger id."""
+    data = bytes.fromhex(forger[2:])
+    return data[:32], data[32:64], data[64:]
+
+
+def eth_call(height, selector, types, args):
+    return "eth_call", [{"to": FORGER_STAKES_NATIVE_SMART_CONTRACT, "data": selector + encode(types, args).hex()}, block_identifier(height)]
+
+
+def decode_result(types, result):
+    return decode(types, bytes.fromhex(result[2:]))
+
+
+def get_paged_items(client, requests, paged_call, items_type):
+    """Read all the pages of a paged method for each request, whose first item is the height.
+
+    The requests waiting for the same page index are sent in the same batch call. Return {request: [items]}.
+    """
+    items = {request: [] for request in requests}
+    next_indexes = {request: 0 for request in requests}
+    while len(next_indexes) > 0:
+        pending = list(next_indexes.items())
+        results = client.batch_call([paged_call(request, index) for request, index in pending])
+        next_indexes = {}
+        for (request, _), result in zip(pending, results):
+            (next_index, page_items) = decode_result(["int32", items_type], result)
+            items[request].extend(page_items)
+            if next_index != -1:
+                next_indexes[request] = next_index
+    return items
+
+
+def get_forgers(client, heights):
+    """Return {height: [forger ids]}."""
+    paged_call = lambda request, index: eth_call(request[0], GET_PAGED_FORGERS_SELECTOR, ["int32", "int32"], [index, PAGE_SIZE])
+    forgers = get_paged_items(client, [(height,) for height in heights], paged_call, FORGER_INFO_LIST_TYPE)
+    return {
+        height: [forger_id(*forger_info[:3]) for forger_info in forgers[(height,)]]
+        for height in heights
+    }
+
+
+def get_stake_totals(client, forgers_by_height):
+    """Return {height: (stakeTotal of all forgers, {forger: stakeTotal})}, read with a single batch call."""
+    types = ["bytes32", "bytes32", "bytes1", "address", "uint32", "uint32"]
+    requests = []
+    for height, forgers in forgers_by_height.items():
+        requests.append((height, None))
+        requests.extend((height, forger) for forger in forgers)
+    results = client.batch_call([
+        eth_call(height, STAKE_TOTAL_SELECTOR, types, [*(ALL_FORGERS if forger is None else forger_key(forger)), NULL_ADDRESS, 0, 0])
+        for height, forger in requests
+    ])
+    stake_totals = {height: [None, {}] for height in forgers_by_height}
+    for (height, forger), result in zip(requests, results):
+        (stake_total,) = decode_result(["uint256[]"], result)
+        if forger is None:
+            stake_totals[height][0] = stake_total[0]
+        else:
+            stake_totals[height][1][forger] = stake_total[0]
+    return {height: tuple(totals) for height, totals in stake_totals.items()}
+
+
+def get_stakes(client, requests):
+    """Return {(height, forger): [[delegator, amount], ...]} for each requested (height, forger)."""
+    paged_call = lambda request, index: eth_call(
+        request[0], GET_PAGED_FORGERS_STAKES_BY_FORGER_SELECTOR, ["bytes32", "bytes32", "bytes1", "int32", "int32"],
+        [*forger_key(request[1]), index, PAGE_SIZE]
+    )
+    stakes = get_paged_items(client, requests, paged_call, DELEGATOR_STAKE_LIST_TYPE)
+    # The delegators are saved with the checksum, as web3 returns them in the single height mode
+    return {
+        request: [[to_checksum_address(owner), amount] for (owner, amount) in forger_stakes]
+        for request, forger_stakes in stakes.items()
+    }
+
+
+def sum_stakes(forgers, stakes_by_forger):
+    """Return the {delegator: total stake} of all the forgers, in the order get_all_forger_stakes creates it."""
+    stakes = {}
+    for forger in forgers:
+        for (owner, amount) in stakes_by_forger[forger]:
+            if owner in stakes:
+                stakes[owner] = stakes[owner] + amount
+            else:
+                stakes[owner] = amount
+    return stakes
+
+
+def new_series():
+    return {"contract": FORGER_STAKES_NATIVE_SMART_CONTRACT, "snapshots": []}
+
+
+def load_series(series_file_name):
+    with open(series_file_name, "r") as series_file:
+        return json.load(series_file)
+
+
+def write_series(series_file_name, series):
+    temporary_file_name = series_file_name + ".tmp"
+    with open(temporary_file_name, "w") as series_file:
+        json.dump(series, series_file, separators=(",", ":"))
+    os.replace(temporary_file_name, series_file_name)
+
+
+def iter_series(series):
+    """Yield (snapshot, {forger: stakes}) for each snapshot of the series."""
+    stakes_by_forger = {}
+    for snapshot in series["snapshots"]:
+        changed_stakes = snapshot["stakes"]
+        stakes_by_forger = {
+            forger: changed_stakes[forger] if forger in changed_stakes else stakes_by_forger[forger]
+            for forger in snapshot["forgers"]
+        }
+        yield snapshot, stakes_by_forger
+
+
+def add_heights(client, series, heights):
+    """Read the stakes at the heights, all greater than the last height of the series, and add them to the series."""
+    if len(heights) == 0:
+        raise ValueError("No heights to add")
+    last_snapshot = None
+    last_stakes_by_forger = {}
+    for last_snapshot, last_stakes_by_forger in iter_series(series):
+        pass
+    if last_snapshot is not None and heights[0] <= last_snapshot["height"]:
+        raise ValueError(f"Height {heights[0]} is not greater than the last height in the series {last_snapshot['height']}")
+
+    with instrumentation.stage("get_forgers") as get_forgers_stage:
+        forgers_by_height = get_forgers(client, heights)
+        get_forgers_stage.rows = sum(len(forgers) for forgers in forgers_by_height.values())
+
+    with instrumentation.stage("get_stake_totals") as get_stake_totals_stage:
+        stake_totals = get_stake_totals(client, forgers_by_height)
+        get_stake_totals_stage.rows = len(heights) + get_forgers_stage.rows
+
+    # A forger is read again only if its stakeTotal changed since the previous height
+    requests = []
+    previous_forger_totals = last_snapshot["forgers"] if last_snapshot is not None else {}
+    for height in heights:
+        forger_totals = stake_totals[height][1]
+        requests.extend(
+            (height, forger) for forger in forgers_by_height[height]
+            if previous_forger_totals.get(forger) != forger_totals[forger]
+        )
+        previous_forger_totals = forger_totals
+
+    with instrumentation.stage("get_stakes") as get_stakes_stage:
+        read_stakes = get_stakes(client, requests)
+        get_stakes_stage.rows = sum(len(forger_stakes) for forger_stakes in read_stakes.values())
+
+    previous_stakes_by_forger = last_stakes_by_forger
+    for height in heights:
+        (stake_total, forger_totals) = stake_totals[height]
+        forgers = forgers_by_height[height]
+        stakes_by_forger = {
+            forger: read_stakes[(height, forger)] if (height, forger) in read_stakes else previous_stakes_by_forger[forger]
+            for forger in forgers
+        }
+        stakes = sum_stakes(forgers, stakes_by_forger)
+        assert sum(stakes.values()) == stake_total, f"stakeTotal returns a value different from the sum of all the stakes at height {height}"
+
+        series["snapshots"].append({
+            "height": height,
+            "stake_total": stake_total,
+            "forgers": {forger: forger_totals[forger] for forger in forgers},
+            "stakes": {
+                forger: forger_stakes for forger, forger_stakes in stakes_by_forger.items()
+                if previous_stakes_by_forger.get(forger) != forger_stakes
+            },
+            "reused": [forger for forger in forgers if (height, forger) not in read_stakes],
+        })
+        read_forgers = sum(1 for forger in forgers if (height, forger) in read_stakes)
+        print(f"Height {height}: {len(forgers)} forgers ({read_forgers} read, {len(forgers) - read_forgers} unchanged), {len(stakes)} delegators")
+        previous_stakes_by_forger = stakes_by_forger
+
+
+def extract_stakes(series, height, client=None):
+    """Return the {delegator: total stake} at a height of the series.
+
+    The stakes of the forgers reused at the height are read again with the client, that is required if there are any.
+    """
+    for snapshot, stakes_by_forger in iter_series(series):
+        if snapshot["height"] == height:
+            reused_forgers = snapshot["reused"]
+            if len(reused_forgers) > 0:
+                if client is None:
+                    raise ValueError(
+                        f"The stakes of {len(reused_forgers)} forgers were not read at height {height}, because their "
+                        f"stakeTotal did not change: the rpc url is required to read them"
+                    )
+                read_stakes = get_stakes(client, [(height, forger) for forger in reused_forgers])
+                stakes_by_forger = dict(stakes_by_forger)
+                for forger in reused_forgers:
+                    stakes_by_forger[forger] = read_stakes[(height, forger)]
+            stakes = sum_stakes(snapshot["forgers"], stakes_by_forger)
+            assert sum(stakes.values()) == snapshot["stake_total"], f"Stakes at height {height} do not match the saved stakeTotal"
+            return stakes
+    raise ValueError(f"Height {height} not found in the series, saved heights: {[snapshot['height'] for snapshot in series['snapshots']]}")
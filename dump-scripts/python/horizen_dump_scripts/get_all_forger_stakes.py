@@ -3,21 +3,88 @@ import sys
 import os
 from web3 import Web3
 
+from horizen_dump_scripts import forger_stakes_series, instrumentation
+from horizen_dump_scripts.rpc import JsonRpcClient
+from horizen_dump_scripts.utils import pop_cli_option
+
 """
 This script retrieves all the stakes in EON network and creates a json file with the list of all
 delegators with the total sum of their stakes.
 It takes as input the block height at which it retrieves the stakes.
 
+With --heights, it retrieves the stakes at several block heights and saves them in a series file (see
+forger_stakes_series). If the series file exists, the heights are added to it.
+With --extract, it creates the json file of one of the heights saved in a series file. The stakes of the forgers
+whose stakeTotal did not change at that height are read again from the node, whose url is passed with --rpc.
 """
 
+
+def parse_heights(heights):
+	"""Parse a list of heights "<h1>,<h2>,..." or a range "<start>:<end>:<step>" (end included)."""
+	if ":" in heights:
+		(start, end, step) = map(int, heights.split(":"))
+		if step <= 0:
+			raise ValueError(f"Invalid heights {heights}, the step must be positive")
+		parsed_heights = list(range(start, end + 1, step))
+	else:
+		parsed_heights = sorted(set(int(height) for height in heights.split(",")))
+	if len(parsed_heights) == 0:
+		raise ValueError(f"Invalid heights {heights}, the range is empty")
+	return parsed_heights
+
+
+def store_heights(heights, rpc, series_file_name):
+	series = forger_stakes_series.new_series()
+	if os.path.exists(series_file_name):
+		series = forger_stakes_series.load_series(series_file_name)
+	with JsonRpcClient(rpc) as client:
+		forger_stakes_series.add_heights(client, series, heights)
+	with instrumentation.stage("write") as write_stage:
+		forger_stakes_series.write_series(series_file_name, series)
+		write_stage.rows = len(heights)
+	print(f"Saved {len(series['snapshots'])} heights in {series_file_name}")
+
+
+def extract_height(block_height, series_file_name, result_file_name, rpc):
+	series = forger_stakes_series.load_series(series_file_name)
+	with instrumentation.stage("extract") as extract_stage:
+		if rpc is None:
+			stakes = forger_stakes_series.extract_stakes(series, block_height)
+		else:
+			with JsonRpcClient(rpc) as client:
+				stakes = forger_stakes_series.extract_stakes(series, block_height, client)
+		extract_stage.rows = len(stakes)
+	with open(result_file_name, "w") as jsonFile, instrumentation.stage("write") as write_stage:
+		json.dump(stakes, jsonFile, indent=4)
+		write_stage.rows = len(stakes)
+
+
 def main():
+	instrumentation.setup("get_all_forger_stakes")
+	heights = pop_cli_option("--heights")
+	extract = pop_cli_option("--extract")
+	extract_rpc = pop_cli_option("--rpc")
 
-	if len(sys.argv) != 4:
+	arguments_count = 4 if heights is None and extract is None else 3
+	if len(sys.argv) != arguments_count or (heights is not None and extract is not None) or (extract is None and extract_rpc is not None):
 		print(
-			"Usage: get_all_forger_stakes <block height> <rpc url> <output_file>"
+			"Usage: get_all_forger_stakes <block height> <rpc url> <output_file>\n"
+			"       get_all_forger_stakes --heights <h1>,<h2>,...|<start>:<end>:<step> <rpc url> <series_file>\n"
+			"       get_all_forger_stakes --extract <block height> [--rpc <rpc url>] <series_file> <output_file>"
 		)
 		sys.exit(1)
 
+	try:
+		if heights is not None:
+			store_heights(parse_heights(heights), sys.argv[1], sys.argv[2])
+			return
+		if extract is not None:
+			extract_height(int(extract), sys.argv[1], sys.argv[2], extract_rpc)
+			return
+	except ValueError as e:
+		print(f"{e}. Exiting.")
+		sys.exit(1)
+
 	block_height = int(sys.argv[1])
 	rpc = sys.argv[2]
 	result_file_name = sys.argv[3]
@@ -192,38 +259,46 @@ def main():
 	forgers = []
 	index = 0
 	page_size = 10
-	while index != -1:
-		results = contract.functions.getPagedForgers(index, page_size).call(block_identifier=block_height)
-		(index, forger_data) = results
-		forgers = forgers + list(map(lambda data: data[:3], forger_data))
+	with instrumentation.stage("get_forgers") as get_forgers_stage:
+		while index != -1:
+			with instrumentation.rpc_call("getPagedForgers"):
+				results = contract.functions.getPagedForgers(index, page_size).call(block_identifier=block_height)
+			(index, forger_data) = results
+			forgers = forgers + list(map(lambda data: data[:3], forger_data))
+		get_forgers_stage.rows = len(forgers)
 
 	page_size = 10
 	stakes = {}
-	for forger in forgers:
-		index = 0
-		while index != -1:
-			results = contract.functions.getPagedForgersStakesByForger(forger[0], forger[1],
-															forger[2], index, page_size).call(block_identifier=block_height)
-			(index, forger_stakes) = results
-			for (owner, amount) in forger_stakes:
-				if owner in stakes:
-					stakes[owner] = stakes[owner] + amount
-				else:
-					stakes[owner] = amount
+	with instrumentation.stage("get_stakes") as get_stakes_stage:
+		for forger in forgers:
+			index = 0
+			while index != -1:
+				with instrumentation.rpc_call("getPagedForgersStakesByForger"):
+					results = contract.functions.getPagedForgersStakesByForger(forger[0], forger[1],
+																	forger[2], index, page_size).call(block_identifier=block_height)
+				(index, forger_stakes) = results
+				for (owner, amount) in forger_stakes:
+					if owner in stakes:
+						stakes[owner] = stakes[owner] + amount
+					else:
+						stakes[owner] = amount
+				get_stakes_stage.rows = get_stakes_stage.rows + len(forger_stakes)
 
 	# Checking that the total amount is correct
-	total = contract.functions.stakeTotal("0x0000000000000000000000000000000000000000000000000000000000000000",
-											"0x0000000000000000000000000000000000000000000000000000000000000000",
-											"0x00",
-											"0x0000000000000000000000000000000000000000",
-											0,
-											0
-											).call(block_identifier=block_height)
+	with instrumentation.rpc_call("stakeTotal"):
+		total = contract.functions.stakeTotal("0x0000000000000000000000000000000000000000000000000000000000000000",
+												"0x0000000000000000000000000000000000000000000000000000000000000000",
+												"0x00",
+												"0x0000000000000000000000000000000000000000",
+												0,
+												0
+												).call(block_identifier=block_height)
 	total_stakes = 0
 	for key, value in stakes.items():
 		total_stakes = total_stakes + value
 
 	assert total_stakes == total[0], "stakeTotal returns a value different from the sum of all the stakes "
 
-	with open(result_file_name, "w") as jsonFile:
+	with open(result_file_name, "w") as jsonFile, instrumentation.stage("write") as write_stage:
 		json.dump(stakes, jsonFile, indent=4)
+		write_stage.rows = len(stakes)
@@ -0,0 +1,173 @@
+import atexit
+import cProfile
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from horizen_dump_scripts.utils import pop_cli_option
+"""
+Shared performance instrumentation for the dump scripts.
+
+Every console script calls setup() at the beginning of main(), which removes the following optional
+parameters from the command line:
+ - --metrics-out <file>: writes a json file with the metrics collected during the execution
+ - --profile <stage>[,<stage>...]: dumps a cProfile file (<script>.<stage>.prof) for each listed stage.
+   "all" profiles every stage.
+
+The scripts wrap their main phases (parsing, decoding, sorting, writing, ...) in stage() blocks. For each stage
+the wall time, the CPU time, the number of processed rows, the rows/sec and the peak RSS of the process are
+recorded. rpc_call() blocks record count and latency of each RPC method called.
+The metrics are written when the script terminates, also if it exits with an error.
+"""
+
+METRICS_OUT_OPTION = "--metrics-out"
+PROFILE_OPTION = "--profile"
+PROFILE_ALL_STAGES = "all"
+
+
+def peak_rss_bytes():
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if sys.platform == "darwin":
+        return peak_rss
+    return peak_rss * 1024
+
+
+class StageMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_rss = 0
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "rows": self.rows,
+            "rows_per_sec": self.rows / self.wall_time if self.wall_time > 0 else None,
+            "peak_rss": self.peak_rss,
+        }
+
+
+class RpcMetrics:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_latency": self.total_latency,
+            "avg_latency": self.total_latency / self.count if self.count > 0 else None,
+            "max_latency": self.max_latency,
+        }
+
+
+class Metrics:
+    def __init__(self, script_name, metrics_file_name=None, profiled_stages=()):
+        self.script_name = script_name
+        self.metrics_file_name = metrics_file_name
+        self.profiled_stages = set(profiled_stages)
+        self.stages = []
+        self.rpc_calls = {}
+        # RPC calls can be recorded by several threads at the same time
+        self.rpc_lock = threading.Lock()
+        self.start_wall_time = time.perf_counter()
+        self.start_cpu_time = time.process_time()
+
+    def is_profiled(self, stage_name):
+        return stage_name in self.profiled_stages or PROFILE_ALL_STAGES in self.profiled_stages
+
+    @contextmanager
+    def stage(self, name):
+        stage_metrics = StageMetrics(name)
+        profiler = None
+        if self.is_profiled(name):
+            profiler = cProfile.Profile()
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield stage_metrics
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(f"{self.script_name}.{name}.prof")
+            stage_metrics.wall_time = time.perf_counter() - start_wall_time
+            stage_metrics.cpu_time = time.process_time() - start_cpu_time
+            stage_metrics.peak_rss = peak_rss_bytes()
+            self.stages.append(stage_metrics)
+
+    @contextmanager
+    def rpc_call(self, method):
+        start_time = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            latency = time.perf_counter() - start_time
+            with self.rpc_lock:
+                rpc_metrics = self.rpc_calls.setdefault(method, RpcMetrics())
+                rpc_metrics.count = rpc_metrics.count + 1
+                if failed:
+                    rpc_metrics.errors = rpc_metrics.errors + 1
+                rpc_metrics.total_latency = rpc_metrics.total_latency + latency
+                rpc_metrics.max_latency = max(rpc_metrics.max_latency, latency)
+
+    def to_dict(self):
+        return {
+            "script": self.script_name,
+            "wall_time": time.perf_counter() - self.start_wall_time,
+            "cpu_time": time.process_time() - self.start_cpu_time,
+            "peak_rss": peak_rss_bytes(),
+            "stages": [stage_metrics.to_dict() for stage_metrics in self.stages],
+            "rpc_calls": {method: rpc_metrics.to_dict() for method, rpc_metrics in list(self.rpc_calls.items())},
+        }
+
+    def write(self):
+        if self.metrics_file_name is None:
+            return
+        with open(self.metrics_file_name, "w") as metrics_file:
+            json.dump(self.to_dict(), metrics_file, indent=4)
+
+
+# Metrics of the running script. Until setup() is called the metrics are collected but never written,
+# so the instrumented functions can also be used as a library.
+_metrics = Metrics(os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "horizen_dump_scripts")
+
+
+def setup(script_name):
+    """Parse the instrumentation options from the command line and enable the metrics for the running script."""
+    global _metrics
+    metrics_file_name = pop_cli_option(METRICS_OUT_OPTION)
+    profile_option = pop_cli_option(PROFILE_OPTION, "")
+    profiled_stages = [stage_name.strip() for stage_name in profile_option.split(",") if stage_name.strip() != ""]
+    _metrics = Metrics(script_name, metrics_file_name, profiled_stages)
+    atexit.register(_metrics.write)
+    return _metrics
+
+
+def current():
+    return _metrics
+
+
+def stage(name):
+    return _metrics.stage(name)
+
+
+def rpc_call(method):
+    return _metrics.rpc_call(method)
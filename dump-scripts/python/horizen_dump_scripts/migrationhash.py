@@ -1,7 +1,9 @@
 import json
 import os
 import sys
-from web3 import Web3
+from eth_hash.auto import keccak
+
+from horizen_dump_scripts import instrumentation
 
 """
 This script calculates a migration hash from a restore json artifact.
@@ -11,20 +13,40 @@ It takes as input:
 Prints  the calculated migration hash 
 """
 
-def update_hash(previous_hash: str, address: str, value: int, isEon: bool) -> str:
-    keyType = "bytes20"
+ZERO_HASH = bytes(32)
+KEY_PADDING = bytes(12)
+
+
+def update_hash_bytes(previous_hash: bytes, address: str, value: int, isEon: bool) -> bytes:
+    """Same as update_hash, working on raw bytes.
+
+    The abi encoding of (bytes32, address|bytes20, uint256) is built directly: an address is left-padded
+    to 32 bytes, a bytes20 is right-padded.
+    """
+    key = bytes.fromhex(address[2:])
+    if len(key) != 20:
+        raise ValueError(f"Invalid key length: {address}")
     if isEon:
-        keyType = "address"
-    
-    w3 = Web3()
-    encoded = w3.codec.encode(['bytes32', keyType, 'uint256'], [
-        bytes.fromhex(previous_hash),
-        bytes.fromhex(address[2:]),
-        value
-    ])
-    return w3.keccak(encoded).hex()
+        encoded_key = KEY_PADDING + key
+    else:
+        encoded_key = key + KEY_PADDING
+    return keccak(previous_hash + encoded_key + value.to_bytes(32, "big"))
+
+
+def update_hash(previous_hash: str, address: str, value: int, isEon: bool) -> str:
+    return update_hash_bytes(bytes.fromhex(previous_hash), address, value, isEon).hex()
+
+
+def calculate_migration_hash(tuples, isEon: bool, previous_hash: bytes = ZERO_HASH) -> bytes:
+    """Calculate the cumulative hash of a sequence of (address, value) tuples, already ordered by address."""
+    final_hash = previous_hash
+    for address, value in tuples:
+        final_hash = update_hash_bytes(final_hash, address, value, isEon)
+    return final_hash
 
 def main():
+    instrumentation.setup("migrationhash")
+
     if len(sys.argv) != 3 or sys.argv[2] not in {"eon", "zend"}:
         print(
             "Usage: migrationhash <json file> <eon|zend>"
@@ -34,18 +56,21 @@ def main():
     input_file_name = sys.argv[1]
     file_type = sys.argv[2]
 
-    with open(input_file_name, 'r') as file:
+    with open(input_file_name, 'r') as file, instrumentation.stage("load") as load_stage:
         data = json.load(file)
+        load_stage.rows = len(data)
 
 
-    tuples = [(address, data[address]) for address in data.keys()]
-    # Order by key
-    tuples.sort(key=lambda x: x[0])
+    with instrumentation.stage("sort") as sort_stage:
+        tuples = [(address, data[address]) for address in data.keys()]
+        # Order by key
+        tuples.sort(key=lambda x: x[0])
+        sort_stage.rows = len(tuples)
 
-    final_hash = "00" * 32  # 32 byte zero
-    for address,value in tuples:
-        final_hash = update_hash(final_hash, address, value, file_type == "eon")
-    print(final_hash)
+    with instrumentation.stage("hash") as hash_stage:
+        final_hash = calculate_migration_hash(tuples, file_type == "eon")
+        hash_stage.rows = len(tuples)
+    print(final_hash.hex())
 
 
 
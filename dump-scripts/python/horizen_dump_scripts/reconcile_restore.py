@@ -0,0 +1,153 @@
+import sys
+
+from horizen_dump_scripts import instrumentation
+from horizen_dump_scripts.artifacts import iter_artifact
+from horizen_dump_scripts.migrationhash import ZERO_HASH, update_hash_bytes
+from horizen_dump_scripts.rpc import DEFAULT_BATCH_SIZE, DEFAULT_CONCURRENCY, JsonRpcClient, function_selector
+from horizen_dump_scripts.utils import pop_cli_option
+
+"""
+This script checks that the accounts restored on chain by the restoreEON and restoreZEND tasks match
+the restore artifacts (eon.json and zend.json).
+It takes as input:
+ - the type of the artifact (eon or zend)
+ - the artifact json file
+ - the rpc url of the chain where the contracts are deployed
+ - the address of the ZenToken contract
+ - the address of the vault contract (EONBackupVault for eon, ZendBackupVault for zend)
+ - the block height at which all the checks are executed
+ - (optional) --batch-size <n>: number of calls in each JSON-RPC batch request (default 100)
+ - (optional) --concurrency <n>: number of batch requests sent in parallel (default 8)
+
+The artifact is streamed and, for each account:
+ - eon: ZenToken balanceOf(address) must be equal to the balance in the artifact
+ - zend: ZendBackupVault balances(bytes20) must be equal to the balance in the artifact. A zero balance is
+   reported separately, because it is the expected result of a claim.
+For zend, the ZenToken balance of the vault must also be equal to the sum of the balances found in the vault.
+At the end, the cumulative hash calculated from the artifact is compared with the vault _cumulativeHash and
+cumulativeHashCheckpoint.
+
+Note: the tokens can be transferred after the restore, so the block height should be the one at which the
+restore was completed.
+"""
+
+# Number of accounts read from the artifact and checked in each round of batch requests
+ACCOUNTS_PER_ROUND_MULTIPLIER = 4
+
+# Global variable to keep track of failed checks
+failed_reconciliation = False
+def set_failed_execution():
+    global failed_reconciliation
+    failed_reconciliation = True
+
+
+BALANCE_OF_SELECTOR = function_selector("balanceOf(address)")
+ZEND_VAULT_BALANCES_SELECTOR = function_selector("balances(bytes20)")
+CUMULATIVE_HASH_SELECTOR = function_selector("_cumulativeHash()")
+CUMULATIVE_HASH_CHECKPOINT_SELECTOR = function_selector("cumulativeHashCheckpoint()")
+
+
+def encode_address_call(selector, address):
+    return selector + "00" * 12 + address[2:].lower()
+
+
+def encode_bytes20_call(selector, key):
+    return selector + key[2:].lower() + "00" * 12
+
+
+def decode_uint256(result):
+    return int(result, 16)
+
+
+def check_accounts(client, accounts, call_target, encode_call, block_height, is_eon):
+    """Check a round of (key, expected balance) accounts. Return the sum of the on-chain balances."""
+    results = client.batch_eth_call(call_target, [encode_call(key) for key, _ in accounts], block_height)
+    onchain_total = 0
+    for (key, expected_balance), result in zip(accounts, results):
+        onchain_balance = decode_uint256(result)
+        onchain_total = onchain_total + onchain_balance
+        if onchain_balance == expected_balance:
+            continue
+        set_failed_execution()
+        if not is_eon and onchain_balance == 0:
+            print(f"Zend address {key} has 0 balance in the vault, expected {expected_balance} wei (possibly already claimed).")
+        else:
+            print(f"Address {key} balances do not match. Artifact: {expected_balance} wei. On chain: {onchain_balance} wei.")
+    return onchain_total
+
+
+def reconcile(file_type, artifact_file_name, client, token_address, vault_address, block_height):
+    is_eon = file_type == "eon"
+    if is_eon:
+        call_target = token_address
+        encode_call = lambda key: encode_address_call(BALANCE_OF_SELECTOR, key)
+    else:
+        call_target = vault_address
+        encode_call = lambda key: encode_bytes20_call(ZEND_VAULT_BALANCES_SELECTOR, key)
+
+    accounts_per_round = client.batch_size * client.concurrency * ACCOUNTS_PER_ROUND_MULTIPLIER
+    calculated_hash = ZERO_HASH
+    counter = 0
+    artifact_total = 0
+    onchain_total = 0
+    with instrumentation.stage("check_accounts") as check_accounts_stage:
+        accounts = []
+        for key, balance in iter_artifact(artifact_file_name):
+            calculated_hash = update_hash_bytes(calculated_hash, key, balance, is_eon)
+            artifact_total = artifact_total + balance
+            accounts.append((key, balance))
+            if len(accounts) == accounts_per_round:
+                onchain_total = onchain_total + check_accounts(client, accounts, call_target, encode_call, block_height, is_eon)
+                counter = counter + len(accounts)
+                print(f"Checked {counter} accounts")
+                accounts = []
+        if len(accounts) > 0:
+            onchain_total = onchain_total + check_accounts(client, accounts, call_target, encode_call, block_height, is_eon)
+            counter = counter + len(accounts)
+        check_accounts_stage.rows = counter
+    print(f"Checked {counter} accounts. Total balance in the artifact: {artifact_total} wei, total balance on chain: {onchain_total} wei.")
+
+    if not is_eon:
+        vault_token_balance = decode_uint256(client.eth_call(token_address, encode_address_call(BALANCE_OF_SELECTOR, vault_address), block_height))
+        if vault_token_balance != onchain_total:
+            set_failed_execution()
+            print(f"ZenToken balance of the vault {vault_token_balance} wei is different from the sum of the vault balances {onchain_total} wei.")
+
+    onchain_hash = client.eth_call(vault_address, CUMULATIVE_HASH_SELECTOR, block_height)
+    onchain_checkpoint = client.eth_call(vault_address, CUMULATIVE_HASH_CHECKPOINT_SELECTOR, block_height)
+    print(f"Cumulative hash calculated from the artifact: {calculated_hash.hex()}")
+    print(f"Vault cumulative hash: {onchain_hash[2:]}, checkpoint: {onchain_checkpoint[2:]}")
+    if onchain_hash[2:] != calculated_hash.hex():
+        set_failed_execution()
+        print("Vault cumulative hash does not match the artifact.")
+    if onchain_checkpoint[2:] != calculated_hash.hex():
+        set_failed_execution()
+        print("Vault cumulative hash checkpoint does not match the artifact.")
+
+
+def main():
+    instrumentation.setup("reconcile_restore")
+    batch_size = int(pop_cli_option("--batch-size", DEFAULT_BATCH_SIZE))
+    concurrency = int(pop_cli_option("--concurrency", DEFAULT_CONCURRENCY))
+
+    if len(sys.argv) != 7 or sys.argv[1] not in {"eon", "zend"}:
+        print(
+            "Usage: reconcile_restore <eon|zend> <json file> <rpc url> <ZenToken address> <vault address> <block height> [--batch-size <n>] [--concurrency <n>]"
+        )
+        sys.exit(1)
+
+    file_type = sys.argv[1]
+    artifact_file_name = sys.argv[2]
+    rpc_url = sys.argv[3]
+    token_address = sys.argv[4]
+    vault_address = sys.argv[5]
+    block_height = int(sys.argv[6])
+
+    with JsonRpcClient(rpc_url, batch_size=batch_size, concurrency=concurrency) as client:
+        reconcile(file_type, artifact_file_name, client, token_address, vault_address, block_height)
+
+    if failed_reconciliation:
+        print("On-chain reconciliation failed.")
+        sys.exit(1)
+    else:
+        print("On-chain reconciliation successful.")
@@ -0,0 +1,504 @@
+import functools
+import itertools
+import json
+import os
+import sys
+import time
+
+from eth_abi import encode
+from eth_account import Account
+from eth_utils import to_checksum_address
+
+from horizen_dump_scripts import instrumentation
+from horizen_dump_scripts.artifacts import iter_artifact
+from horizen_dump_scripts.migrationhash import ZERO_HASH, update_hash_bytes
+from horizen_dump_scripts.rpc import JsonRpcClient, JsonRpcError, function_selector
+from horizen_dump_scripts.utils import pop_cli_option
+
+"""
+This script restores the accounts of a restore artifact (eon.json or zend.json) in the EONBackupVault or
+ZendBackupVault contract, as the restoreEON and restoreZEND tasks, keeping several transactions in flight
+instead of waiting for the receipt of each one.
+It takes as input:
+ - the type of the artifact (eon or zend)
+ - the artifact json file
+ - the rpc url of the chain where the contracts are deployed
+ - the address of the vault contract (EONBackupVault for eon, ZendBackupVault for zend)
+ - the expected migration hash of the artifact (as EON_HASH and ZEND_HASH of the hardhat tasks)
+ - (optional) --batch-size <n>: number of accounts in each batchInsert transaction (default 250 for eon, 500 for zend)
+ - (optional) --distribute-max-count <n>: maxCount of each distribute transaction, only for eon (default 250)
+ - (optional) --window <n>: max number of transactions sent and not yet confirmed (default 8)
+ - (optional) --gas-limit <n>: gas limit of each transaction (default: gas estimated for the first one, plus 25%)
+ - (optional) --replace-after <seconds>: time after which a transaction not yet confirmed is sent again with
+   higher fees (default 120)
+ - (optional) --fee-bump <percent>: fee increase of the replacement transactions (default 25)
+ - (optional) --progress-file <file>: file where the progress is saved (default <artifact file>.progress.json)
+
+The transactions are signed with the ADMIN_PRIVK private key if the environment variable is set, otherwise they
+are sent from the first account of the node (e.g. a local Hardhat node). As in the hardhat tasks, the fees can
+be set with the PRIORITY_FEE (wei) and MAX_FEE (gwei) environment variables.
+
+The expected cumulative hash of each batch is calculated from the artifact, and the nonces are assigned locally,
+so the batches are always executed in order. The contract _cumulativeHash is the source of truth: when the
+script is restarted, the restore resumes from the account after the one at which the artifact hash equals
+the on-chain hash. The progress file keeps the transactions in flight, so that the ones of an interrupted run
+are waited for or replaced before resuming.
+For eon, after all the accounts are inserted, the distribute transactions needed to mint all the tokens are sent.
+"""
+
+DEFAULT_EON_BATCH_SIZE = 250
+DEFAULT_ZEND_BATCH_SIZE = 500
+DEFAULT_DISTRIBUTE_MAX_COUNT = 250
+DEFAULT_WINDOW = 8
+DEFAULT_REPLACE_AFTER = 120
+DEFAULT_FEE_BUMP_PERCENT = 25
+# Seconds to wait, at start, for the transactions of the sender sent by an interrupted run
+PENDING_TIMEOUT = 300
+POLL_INTERVAL = 1
+# The gas of the following batches can be higher than the one estimated for the first batch (e.g. a smaller
+# first batch after a restart, or the last zend batch that also notifies the end of the minting)
+GAS_LIMIT_MARGIN = 1.25
+MAX_RESYNC_ATTEMPTS = 3
+
+# EONBackupVault private storage, used to calculate the number of distribute transactions needed
+EON_VAULT_ADDRESS_LIST_SLOT = 2
+EON_VAULT_NEXT_REWARD_INDEX_SLOT = 5
+
+EON_BATCH_INSERT_SELECTOR = function_selector("batchInsert(bytes32,(address,uint256)[])")
+ZEND_BATCH_INSERT_SELECTOR = function_selector("batchInsert(bytes32,(bytes20,uint256)[])")
+DISTRIBUTE_SELECTOR = function_selector("distribute(uint256)")
+SET_CUMULATIVE_HASH_CHECKPOINT_SELECTOR = function_selector("setCumulativeHashCheckpoint(bytes32)")
+CUMULATIVE_HASH_SELECTOR = function_selector("_cumulativeHash()")
+CUMULATIVE_HASH_CHECKPOINT_SELECTOR = function_selector("cumulativeHashCheckpoint()")
+MORE_TO_DISTRIBUTE_SELECTOR = function_selector("moreToDistribute()")
+ZEN_TOKEN_SELECTOR = function_selector("zenToken()")
+
+
+class TransactionFailedError(Exception):
+    pass
+
+
+class NonceConflictError(Exception):
+    """The nonce of a new transaction was already used, e.g. by a transaction of an interrupted run."""
+    pass
+
+
+def encode_call(selector, types, values):
+    return selector + encode(types, values).hex()
+
+
+def encode_batch_insert(is_eon, expected_hash, batch):
+    if is_eon:
+        address_values = [(to_checksum_address(address), balance) for address, balance in batch]
+        return encode_call(EON_BATCH_INSERT_SELECTOR, ["bytes32", "(address,uint256)[]"], [expected_hash, address_values])
+    address_values = [(bytes.fromhex(address[2:]), balance) for address, balance in batch]
+    return encode_call(ZEND_BATCH_INSERT_SELECTOR, ["bytes32", "(bytes20,uint256)[]"], [expected_hash, address_values])
+
+
+def read_bytes32(client, vault_address, selector):
+    return bytes.fromhex(client.eth_call(vault_address, selector, "latest")[2:])
+
+
+def read_uint256(client, vault_address, selector):
+    return int(client.eth_call(vault_address, selector, "latest"), 16)
+
+
+def read_storage_uint256(client, contract_address, slot):
+    return int(client.call("eth_getStorageAt", [contract_address, hex(slot), "latest"]), 16)
+
+
+class InFlightTransaction:
+    def __init__(self, nonce, label, data, gas, max_fee, priority_fee, on_confirmed=None):
+        self.nonce = nonce
+        self.label = label
+        self.data = data
+        self.gas = gas
+        self.max_fee = max_fee
+        self.priority_fee = priority_fee
+        self.on_confirmed = on_confirmed
+        # All the transactions sent with this nonce: any of them can be the one mined
+        self.tx_hashes = []
+        self.sent_time = 0.0
+
+    def to_dict(self):
+        return {
+            "nonce": self.nonce,
+            "label": self.label,
+            "tx_hashes": self.tx_hashes,
+            "max_fee": self.max_fee,
+            "priority_fee": self.priority_fee,
+        }
+
+
+class Sender:
+    """Sends the transactions signed with the admin private key or, without a key, from the first node account."""
+    def __init__(self, client, private_key=None):
+        self.client = client
+        if private_key:
+            self.account = Account.from_key(private_key)
+            self.address = self.account.address
+            self.chain_id = int(client.call("eth_chainId", []), 16)
+        else:
+            self.account = None
+            self.address = client.call("eth_accounts", [])[0]
+
+    def send(self, to, transaction):
+        if self.account is not None:
+            signed_transaction = self.account.sign_transaction({
+                "type": 2,
+                "chainId": self.chain_id,
+                "nonce": transaction.nonce,
+                "to": to_checksum_address(to),
+                "value": 0,
+                "data": transaction.data,
+                "gas": transaction.gas,
+                "maxFeePerGas": transaction.max_fee,
+                "maxPriorityFeePerGas": transaction.priority_fee,
+            })
+            self.client.call("eth_sendRawTransaction", ["0x" + bytes(signed_transaction.raw_transaction).hex()])
+            return "0x" + bytes(signed_transaction.hash).hex()
+        return self.client.call("eth_sendTransaction", [{
+            "from": self.address,
+            "to": to,
+            "nonce": hex(transaction.nonce),
+            "data": transaction.data,
+            "gas": hex(transaction.gas),
+            "maxFeePerGas": hex(transaction.max_fee),
+            "maxPriorityFeePerGas": hex(transaction.priority_fee),
+        }])
+
+    def nonce(self, block="latest"):
+        return int(self.client.call("eth_getTransactionCount", [self.address, block]), 16)
+
+
+class RestoreProgress:
+    """Progress of the restore, saved to a json file after each change."""
+    def __init__(self, file_name, vault_address):
+        self.file_name = file_name
+        self.state = {"vault": vault_address.lower(), "accounts_restored": 0, "cumulative_hash": ZERO_HASH.hex(),
+                      "distribution_rounds": 0, "in_flight": []}
+
+    def load(self):
+        """Return the in flight transactions saved by a previous run on the same vault."""
+        if not os.path.exists(self.file_name):
+            return []
+        with open(self.file_name, 'r') as progress_file:
+            saved_state = json.load(progress_file)
+        if saved_state.get("vault") != self.state["vault"]:
+            print(f"Progress file {self.file_name} refers to vault {saved_state.get('vault')}, ignored")
+            return []
+        self.state.update(saved_state)
+        return self.state["in_flight"]
+
+    def update(self, **fields):
+        self.state.update(fields)
+        temporary_file_name = self.file_name + ".tmp"
+        with open(temporary_file_name, 'w') as progress_file:
+            json.dump(self.state, progress_file, indent=4)
+        os.replace(temporary_file_name, self.file_name)
+
+
+class TransactionPipeline:
+    """Keeps up to "window" transactions in flight, confirming them in nonce order and replacing the ones
+    not confirmed after replace_after seconds with higher fees."""
+    def __init__(self, client, sender, to, progress, window, max_fee, priority_fee, replace_after, fee_bump_percent):
+        self.client = client
+        self.sender = sender
+        self.to = to
+        self.progress = progress
+        self.window = window
+        self.max_fee = max_fee
+        self.priority_fee = priority_fee
+        self.replace_after = replace_after
+        self.fee_bump_percent = fee_bump_percent
+        self.next_nonce = sender.nonce()
+        self.in_flight = []
+        self.total_gas_used = 0
+        self.confirmed_transactions = 0
+
+    def _save_in_flight(self):
+        self.progress.update(in_flight=[transaction.to_dict() for transaction in self.in_flight])
+
+    def _submit(self, transaction, replacement):
+        try:
+            tx_hash = self.sender.send(self.to, transaction)
+        except JsonRpcError as e:
+            message = str(e.error).lower()
+            if replacement and ("nonce too low" in message or "underpriced" in message or "already known" in message):
+                # One of the transactions already sent has been mined or is still valid, the receipt is polled anyway
+                print(f"Replacement of {transaction.label} not accepted: {e.error}")
+                transaction.sent_time = time.monotonic()
+                return
+            if not replacement and ("nonce too low" in message or "underpriced" in message):
+                raise NonceConflictError(f"Nonce {transaction.nonce} already used: {e.error}")
+            raise
+        transaction.tx_hashes.append(tx_hash)
+        transaction.sent_time = time.monotonic()
+
+    def _bump_fees(self, transaction):
+        transaction.max_fee = transaction.max_fee * (100 + self.fee_bump_percent) // 100 + 1
+        transaction.priority_fee = transaction.priority_fee * (100 + self.fee_bump_percent) // 100 + 1
+        # The following transactions would get stuck too with the previous fees
+        self.max_fee = max(self.max_fee, transaction.max_fee)
+        self.priority_fee = max(self.priority_fee, transaction.priority_fee)
+
+    def send(self, label, data, gas, on_confirmed=None):
+        while len(self.in_flight) >= self.window:
+            self.poll()
+        transaction = InFlightTransaction(self.next_nonce, label, data, gas, self.max_fee, self.priority_fee, on_confirmed)
+        self._submit(transaction, False)
+        self.next_nonce = self.next_nonce + 1
+        self.in_flight.append(transaction)
+        self._save_in_flight()
+        print(f"Sent {label} (nonce {transaction.nonce})")
+
+    def poll(self):
+        tx_hashes = [tx_hash for transaction in self.in_flight for tx_hash in transaction.tx_hashes]
+        receipts = dict(zip(tx_hashes, self.client.batch_call([("eth_getTransactionReceipt", [tx_hash]) for tx_hash in tx_hashes])))
+        confirmed = False
+        # The transactions of the same sender are mined in nonce order
+        while len(self.in_flight) > 0:
+            transaction = self.in_flight[0]
+            receipt = next((receipts[tx_hash] for tx_hash in transaction.tx_hashes if receipts.get(tx_hash) is not None), None)
+            if receipt is None:
+                break
+            self.in_flight.pop(0)
+            gas_used = int(receipt["gasUsed"], 16)
+            self.total_gas_used = self.total_gas_used + gas_used
+            if int(receipt["status"], 16) != 1:
+                self._save_in_flight()
+                raise TransactionFailedError(f"{transaction.label} failed! Failed transaction: {receipt['transactionHash']}")
+            self.confirmed_transactions = self.confirmed_transactions + 1
+            print(f"Confirmed {transaction.label}. Gas used: {gas_used}. Cumulative gas used: {self.total_gas_used}")
+            if transaction.on_confirmed is not None:
+                transaction.on_confirmed()
+            confirmed = True
+
+        now = time.monotonic()
+        for transaction in self.in_flight:
+            if now - transaction.sent_time > self.replace_after:
+                self._bump_fees(transaction)
+                print(f"{transaction.label} not confirmed after {self.replace_after} seconds, sending it again with maxFeePerGas {transaction.max_fee}")
+                self._submit(transaction, True)
+        self._save_in_flight()
+        if not confirmed:
+            time.sleep(POLL_INTERVAL)
+
+    def wait_all(self):
+        while len(self.in_flight) > 0:
+            self.poll()
+
+
+def initial_fees(client):
+    """Return (maxFeePerGas, maxPriorityFeePerGas), from the environment as in the hardhat tasks or from the node."""
+    priority_fee = os.environ.get("PRIORITY_FEE")
+    max_fee = os.environ.get("MAX_FEE")
+    if priority_fee is not None and max_fee is not None:
+        print(f"Using priorityFeeInWei: {priority_fee}, maxFeeInGWei: {max_fee}")
+        return int(max_fee) * 10 ** 9, int(priority_fee)
+    priority_fee = int(client.call("eth_maxPriorityFeePerGas", []), 16)
+    base_fee = int(client.call("eth_getBlockByNumber", ["latest", False]).get("baseFeePerGas", "0x0"), 16)
+    return 2 * base_fee + priority_fee, priority_fee
+
+
+def wait_pending_transactions(sender, in_flight, max_fee, priority_fee, fee_bump_percent):
+    """Wait for the transactions still pending from a previous run. Return the fees for the new transactions,
+    increased to replace the previous transactions if they are still pending after PENDING_TIMEOUT."""
+    deadline = time.monotonic() + PENDING_TIMEOUT
+    while sender.nonce("pending") > sender.nonce("latest"):
+        if time.monotonic() > deadline:
+            if len(in_flight) == 0:
+                print("The sender has pending transactions not sent by this script. Exiting.")
+                sys.exit(1)
+            print("Transactions of the previous run still pending, they will be replaced")
+            for transaction in in_flight:
+                max_fee = max(max_fee, transaction["max_fee"] * (100 + fee_bump_percent) // 100 + 1)
+                priority_fee = max(priority_fee, transaction["priority_fee"] * (100 + fee_bump_percent) // 100 + 1)
+            break
+        print("Waiting for the pending transactions of the sender")
+        time.sleep(POLL_INTERVAL)
+    return max_fee, priority_fee
+
+
+def scan_artifact(artifact_file_name, is_eon, onchain_hash):
+    """Return the final hash of the artifact, its number of accounts, and the number of accounts already restored
+    (the accounts up to the one at which the hash is equal to the on-chain hash), or None if not found."""
+    calculated_hash = ZERO_HASH
+    restored_count = 0 if onchain_hash == ZERO_HASH else None
+    count = 0
+    for address, balance in iter_artifact(artifact_file_name):
+        calculated_hash = update_hash_bytes(calculated_hash, address, balance, is_eon)
+        count = count + 1
+        if calculated_hash == onchain_hash:
+            restored_count = count
+    return calculated_hash, count, restored_count
+
+
+def estimate_gas(client, sender, to, data, gas_limit):
+    if gas_limit is not None:
+        return gas_limit
+    estimated_gas = int(client.call("eth_estimateGas", [{"from": sender.address, "to": to, "data": data}]), 16)
+    return int(estimated_gas * GAS_LIMIT_MARGIN)
+
+
+def insert_batches(client, sender, pipeline, progress, is_eon, artifact_file_name, vault_address, restored_count,
+                   onchain_hash, batch_size, gas_limit, total_count):
+    total_batch_number = (total_count - restored_count + batch_size - 1) // batch_size
+    calculated_hash = onchain_hash
+    batch = []
+    batch_number = 0
+    with instrumentation.stage("insert_batches") as insert_batches_stage:
+        def send_batch():
+            nonlocal batch, batch_number, gas_limit, restored_count
+            batch_number = batch_number + 1
+            data = encode_batch_insert(is_eon, calculated_hash, batch)
+            gas_limit = estimate_gas(client, sender, vault_address, data, gas_limit)
+            restored_count = restored_count + len(batch)
+            on_confirmed = functools.partial(progress.update, accounts_restored=restored_count, cumulative_hash=calculated_hash.hex())
+            pipeline.send(f"batch {batch_number} of {total_batch_number}", data, gas_limit, on_confirmed)
+            insert_batches_stage.rows = insert_batches_stage.rows + len(batch)
+            batch = []
+
+        for address, balance in itertools.islice(iter_artifact(artifact_file_name), restored_count, None):
+            calculated_hash = update_hash_bytes(calculated_hash, address, balance, is_eon)
+            batch.append((address, balance))
+            if len(batch) == batch_size:
+                send_batch()
+        if len(batch) > 0:
+            send_batch()
+        pipeline.wait_all()
+
+
+def remaining_distribution_count(client, vault_address):
+    return read_storage_uint256(client, vault_address, EON_VAULT_ADDRESS_LIST_SLOT) - \
+        read_storage_uint256(client, vault_address, EON_VAULT_NEXT_REWARD_INDEX_SLOT)
+
+
+def distribute(client, sender, pipeline, progress, vault_address, max_count, gas_limit):
+    # moreToDistribute() is false also when the ERC20 address is not set, in which case distribute() reverts
+    if read_uint256(client, vault_address, ZEN_TOKEN_SELECTOR) == 0:
+        print("ERC20 address not set on the EONBackupVault. Exiting.")
+        sys.exit(1)
+    if read_uint256(client, vault_address, MORE_TO_DISTRIBUTE_SELECTOR) == 0:
+        remaining_count = remaining_distribution_count(client, vault_address)
+        if remaining_count == 0:
+            print("Token distribution already executed")
+            return
+        print(f"Token distribution not possible, {remaining_count} accounts still to be distributed. Exiting.")
+        sys.exit(1)
+    distribution_round = progress.state["distribution_rounds"]
+    with instrumentation.stage("distribute") as distribute_stage:
+        while read_uint256(client, vault_address, MORE_TO_DISTRIBUTE_SELECTOR) != 0:
+            remaining_count = remaining_distribution_count(client, vault_address)
+            rounds = max(1, (remaining_count + max_count - 1) // max_count)
+            print(f"Distributing to {remaining_count} accounts in {rounds} rounds")
+            data = encode_call(DISTRIBUTE_SELECTOR, ["uint256"], [max_count])
+            round_gas_limit = estimate_gas(client, sender, vault_address, data, gas_limit)
+            for _ in range(rounds):
+                distribution_round = distribution_round + 1
+                on_confirmed = functools.partial(progress.update, distribution_rounds=distribution_round)
+                pipeline.send(f"distribution round {distribution_round}", data, round_gas_limit, on_confirmed)
+            pipeline.wait_all()
+            distribute_stage.rows = distribute_stage.rows + remaining_count
+    print("Token distribution ended successfully")
+
+
+def restore(client, sender, progress, is_eon, artifact_file_name, vault_address, expected_hash, options):
+    max_fee, priority_fee = initial_fees(client)
+    in_flight = progress.load()
+    max_fee, priority_fee = wait_pending_transactions(sender, in_flight, max_fee, priority_fee, options["fee_bump_percent"])
+    pipeline = TransactionPipeline(client, sender, vault_address, progress, options["window"], max_fee, priority_fee,
+                                   options["replace_after"], options["fee_bump_percent"])
+
+    onchain_hash = read_bytes32(client, vault_address, CUMULATIVE_HASH_SELECTOR)
+    print("Calculating cumulative account hash")
+    with instrumentation.stage("verify_artifact") as verify_artifact_stage:
+        final_hash, total_count, restored_count = scan_artifact(artifact_file_name, is_eon, onchain_hash)
+        verify_artifact_stage.rows = total_count
+    print(f"Final account hash: {final_hash.hex()}")
+    if final_hash != expected_hash:
+        print(f"Calculated final account hash doesn't match with expected hash. Expected hash: {expected_hash.hex()}, actual hash: {final_hash.hex()}")
+        sys.exit(1)
+    if restored_count is None:
+        print(f"On-chain cumulative hash {onchain_hash.hex()} not found in the artifact. Exiting.")
+        sys.exit(1)
+
+    checkpoint = read_bytes32(client, vault_address, CUMULATIVE_HASH_CHECKPOINT_SELECTOR)
+    if checkpoint == ZERO_HASH:
+        print("Setting final account hash on the vault")
+        data = encode_call(SET_CUMULATIVE_HASH_CHECKPOINT_SELECTOR, ["bytes32"], [expected_hash])
+        pipeline.send("setCumulativeHashCheckpoint", data, estimate_gas(client, sender, vault_address, data, None))
+        pipeline.wait_all()
+    elif checkpoint != expected_hash:
+        print(f"Wrong final account hash on the vault! Expected: {expected_hash.hex()}, found: {checkpoint.hex()}")
+        sys.exit(1)
+    if not is_eon and read_uint256(client, vault_address, ZEN_TOKEN_SELECTOR) == 0:
+        print("ERC20 address not set on the ZendBackupVault. Exiting.")
+        sys.exit(1)
+
+    progress.update(accounts_restored=restored_count, cumulative_hash=onchain_hash.hex())
+    if onchain_hash == expected_hash:
+        print("Restore already completed")
+    else:
+        print(f"Restoring {total_count - restored_count} accounts, {restored_count} already restored")
+        insert_batches(client, sender, pipeline, progress, is_eon, artifact_file_name, vault_address, restored_count,
+                       onchain_hash, options["batch_size"], options["gas_limit"], total_count)
+        final_onchain_hash = read_bytes32(client, vault_address, CUMULATIVE_HASH_SELECTOR)
+        if final_onchain_hash != expected_hash:
+            print(f"Wrong final account hash. Expected: {expected_hash.hex()}, actual: {final_onchain_hash.hex()}")
+            sys.exit(1)
+        print("Correct final hash reached")
+
+    if is_eon:
+        distribute(client, sender, pipeline, progress, vault_address, options["distribute_max_count"], options["gas_limit"])
+    print(f"Confirmed transactions: {pipeline.confirmed_transactions}. Total gas used: {pipeline.total_gas_used}")
+
+
+def main():
+    instrumentation.setup("restore_vault")
+    batch_size = pop_cli_option("--batch-size")
+    options = {
+        "distribute_max_count": int(pop_cli_option("--distribute-max-count", DEFAULT_DISTRIBUTE_MAX_COUNT)),
+        "window": int(pop_cli_option("--window", DEFAULT_WINDOW)),
+        "gas_limit": pop_cli_option("--gas-limit"),
+        "replace_after": int(pop_cli_option("--replace-after", DEFAULT_REPLACE_AFTER)),
+        "fee_bump_percent": int(pop_cli_option("--fee-bump", DEFAULT_FEE_BUMP_PERCENT)),
+    }
+    progress_file_name = pop_cli_option("--progress-file")
+
+    if len(sys.argv) != 6 or sys.argv[1] not in {"eon", "zend"}:
+        print(
+            "Usage: restore_vault <eon|zend> <json file> <rpc url> <vault address> <expected hash> [--batch-size <n>] [--distribute-max-count <n>] [--window <n>] [--gas-limit <n>] [--replace-after <seconds>] [--fee-bump <percent>] [--progress-file <file>]"
+        )
+        sys.exit(1)
+
+    is_eon = sys.argv[1] == "eon"
+    artifact_file_name = sys.argv[2]
+    rpc_url = sys.argv[3]
+    vault_address = sys.argv[4]
+    expected_hash = bytes.fromhex(sys.argv[5][2:] if sys.argv[5].startswith("0x") else sys.argv[5])
+    if batch_size is None:
+        batch_size = DEFAULT_EON_BATCH_SIZE if is_eon else DEFAULT_ZEND_BATCH_SIZE
+    options["batch_size"] = int(batch_size)
+    if options["gas_limit"] is not None:
+        options["gas_limit"] = int(options["gas_limit"])
+    if progress_file_name is None:
+        progress_file_name = artifact_file_name + ".progress.json"
+
+    with JsonRpcClient(rpc_url, concurrency=1) as client:
+        sender = Sender(client, os.environ.get("ADMIN_PRIVK"))
+        print(f"Sending transactions from {sender.address}")
+        progress = RestoreProgress(progress_file_name, vault_address)
+        for attempt in range(MAX_RESYNC_ATTEMPTS):
+            try:
+                restore(client, sender, progress, is_eon, artifact_file_name, vault_address, expected_hash, options)
+                break
+            except NonceConflictError as e:
+                # A transaction of a previous run was mined in the meantime, the restore resumes from the new on-chain state
+                print(f"{e}. Resuming from the on-chain state.")
+            except TransactionFailedError as e:
+                print(e)
+                sys.exit(1)
+        else:
+            print("Too many nonce conflicts, another process may be sending transactions from the same account. Exiting.")
+            sys.exit(1)
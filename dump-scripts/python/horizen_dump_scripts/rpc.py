@@ -0,0 +1,128 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from eth_hash.auto import keccak
+
+from horizen_dump_scripts import instrumentation
+
+"""
+Minimal JSON-RPC client used by the scripts that need to send a large number of read requests to a node.
+
+The requests are grouped in JSON-RPC batches and the batches are sent concurrently by a pool of threads,
+each one with its own HTTP session. The results are returned in the same order as the requests.
+"""
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 120
+DEFAULT_RETRIES = 3
+
+
+class JsonRpcError(Exception):
+    def __init__(self, method, params, error):
+        super().__init__(f"RPC method {method} with params {params} failed: {error}")
+        self.method = method
+        self.params = params
+        self.error = error
+
+
+def function_selector(signature):
+    return "0x" + keccak(signature.encode()).hex()[:8]
+
+
+def block_identifier(block_height):
+    """Convert a block height to the format expected by the JSON-RPC block parameter."""
+    if isinstance(block_height, int):
+        return hex(block_height)
+    return block_height
+
+
+class JsonRpcClient:
+    def __init__(self, rpc_url, batch_size=DEFAULT_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY,
+                 timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES):
+        self.rpc_url = rpc_url
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def _post(self, payload):
+        attempt = 0
+        while True:
+            try:
+                response = self._session().post(self.rpc_url, json=payload, timeout=self.timeout)
+                response.raise_for_status()
+                return response.json()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError):
+                attempt = attempt + 1
+                if attempt > self.retries:
+                    raise
+                time.sleep(attempt)
+
+    def _send_batch(self, calls):
+        payload = [
+            {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+            for request_id, (method, params) in enumerate(calls)
+        ]
+        with instrumentation.rpc_call(f"batch:{calls[0][0]}"):
+            responses = self._post(payload)
+        if not isinstance(responses, list):
+            # Some nodes answer with a single error object when the whole batch is rejected
+            raise JsonRpcError(calls[0][0], calls[0][1], responses.get("error", responses))
+
+        results = [None] * len(calls)
+        received = [False] * len(calls)
+        for response in responses:
+            request_id = response.get("id")
+            if request_id is None or not 0 <= request_id < len(calls):
+                raise JsonRpcError(calls[0][0], calls[0][1], f"unexpected response {response}")
+            if "error" in response:
+                method, params = calls[request_id]
+                raise JsonRpcError(method, params, response["error"])
+            results[request_id] = response.get("result")
+            received[request_id] = True
+        if not all(received):
+            raise JsonRpcError(calls[0][0], calls[0][1], "missing responses in batch")
+        return results
+
+    def call(self, method, params):
+        """Send a single request and return its result."""
+        with instrumentation.rpc_call(method):
+            response = self._post({"jsonrpc": "2.0", "id": 0, "method": method, "params": params})
+        if "error" in response:
+            raise JsonRpcError(method, params, response["error"])
+        return response.get("result")
+
+    def batch_call(self, calls):
+        """Send a list of (method, params) requests and return the list of their results."""
+        batches = [calls[i:i + self.batch_size] for i in range(0, len(calls), self.batch_size)]
+        results = []
+        for batch_results in self.executor.map(self._send_batch, batches):
+            results.extend(batch_results)
+        return results
+
+    def eth_call(self, to, data, block_height):
+        return self.call("eth_call", [{"to": to, "data": data}, block_identifier(block_height)])
+
+    def batch_eth_call(self, to, data_list, block_height):
+        """Execute eth_call on the same contract for each call data in the list, at the given block."""
+        block = block_identifier(block_height)
+        return self.batch_call([("eth_call", [{"to": to, "data": data}, block]) for data in data_list])
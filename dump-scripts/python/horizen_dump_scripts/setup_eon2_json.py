@@ -1,21 +1,30 @@
-import collections
 import json
 import os
 import sys
 
-from horizen_dump_scripts.utils import dict_raise_on_duplicates
+from horizen_dump_scripts import instrumentation
+from horizen_dump_scripts.artifacts import write_artifact
+from horizen_dump_scripts.eon_dump_stream import DEFAULT_DUMP_METHOD, iter_dump_from_rpc
+from horizen_dump_scripts.statistics_report import STATS_OUT_OPTION, StatisticsReport
+from horizen_dump_scripts.utils import dict_raise_on_duplicates, pop_cli_option
 """
 This script transforms the account data dumped from Eon in the format requested for the migration
 to Horizen 2.0.
 In case there are zend addresses directly mapped to Ethereum addresses, provided off-chain by the accounts owners, their balances
 will be added to the accounts from EON.
 It takes as input:
- - the json file with the data dumped from Eon
+ - the json file with the data dumped from Eon. It is omitted if the dump is read from the node (see below)
  - the json file with the list of Eon delegators and their stakes
  - the json file with the Ethereum accounts where the some zend addresses were mapped to (optional)
  - the output filename to be generated.
 
 It creates a json file with the elements in alphabetical order.
+Instead of the dump file, the "--eon-rpc <url> --eon-height <height>" parameters can be provided: the dump is
+requested to the Eon node with the "--eon-dump-method <method>" RPC method (default debug_dumpBlock) and the accounts
+are processed while the response is received, without saving the whole dump on disk. With "--tee-dump <file>",
+the raw RPC response is saved to that file too, for audit.
+If the "--stats-out <file>" parameter is provided, a json report with the statistics of the processed accounts
+(top accounts, contracts and stakers by balance, balance histograms and counters) is saved too.
 The following accounts are not saved in the file:
  - accounts with 0 balance and no stakes 
  - smart contract accounts 
@@ -23,107 +32,139 @@ The following accounts are not saved in the file:
 """
 
 
+def add_restored_balance(results, report, account, amount):
+	"""Add the amount to the balance of the restored account, updating the statistics of the restored accounts."""
+	previous_balance = results.get(account)
+	if previous_balance is None:
+		balance = amount
+		report.histogram("restored_balances").add(balance)
+	else:
+		balance = previous_balance + amount
+		report.histogram("restored_balances").update(previous_balance, balance)
+	results[account] = balance
+	report.top("restored_accounts").update_item(account, balance)
+
 
 def main():
+	instrumentation.setup("setup_eon2_json")
+	stats_file_name = pop_cli_option(STATS_OUT_OPTION)
+	eon_rpc_url = pop_cli_option("--eon-rpc")
+	eon_height = pop_cli_option("--eon-height")
+	eon_dump_method = pop_cli_option("--eon-dump-method", DEFAULT_DUMP_METHOD)
+	tee_dump_file_name = pop_cli_option("--tee-dump")
+
 	NULL_ACCOUNT = "0x0000000000000000000000000000000000000000"
 
-	if len(sys.argv) != 4 and len(sys.argv) != 5 :
+	# When the dump is read from the node, the dump file name is not in the arguments
+	args = sys.argv if eon_rpc_url is None else sys.argv[:1] + [None] + sys.argv[1:]
+	if (len(args) != 4 and len(args) != 5) or ((eon_rpc_url is None) != (eon_height is None)):
 		print(
-			"Usage: setup_eon2_json <Eon dump file name> <Eon stakes file name> <eon_vault_automappings_file> <output_file>"
+			"Usage: setup_eon2_json <Eon dump file name> <Eon stakes file name> <eon_vault_automappings_file> <output_file>\n"
+			"       setup_eon2_json --eon-rpc <url> --eon-height <height> [--eon-dump-method <method>] [--tee-dump <file>] <Eon stakes file name> <eon_vault_automappings_file> <output_file>"
 		)
 		sys.exit(1)
 
-	eon_dump_file_name = sys.argv[1]
-	eon_stakes_file_name = sys.argv[2]
+	eon_dump_file_name = args[1]
+	eon_stakes_file_name = args[2]
 	eon_vault_automappings_file_name = ""
 
-	if  len(sys.argv) == 4:
-		result_file_name = sys.argv[3]
+	if  len(args) == 4:
+		result_file_name = args[3]
 	else:
-		eon_vault_automappings_file_name = sys.argv[3]
-		result_file_name = sys.argv[4]
+		eon_vault_automappings_file_name = args[3]
+		result_file_name = args[4]
 
 
-	with open(eon_dump_file_name, 'r') as eon_dump_file:
-		eon_dump_data = json.load(eon_dump_file, object_pairs_hook=dict_raise_on_duplicates)
+	if eon_rpc_url is None:
+		with open(eon_dump_file_name, 'r') as eon_dump_file, instrumentation.stage("load_eon_dump") as load_eon_dump_stage:
+			eon_dump_data = json.load(eon_dump_file, object_pairs_hook=dict_raise_on_duplicates)
+			load_eon_dump_stage.rows = len(eon_dump_data['accounts'])
+		eon_accounts = eon_dump_data['accounts'].items()
+	else:
+		# The accounts are processed while they are received from the node
+		eon_accounts = iter_dump_from_rpc(eon_rpc_url, int(eon_height), eon_dump_method, tee_dump_file_name)
 
 	results = {}
-	smart_contract_list = []
+	smart_contract_list = set()
 
 	total_balance = 0
 	total_restored_balance = 0
 	total_filtered_balance = 0
 
-	class Top20:
-		def __init__(self):
-			self.items = []
-
-		def add_item(self, new_item):
-			self.items.append(new_item)
-
-
-		def print_items(self):
-			self.items.sort(key=lambda x: x['amount'], reverse=True)
-			i = 0
-			for item in self.items:
-				if i<20:
-					print(f"{item['id']}, {item['amount']}")
-				i = i + 1
-
-
-	top_20_not_migrated_contracts = Top20()
+	report = StatisticsReport()
+	top_20_not_migrated_contracts = report.top("not_migrated_contracts")
 	total_contracts = 0
 
 	# Importing the EON accounts
-	for account, account_data in eon_dump_data['accounts'].items():
-		balance = int(account_data['balance'])
-		total_balance = total_balance + balance
-		if 'code' not in account_data:
-			if account == NULL_ACCOUNT:
+	with instrumentation.stage("process_accounts") as process_accounts_stage:
+		for account, account_data in eon_accounts:
+			process_accounts_stage.rows = process_accounts_stage.rows + 1
+			balance = int(account_data['balance'])
+			total_balance = total_balance + balance
+			if 'code' not in account_data:
+				if account == NULL_ACCOUNT:
+					total_filtered_balance = total_filtered_balance + balance
+					report.count("null_account")
+				elif balance != 0:
+					add_restored_balance(results, report, account.lower(), balance)
+					total_restored_balance = total_restored_balance + balance
+					report.count("eoa_accounts")
+					report.top("eoa_accounts").add_item(account.lower(), balance)
+					report.histogram("eoa_balances").add(balance)
+				else:
+					report.count("zero_balance_eoa_accounts")
+			else:
+				smart_contract_list.add(account.lower())		
 				total_filtered_balance = total_filtered_balance + balance
-			elif balance != 0:
-				results[account.lower()] = balance
-				total_restored_balance = total_restored_balance + balance
-		else:
-			smart_contract_list.append(account.lower())		
-			total_filtered_balance = total_filtered_balance + balance
-			top_20_not_migrated_contracts.add_item({'id': account.lower(), 'amount': balance})
-			total_contracts = total_contracts + 1
+				top_20_not_migrated_contracts.add_item(account.lower(), balance)
+				report.histogram("not_migrated_contract_balances").add(balance)
+				total_contracts = total_contracts + 1
 
 
 	# Importing the EON stakes
-	with open(eon_stakes_file_name, 'r') as eon_stakes_file:
+	with open(eon_stakes_file_name, 'r') as eon_stakes_file, instrumentation.stage("load_stakes") as load_stakes_stage:
 		eon_stakes_data = json.load(eon_stakes_file, object_pairs_hook=dict_raise_on_duplicates)
+		load_stakes_stage.rows = len(eon_stakes_data)
 
 	total_stakes = 0
-	for account, stake_amount in eon_stakes_data.items():
-		account = account.lower()
-		total_stakes = total_stakes + stake_amount
-		if account not in smart_contract_list and account != NULL_ACCOUNT:
-			# Forger Stakes native smart contract balance is equal to all the stakes + any possible direct transfer.
-			# total_balance doesn't need to be updated because the stakes amount were already added before.
-			# If the stake belongs to an EOA, stake_amount needs to be added to total_restored_balance and to be removed
-			# from total_filtered_balance.
-			total_restored_balance = total_restored_balance + stake_amount
-			total_filtered_balance = total_filtered_balance - stake_amount
-			if stake_amount != 0:
-				results[account] = results.get(account, 0) + stake_amount
-		else:
-			print("Delegator {} is a smart contract".format(account))
-			print(" its balance is {}".format(stake_amount))
+	with instrumentation.stage("process_stakes") as process_stakes_stage:
+		for account, stake_amount in eon_stakes_data.items():
+			account = account.lower()
+			total_stakes = total_stakes + stake_amount
+			if account not in smart_contract_list and account != NULL_ACCOUNT:
+				# Forger Stakes native smart contract balance is equal to all the stakes + any possible direct transfer.
+				# total_balance doesn't need to be updated because the stakes amount were already added before.
+				# If the stake belongs to an EOA, stake_amount needs to be added to total_restored_balance and to be removed
+				# from total_filtered_balance.
+				total_restored_balance = total_restored_balance + stake_amount
+				total_filtered_balance = total_filtered_balance - stake_amount
+				if stake_amount != 0:
+					add_restored_balance(results, report, account, stake_amount)
+				report.count("eoa_stakers")
+				report.top("eoa_stakers").add_item(account, stake_amount)
+				report.histogram("eoa_stakes").add(stake_amount)
+			else:
+				report.count("contract_stakers")
+				report.top("contract_stakers").add_item(account, stake_amount)
+				print("Delegator {} is a smart contract".format(account))
+				print(" its balance is {}".format(stake_amount))
+		process_stakes_stage.rows = len(eon_stakes_data)
 
 	total_balance_mapped = 0
 	# Importing Ethereum-mapped zend accounts
-	if  len(sys.argv) == 5:
-		with open(eon_vault_automappings_file_name, 'r') as eon_vault_automappings_file:
+	if  eon_vault_automappings_file_name != "":
+		with open(eon_vault_automappings_file_name, 'r') as eon_vault_automappings_file, instrumentation.stage("process_automappings") as process_automappings_stage:
 			eon_vault_automappings_data = json.load(eon_vault_automappings_file, object_pairs_hook=dict_raise_on_duplicates)
+			process_automappings_stage.rows = len(eon_vault_automappings_data)
 			for account, amount in eon_vault_automappings_data.items():
 				account = account.lower()
 				total_balance_mapped = total_balance_mapped + amount
 				total_balance = total_balance + amount
 				total_restored_balance = total_restored_balance + amount
 				if amount != 0:
-					results[account] = results.get(account, 0) + amount
+					add_restored_balance(results, report, account, amount)
+				report.count("mapped_accounts")
+				report.top("mapped_accounts").add_item(account, amount)
 
 
 
@@ -139,7 +180,21 @@ def main():
 
 
 	assert total_balance == (total_restored_balance + total_filtered_balance), "Total balance is different from the sum of restored and filtered balances"
-	sorted_accounts = collections.OrderedDict(sorted(results.items()))
-
-	with open(result_file_name, "w") as jsonFile:
-		json.dump(sorted_accounts, jsonFile, indent=4)
+	with instrumentation.stage("sort") as sort_stage:
+		sorted_accounts = sorted(results.items())
+		sort_stage.rows = len(sorted_accounts)
+
+	if stats_file_name is not None:
+		with instrumentation.stage("statistics"):
+			report.count("not_migrated_contracts", total_contracts)
+			report.count("restored_accounts", len(sorted_accounts))
+			report.add_total("balance", total_balance)
+			report.add_total("stakes", total_stakes)
+			report.add_total("mapped_accounts", total_balance_mapped)
+			report.add_total("restored_balance", total_restored_balance)
+			report.add_total("not_restored_balance", total_filtered_balance)
+			report.write(stats_file_name)
+
+	with instrumentation.stage("write") as write_stage:
+		write_artifact(result_file_name, sorted_accounts)
+		write_stage.rows = len(sorted_accounts)
@@ -0,0 +1,201 @@
+import json
+import math
+import random
+import sys
+
+from eth_utils import to_checksum_address
+
+from horizen_dump_scripts import instrumentation
+from horizen_dump_scripts.artifacts import iter_artifact
+from horizen_dump_scripts.forger_stakes_series import PAGE_SIZE, eth_call, get_paged_items
+from horizen_dump_scripts.rpc import DEFAULT_BATCH_SIZE, DEFAULT_CONCURRENCY, JsonRpcClient, block_identifier, \
+    function_selector
+from horizen_dump_scripts.utils import dict_raise_on_duplicates, pop_cli_option
+
+"""
+This script checks a sample of the accounts of the Horizen2 eon file, created by setup_eon2_json, against the state
+of the Eon node at the block height of the dump. It is much faster than checking all the accounts, so it can be run
+before every signing.
+It takes as input:
+ - the Horizen2 eon file
+ - the rpc url of the Eon node
+ - the block height of the Eon dump
+ - (optional) --automappings <file>: the eon vault automappings file used by setup_eon2_json
+ - (optional) --top <n>: number of accounts with the largest balances that are always checked (default 100)
+ - (optional) --sample-size <n>: number of the other accounts that are checked (default 1000)
+ - (optional) --seed <n>: seed of the random sample (default 0)
+ - (optional) --batch-size <n>: number of calls in each JSON-RPC batch request (default 100)
+ - (optional) --concurrency <n>: number of batch requests sent in parallel (default 8)
+
+The sample is stratified by balance: the other accounts are grouped by the number of digits of their balance and
+each group is sampled in proportion to its size, so that the sample has the same distribution of balances as the
+file. The same seed always selects the same accounts from the same file.
+For each checked account, the balance, the code and the stakes of the account as delegator are read at the block
+height, and:
+ - the account must not be a smart contract
+ - the balance in the file must be equal to the Eon balance + the stakes + the automapped balance
+At the end, the number of mismatches is printed together with the upper bound of the 95% confidence interval
+(Wilson score) of the mismatch rate of the accounts that are not in the top ones.
+Note: the accounts missing from the file are not detected by this check, check_addresses_balance_from_eon does it
+with the Eon dump.
+"""
+
+GET_PAGED_FORGERS_STAKES_BY_DELEGATOR_SELECTOR = function_selector("getPagedForgersStakesByDelegator(address,int32,int32)")
+FORGER_STAKE_LIST_TYPE = "(bytes32,bytes32,bytes1,uint256)[]"
+
+# z value of the 95% confidence interval
+CONFIDENCE_Z = 1.96
+
+# Global variable to keep track of failed checks
+failed_spot_check = False
+def set_failed_execution():
+    global failed_spot_check
+    failed_spot_check = True
+
+
+def balance_stratum(balance):
+    return len(str(balance))
+
+
+def select_accounts(accounts, top_count, sample_size, seed):
+    """Return the top accounts by balance and the stratified random sample of the other accounts."""
+    by_balance = sorted(accounts, key=lambda account: account[1], reverse=True)
+    top_accounts = by_balance[:top_count]
+    top_addresses = {address for address, _ in top_accounts}
+    others = [account for account in accounts if account[0] not in top_addresses]
+    if sample_size >= len(others):
+        return top_accounts, others, len(others)
+
+    strata = {}
+    for account in others:
+        strata.setdefault(balance_stratum(account[1]), []).append(account)
+
+    # Proportional allocation, the remaining accounts go to the strata with the largest remainders
+    quotas = {stratum: sample_size * len(stratum_accounts) / len(others) for stratum, stratum_accounts in strata.items()}
+    allocation = {stratum: math.floor(quota) for stratum, quota in quotas.items()}
+    by_remainder = sorted(strata, key=lambda stratum: (allocation[stratum] - quotas[stratum], stratum))
+    for stratum in by_remainder[:sample_size - sum(allocation.values())]:
+        allocation[stratum] = allocation[stratum] + 1
+
+    rng = random.Random(seed)
+    sample = []
+    for stratum in sorted(strata):
+        sample.extend(rng.sample(strata[stratum], allocation[stratum]))
+    return top_accounts, sample, len(others)
+
+
+def get_account_states(client, addresses, block_height):
+    """Return {address: (balance, code, stakes)} at the block height."""
+    block = block_identifier(block_height)
+    results = client.batch_call(
+        [("eth_getBalance", [address, block]) for address in addresses] +
+        [("eth_getCode", [address, block]) for address in addresses]
+    )
+    paged_call = lambda request, index: eth_call(
+        request[0], GET_PAGED_FORGERS_STAKES_BY_DELEGATOR_SELECTOR, ["address", "int32", "int32"],
+        [to_checksum_address(request[1]), index, PAGE_SIZE]
+    )
+    stakes = get_paged_items(client, [(block_height, address) for address in addresses], paged_call, FORGER_STAKE_LIST_TYPE)
+    return {
+        address: (int(results[i], 16), results[len(addresses) + i], sum(stake[3] for stake in stakes[(block_height, address)]))
+        for i, address in enumerate(addresses)
+    }
+
+
+def check_accounts(accounts, account_states, automappings):
+    """Return the number of accounts that do not match the Eon state."""
+    mismatches = 0
+    for address, expected_balance in accounts:
+        (balance, code, stakes) = account_states[address]
+        if code not in ("0x", "", None):
+            mismatches = mismatches + 1
+            print(f"EON address {address} is a smart contract at the dump height.")
+            continue
+        automapped_balance = automappings.get(address, 0)
+        if balance + stakes + automapped_balance != expected_balance:
+            mismatches = mismatches + 1
+            print(f"EON address {address} balances do not match. Horizen2 data: {expected_balance} wei. "
+                  f"EON data: {balance} wei balance + {stakes} wei stakes + {automapped_balance} wei automapped.")
+    return mismatches
+
+
+def wilson_upper_bound(failures, count, z=CONFIDENCE_Z):
+    if count == 0:
+        return 1.0
+    rate = failures / count
+    center = rate + z * z / (2 * count)
+    margin = z * math.sqrt(rate * (1 - rate) / count + z * z / (4 * count * count))
+    return min(1.0, (center + margin) / (1 + z * z / count))
+
+
+def spot_check(horizen2_file_name, client, block_height, automappings, top_count, sample_size, seed):
+    with instrumentation.stage("load_horizen2") as load_stage:
+        accounts = list(iter_artifact(horizen2_file_name))
+        load_stage.rows = len(accounts)
+    if len(accounts) == 0:
+        set_failed_execution()
+        print(f"No account found in Horizen2 file {horizen2_file_name}")
+        return
+
+    with instrumentation.stage("select") as select_stage:
+        (top_accounts, sample, others_count) = select_accounts(accounts, top_count, sample_size, seed)
+        select_stage.rows = len(top_accounts) + len(sample)
+    print(f"Checking the {len(top_accounts)} largest accounts and {len(sample)} of the other {others_count} accounts (seed {seed})")
+
+    with instrumentation.stage("get_account_states") as get_states_stage:
+        account_states = get_account_states(client, [address for address, _ in top_accounts + sample], block_height)
+        get_states_stage.rows = len(account_states)
+
+    with instrumentation.stage("check") as check_stage:
+        top_mismatches = check_accounts(top_accounts, account_states, automappings)
+        sample_mismatches = check_accounts(sample, account_states, automappings)
+        check_stage.rows = len(top_accounts) + len(sample)
+
+    if top_mismatches + sample_mismatches > 0:
+        set_failed_execution()
+    print(f"Largest accounts: {top_mismatches} mismatches out of {len(top_accounts)}")
+    if len(sample) == others_count:
+        print(f"Other accounts: {sample_mismatches} mismatches out of {others_count} (all checked)")
+    elif len(sample) > 0:
+        upper_bound = wilson_upper_bound(sample_mismatches, len(sample))
+        print(f"Other accounts: {sample_mismatches} mismatches out of {len(sample)} sampled. "
+              f"Mismatch rate upper bound (95% confidence): {upper_bound:.4%}, "
+              f"about {math.ceil(upper_bound * others_count)} of {others_count} accounts")
+
+
+def main():
+    instrumentation.setup("spot_check_eon")
+    automappings_file_name = pop_cli_option("--automappings")
+    top_count = int(pop_cli_option("--top", 100))
+    sample_size = int(pop_cli_option("--sample-size", 1000))
+    seed = int(pop_cli_option("--seed", 0))
+    batch_size = int(pop_cli_option("--batch-size", DEFAULT_BATCH_SIZE))
+    concurrency = int(pop_cli_option("--concurrency", DEFAULT_CONCURRENCY))
+
+    if len(sys.argv) != 4:
+        print(
+            "Usage: spot_check_eon <Horizen2 file> <Eon rpc url> <Eon dump block height> [--automappings <file>] "
+            "[--top <n>] [--sample-size <n>] [--seed <n>] [--batch-size <n>] [--concurrency <n>]"
+        )
+        sys.exit(1)
+
+    horizen2_file_name = sys.argv[1]
+    rpc_url = sys.argv[2]
+    block_height = int(sys.argv[3])
+
+    automappings = {}
+    if automappings_file_name is not None:
+        with open(automappings_file_name, 'r') as automappings_file:
+            automappings = {
+                account.lower(): amount
+                for account, amount in json.load(automappings_file, object_pairs_hook=dict_raise_on_duplicates).items()
+            }
+
+    with JsonRpcClient(rpc_url, batch_size=batch_size, concurrency=concurrency) as client:
+        spot_check(horizen2_file_name, client, block_height, automappings, top_count, sample_size, seed)
+
+    if failed_spot_check:
+        print("Horizen 2 spot check failed.")
+        sys.exit(1)
+    else:
+        print("Horizen 2 spot check successful.")
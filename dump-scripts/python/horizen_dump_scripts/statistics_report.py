@@ -0,0 +1,142 @@
+import heapq
+import itertools
+import json
+
+"""
+Streaming statistics collected by the dump scripts while they scan the accounts.
+
+All the statistics are computed in a single pass with bounded memory:
+ - top-K items by amount, kept in a min-heap of K elements
+ - histograms of the amounts, with one bucket for each power of 10
+ - counters and totals
+
+The report is saved as a json file when the script is executed with the "--stats-out <file>" parameter.
+"""
+
+STATS_OUT_OPTION = "--stats-out"
+DEFAULT_TOP_K = 20
+
+
+class TopK:
+    def __init__(self, k=DEFAULT_TOP_K):
+        self.k = k
+        self.heap = []
+        # Among items with the same amount, the first added wins, as with a stable sort
+        self.sequence = itertools.count()
+        # {item id: heap entry} of the items in the heap, kept only by update_item
+        self.heap_entries = {}
+
+    def add_item(self, item_id, amount):
+        entry = (amount, -next(self.sequence), item_id)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def update_item(self, item_id, amount):
+        """Add the item, or update the amount of an item already added. The amount of an item can only increase.
+
+        It is used when the amounts are summed while scanning, instead of adding the final amounts in another pass.
+        A TopK is fed either with add_item or with update_item.
+        """
+        entry = self.heap_entries.get(item_id)
+        if entry is not None:
+            # An item in the heap stays there with a higher amount, and keeps its position among equal amounts
+            updated_entry = (amount, entry[1], item_id)
+            self.heap[self.heap.index(entry)] = updated_entry
+            heapq.heapify(self.heap)
+            self.heap_entries[item_id] = updated_entry
+            return
+        entry = (amount, -next(self.sequence), item_id)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+            self.heap_entries[item_id] = entry
+        elif entry > self.heap[0]:
+            removed_entry = heapq.heapreplace(self.heap, entry)
+            del self.heap_entries[removed_entry[2]]
+            self.heap_entries[item_id] = entry
+
+    def items(self):
+        """Return the (id, amount) items, ordered by amount from the highest."""
+        return [(item_id, amount) for (amount, _, item_id) in sorted(self.heap, reverse=True)]
+
+    def print_items(self):
+        for item_id, amount in self.items():
+            print(f"{item_id}, {amount}")
+
+    def to_list(self):
+        return [{"id": item_id, "amount": amount} for item_id, amount in self.items()]
+
+
+class Histogram:
+    """Counts and sums the amounts in buckets [10^n, 10^(n+1)). Zero amounts have their own bucket."""
+
+    def __init__(self):
+        self.counts = {}
+        self.totals = {}
+
+    @staticmethod
+    def bucket(amount):
+        return len(str(amount)) - 1 if amount > 0 else -1
+
+    def add(self, amount):
+        bucket = self.bucket(amount)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.totals[bucket] = self.totals.get(bucket, 0) + amount
+
+    def update(self, previous_amount, amount):
+        """Replace an amount already added, when the amounts are summed while scanning."""
+        previous_bucket = self.bucket(previous_amount)
+        self.counts[previous_bucket] = self.counts[previous_bucket] - 1
+        self.totals[previous_bucket] = self.totals[previous_bucket] - previous_amount
+        if self.counts[previous_bucket] == 0:
+            del self.counts[previous_bucket]
+            del self.totals[previous_bucket]
+        self.add(amount)
+
+    def to_list(self):
+        buckets = []
+        for bucket in sorted(self.counts):
+            if bucket == -1:
+                range_min, range_max = 0, 0
+            else:
+                range_min, range_max = 10 ** bucket, 10 ** (bucket + 1) - 1
+            buckets.append({"min": range_min, "max": range_max, "count": self.counts[bucket], "total": self.totals[bucket]})
+        return buckets
+
+
+class StatisticsReport:
+    def __init__(self, top_k=DEFAULT_TOP_K):
+        self.top_k = top_k
+        self.counts = {}
+        self.totals = {}
+        self.tops = {}
+        self.histograms = {}
+
+    def count(self, name, value=1):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def add_total(self, name, amount):
+        self.totals[name] = self.totals.get(name, 0) + amount
+
+    def top(self, name):
+        if name not in self.tops:
+            self.tops[name] = TopK(self.top_k)
+        return self.tops[name]
+
+    def histogram(self, name):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+        return self.histograms[name]
+
+    def to_dict(self):
+        return {
+            "counts": self.counts,
+            "totals": self.totals,
+            "top": {name: top.to_list() for name, top in self.tops.items()},
+            "histograms": {name: histogram.to_list() for name, histogram in self.histograms.items()},
+        }
+
+    def write(self, file_name):
+        with open(file_name, "w") as report_file:
+            json.dump(self.to_dict(), report_file, indent=4)
@@ -1,3 +1,6 @@
+import sys
+
+
 def dict_raise_on_duplicates(ordered_pairs):
     """Reject duplicate keys."""
     d = {}
@@ -7,3 +10,23 @@ def dict_raise_on_duplicates(ordered_pairs):
         else:
            d[k] = v
     return d
+
+
+def pop_cli_option(option_name, default=None):
+    """Remove an optional "--name value" (or "--name=value") pair from sys.argv and return its value.
+
+    The scripts validate their positional parameters by counting sys.argv, so optional flags are
+    stripped before those checks run.
+    """
+    for i, arg in enumerate(sys.argv):
+        if arg == option_name:
+            if i + 1 >= len(sys.argv):
+                print(f"Missing value for option {option_name}")
+                sys.exit(1)
+            value = sys.argv[i + 1]
+            del sys.argv[i:i + 2]
+            return value
+        if arg.startswith(option_name + "="):
+            del sys.argv[i]
+            return arg[len(option_name) + 1:]
+    return default
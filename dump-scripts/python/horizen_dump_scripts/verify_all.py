@@ -0,0 +1,199 @@
+import contextlib
+import csv
+import gc
+import io
+import json
+import multiprocessing
+import sys
+import time
+
+from horizen_dump_scripts import check_addresses_balance_from_eon, check_addresses_balance_from_zend, \
+    check_total_balance_from_zend, instrumentation
+from horizen_dump_scripts.artifacts import iter_artifact
+from horizen_dump_scripts.migrationhash import calculate_migration_hash
+from horizen_dump_scripts.utils import dict_raise_on_duplicates, pop_cli_option
+
+"""
+This script runs all the checks done before signing the migration hashes in a single command:
+ - check_addresses_balance_from_zend: --zend-dump, --zend-vault and optionally --mapping and --eon-vault
+ - check_addresses_balance_from_eon: --eon-dump, --eon-stakes, --horizen2 and optionally --eon-vault
+ - check_total_balance_from_zend: --zend-dump, --height, --eon-sidechain-balance and --network
+ - migrationhash of --zend-vault and of --horizen2, compared with --zend-hash and --eon-hash if provided
+Each check is run if all its inputs are provided. The input files are:
+ - --zend-dump: the zend dump csv file
+ - --zend-vault: the zend vault file created by zend_to_horizen
+ - --mapping: the zend - Ethereum addresses mapping file used by zend_to_horizen
+ - --eon-vault: the eon vault (automappings) file created by zend_to_horizen with the mapping file
+ - --eon-dump: the Eon dump file
+ - --eon-stakes: the Eon stakes file created by get_all_forger_stakes
+ - --horizen2: the Horizen2 eon file created by setup_eon2_json
+
+Each input file is parsed once by this process, even when it is used by more checks. Then every check is run in
+its own process of a pool, at the same time as the others. The processes are forked, so they get the parsed
+inputs without parsing or pickling them again. The memory pages are shared copy-on-write: the pages a check
+touches are still copied, also just by reading the objects (their reference counts are updated), and the inputs
+are frozen before forking only to keep the garbage collector from touching all of them. A check can modify its
+copy of the inputs (e.g. the zend check removes the processed addresses) without affecting the other checks.
+The output of each check is printed when it completes, followed by a summary. The exit status is 1 if any check
+failed.
+"""
+
+CHECK_OPTIONS = {
+    "zend_addresses": ("zend_dump", "zend_vault"),
+    "eon_addresses": ("eon_dump", "eon_stakes", "horizen2"),
+    "total_balance": ("zend_dump", "height", "eon_sidechain_balance", "network"),
+    "zend_migration_hash": ("zend_vault",),
+    "eon_migration_hash": ("horizen2",),
+}
+
+# Options and parsed input files, set before the pool processes are forked
+options = {}
+inputs = {}
+
+
+def load_zend_dump(zend_dump_file_name):
+    """Return the {zend address: balance in satoshi} of the zend dump and the sum of all its rows."""
+    zend_dump_data = {}
+    total_balance = 0
+    with open(zend_dump_file_name, 'r') as zend_dump_file:
+        for row in csv.reader(zend_dump_file):
+            balance = int(row[1])
+            zend_dump_data[row[0]] = balance
+            total_balance = total_balance + balance
+    return zend_dump_data, total_balance
+
+
+def load_json(file_name):
+    with open(file_name, 'r') as input_file:
+        return json.load(input_file, object_pairs_hook=dict_raise_on_duplicates)
+
+
+def load_inputs(checks):
+    """Parse each input file needed by the checks."""
+    needed_options = {option_name for check_name in checks for option_name in CHECK_OPTIONS[check_name]}
+    if "zend_addresses" in checks or "eon_addresses" in checks:
+        needed_options.update(option_name for option_name in ("mapping", "eon_vault") if options[option_name] is not None)
+
+    if "zend_dump" in needed_options:
+        with instrumentation.stage("load_zend_dump") as load_stage:
+            inputs["zend_dump"], inputs["zend_dump_total_balance"] = load_zend_dump(options["zend_dump"])
+            load_stage.rows = len(inputs["zend_dump"])
+    for option_name in ("zend_vault", "horizen2"):
+        if option_name in needed_options:
+            with instrumentation.stage("load_" + option_name) as load_stage:
+                inputs[option_name] = dict(iter_artifact(options[option_name]))
+                load_stage.rows = len(inputs[option_name])
+    if "eon_dump" in needed_options:
+        with instrumentation.stage("load_eon_dump") as load_stage:
+            inputs["eon_dump"] = load_json(options["eon_dump"])["accounts"]
+            load_stage.rows = len(inputs["eon_dump"])
+    for option_name in ("eon_stakes", "mapping", "eon_vault"):
+        if option_name in needed_options:
+            with instrumentation.stage("load_" + option_name) as load_stage:
+                inputs[option_name] = load_json(options[option_name])
+                load_stage.rows = len(inputs[option_name])
+
+
+def check_zend_addresses():
+    check_addresses_balance_from_zend.check_zend_data(
+        inputs["zend_dump"], inputs["zend_vault"], inputs.get("mapping"), inputs.get("eon_vault"),
+        options["zend_dump"], options["zend_vault"], options["mapping"], options["eon_vault"]
+    )
+    return not check_addresses_balance_from_zend.failed_zend_check
+
+
+def check_eon_addresses():
+    check_addresses_balance_from_eon.check_eon_data(
+        inputs["eon_dump"], inputs["eon_stakes"], inputs.get("eon_vault"), inputs["horizen2"],
+        options["eon_dump"], options["horizen2"]
+    )
+    return not check_addresses_balance_from_eon.failed_horizen2_check
+
+
+def check_total_balance():
+    return check_total_balance_from_zend.check_total_balance(
+        int(options["height"]), inputs["zend_dump_total_balance"], int(options["eon_sidechain_balance"]), options["network"]
+    )
+
+
+def check_migration_hash(option_name, expected_hash_option_name, is_eon):
+    migration_hash = calculate_migration_hash(inputs[option_name].items(), is_eon).hex()
+    print(f"Migration hash of {options[option_name]}: {migration_hash}")
+    expected_hash = options[expected_hash_option_name]
+    if expected_hash is None:
+        return True
+    expected_hash = expected_hash.lower().removeprefix("0x")
+    if migration_hash != expected_hash:
+        print(f"Migration hash does not match the expected one {expected_hash}")
+        return False
+    return True
+
+
+CHECKS = {
+    "zend_addresses": check_zend_addresses,
+    "eon_addresses": check_eon_addresses,
+    "total_balance": check_total_balance,
+    "zend_migration_hash": lambda: check_migration_hash("zend_vault", "zend_hash", False),
+    "eon_migration_hash": lambda: check_migration_hash("horizen2", "eon_hash", True),
+}
+
+
+def run_check(check_name):
+    """Run a check in a pool process. Return its name, whether it succeeded, its output and its wall time."""
+    start_time = time.perf_counter()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            successful = CHECKS[check_name]()
+        except Exception as e:
+            print(f"Check interrupted by an error: {type(e).__name__}: {e}")
+            successful = False
+    return check_name, successful, output.getvalue(), time.perf_counter() - start_time
+
+
+def main():
+    instrumentation.setup("verify_all")
+    for option_name in ("zend_dump", "zend_vault", "mapping", "eon_vault", "eon_dump", "eon_stakes", "horizen2",
+                        "height", "eon_sidechain_balance", "network", "zend_hash", "eon_hash"):
+        options[option_name] = pop_cli_option("--" + option_name.replace("_", "-"))
+
+    checks = [
+        check_name for check_name, option_names in CHECK_OPTIONS.items()
+        if all(options[option_name] is not None for option_name in option_names)
+    ]
+    if len(sys.argv) != 1 or len(checks) == 0:
+        print(
+            "Usage: verify_all [--zend-dump <file>] [--zend-vault <file>] [--mapping <file>] [--eon-vault <file>] "
+            "[--eon-dump <file>] [--eon-stakes <file>] [--horizen2 <file>] "
+            "[--height <mainchain block height> --eon-sidechain-balance <satoshis> --network <mainnet|testnet>] "
+            "[--zend-hash <hash>] [--eon-hash <hash>]"
+        )
+        sys.exit(1)
+    if options["network"] is not None and options["network"] not in ["mainnet", "testnet"]:
+        print("The network has to be either 'mainnet' or 'testnet'.")
+        sys.exit(1)
+    if (options["mapping"] is None) != (options["eon_vault"] is None) and "zend_addresses" in checks:
+        print("The zend addresses check requires both --mapping and --eon-vault, or none of them.")
+        sys.exit(1)
+
+    print(f"Running checks: {', '.join(checks)}")
+    load_inputs(checks)
+
+    # The parsed inputs are moved to the permanent generation, so the garbage collections of the forked processes
+    # do not visit them (the pages read by a check are still copied when their reference counts change)
+    gc.freeze()
+    failed_checks = []
+    # Each process runs a single check, so the inputs modified by a check are not seen by another one
+    with multiprocessing.get_context("fork").Pool(len(checks), maxtasksperchild=1) as pool, \
+            instrumentation.stage("checks") as checks_stage:
+        for check_name, successful, output, wall_time in pool.imap_unordered(run_check, checks):
+            print(f"==== {check_name}: {'successful' if successful else 'FAILED'} ({wall_time:.1f} s) ====")
+            print(output, end="")
+            if not successful:
+                failed_checks.append(check_name)
+            checks_stage.rows = checks_stage.rows + 1
+
+    if len(failed_checks) > 0:
+        print(f"Verification failed. Failed checks: {', '.join(failed_checks)}")
+        sys.exit(1)
+    print(f"Verification successful. {len(checks)} checks run.")
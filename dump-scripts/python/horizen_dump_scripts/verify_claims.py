@@ -0,0 +1,344 @@
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+
+from eth_hash.auto import keccak
+from eth_keys import keys
+from eth_keys.exceptions import BadSignature
+from eth_utils import to_checksum_address
+
+from horizen_dump_scripts import instrumentation
+from horizen_dump_scripts.artifacts import iter_artifact
+from horizen_dump_scripts.utils import pop_cli_option
+from horizen_dump_scripts.zend_keys import decode_hex, hash160, parse_public_key
+
+"""
+This script verifies offline a list of claims of the ZendBackupVault contract (claimP2PKH and claimP2SH) before
+they are sent, and reports which ones would revert and why.
+It takes as input:
+ - a json lines file with one claim per line, with the parameters of the contract call:
+    {"destAddress": <address>, "signature": <hex>, "pubKey": [<x>, <y>]} for claimP2PKH
+    {"destAddress": <address>, "signatures": [<hex>, ...], "script": <hex>, "pubKeys": [[<x>, <y>], ...]} for claimP2SH
+   Each public key can also be a hex encoded compressed or uncompressed public key.
+ - the zend vault json file created by zend_to_horizen
+ - the message_prefix of the contract (the token symbol followed by the base message)
+ - the output csv file name
+ - (optional) --workers <n>: number of processes used to verify the signatures (default: number of cpus)
+
+The checks of the contract and of its VerificationLibrary are repeated in the same order, so the reported error is
+the custom error (with its arguments) the contract would revert with, or "Panic(<code>)" for the out of bounds
+accesses and underflows of a malformed script. A claim of a key already claimed by a previous line of the file is
+reported as NothingToClaim, as the contract would do after the first claim is executed.
+The claims are checked against the balances of the zend vault file: the balances already claimed on chain and the
+state checks of the canClaim modifier (data loaded, token set) are not checked.
+
+The output csv file has the format:
+    <line number, claim type (p2pkh or p2sh), vault key, balance in wei, result (ok or the revert error)>
+"""
+
+MESSAGE_MAGIC_BYTES = b"Zcash Signed Message:\n"
+# Max s value accepted by parseZendSignature (secp256k1 n / 2)
+MAX_S = 0x7FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF5D576E7357A4501DDFE92F46681B20A0
+MAX_MULTISIG_KEYS = 16
+COMPRESSED_PUBLIC_KEY_LENGTH = 33
+UNCOMPRESSED_PUBLIC_KEY_LENGTH = 65
+
+# Each signature recovery takes milliseconds without coincurve, so the tasks are small
+CLAIMS_PER_TASK = 100
+
+PANIC_ARITHMETIC_UNDERFLOW = "0x11"
+PANIC_ARRAY_OUT_OF_BOUNDS = "0x32"
+
+# Set by set_message_prefix(), in the main process and in each pool process
+message_prefix = ""
+
+
+class ClaimReverted(Exception):
+    def __init__(self, error, *arguments):
+        super().__init__(f"{error}({', '.join(str(argument) for argument in arguments)})")
+
+
+def panic(code):
+    return ClaimReverted("Panic", code)
+
+
+def bytes32_hex(value):
+    return "0x" + value.to_bytes(32, "big").hex()
+
+
+def check_list(value, name):
+    """Check that a field of the claim is a list, before its items are read."""
+    if not isinstance(value, list):
+        raise TypeError(f"{name} must be a list, found {value!r}")
+    return value
+
+
+def parse_pub_key(pub_key):
+    """Return the (x, y) of a [x, y] pair or of a hex encoded public key."""
+    if isinstance(pub_key, str):
+        return parse_public_key(decode_hex(pub_key))
+    if len(check_list(pub_key, "pubKey")) != 2:
+        raise ValueError(f"Invalid public key {pub_key}")
+    (x, y) = (decode_hex(pub_key[0]), decode_hex(pub_key[1]))
+    if len(x) > 32 or len(y) > 32:
+        raise ValueError(f"Invalid public key {pub_key}")
+    return int.from_bytes(x, "big"), int.from_bytes(y, "big")
+
+
+def sign_byte(y):
+    return 0x02 if y % 2 == 0 else 0x03
+
+
+def create_message_hash(message):
+    """Same as VerificationLibrary.createMessageHash. The lengths are encoded as uint8, as the contract does."""
+    message_bytes = message.encode()
+    combined_message = bytes([len(MESSAGE_MAGIC_BYTES) & 0xff]) + MESSAGE_MAGIC_BYTES + \
+        bytes([len(message_bytes) & 0xff]) + message_bytes
+    return hashlib.sha256(hashlib.sha256(combined_message).digest()).digest()
+
+
+def parse_zend_signature(signature):
+    """Same as VerificationLibrary.parseZendSignature. Return (r, s, v)."""
+    if len(signature) != 65:
+        raise ClaimReverted("SignatureMustBe65Bytes")
+    v = signature[0]
+    r = int.from_bytes(signature[1:33], "big")
+    s = int.from_bytes(signature[33:], "big")
+    if v not in (27, 28, 31, 32):
+        raise ClaimReverted("InvalidSignature")
+    if r == 0 or s == 0:
+        raise ClaimReverted("InvalidSignature")
+    if s > MAX_S:
+        raise ClaimReverted("InvalidSignature")
+    return r, s, v
+
+
+def verify_zend_signature_bool(message_hash, signature, x, y):
+    """Same as VerificationLibrary.verifyZendSignatureBool."""
+    (r, s, v) = signature
+    if v == 31 or v == 32:
+        v = v - 4
+    try:
+        signer = keys.Signature(vrs=(v - 27, r, s)).recover_public_key_from_msg_hash(message_hash).to_canonical_address()
+    except BadSignature:
+        # ecrecover returns the zero address
+        raise ClaimReverted("InvalidSignature")
+    return signer == keccak(x.to_bytes(32, "big") + y.to_bytes(32, "big"))[12:]
+
+
+def check_dest_address(dest_address):
+    """The canClaim check on the destination address. Return the address in EIP-55 format."""
+    if not isinstance(dest_address, str):
+        raise TypeError(f"destAddress must be a string, found {dest_address!r}")
+    dest_address = to_checksum_address(dest_address)
+    if int(dest_address, 16) == 0:
+        raise ClaimReverted("AddressNotValid")
+    return dest_address
+
+
+def prepare_p2pkh(claim):
+    """Run the checks of claimP2PKH done before the balance check.
+
+    Return the vault key and a function running the checks done after the balance check, which raises
+    ClaimReverted if the claim reverts.
+    """
+    dest_address = check_dest_address(claim["destAddress"])
+    signature = parse_zend_signature(decode_hex(claim["signature"]))
+    (x, y) = parse_pub_key(claim["pubKey"])
+    if signature[2] == 31 or signature[2] == 32:
+        # Compressed signature, the zend address is the one of the compressed public key
+        zen_address = hash160(bytes([sign_byte(y)]) + x.to_bytes(32, "big"))
+    else:
+        zen_address = hash160(b"\x04" + x.to_bytes(32, "big") + y.to_bytes(32, "big"))
+
+    def verify():
+        message_hash = create_message_hash(message_prefix + dest_address)
+        if not verify_zend_signature_bool(message_hash, signature, x, y):
+            raise ClaimReverted("SignatureNotMatching")
+
+    return "0x" + zen_address.hex(), verify
+
+
+def read_script_bytes(script, start, length):
+    # The contract reads the memory after the script, here it is considered as zeros
+    return int.from_bytes(script[start:start + length].ljust(length, b"\x00"), "big")
+
+
+def verify_pub_keys_from_script(script, pub_keys):
+    """Same as ZendBackupVault._verifyPubKeysFromScript."""
+    if len(script) < 2:
+        raise ClaimReverted("InvalidScriptLength")
+    if script[-2] < 80:
+        raise panic(PANIC_ARITHMETIC_UNDERFLOW)
+    total = script[-2] - 80
+    if len(pub_keys) != total:
+        raise ClaimReverted("InvalidPublicKeysArraysLength")
+    position = 1
+    for i in range(total):
+        if position >= len(script):
+            raise panic(PANIC_ARRAY_OUT_OF_BOUNDS)
+        next_pub_key_size = script[position]
+        position = position + 1
+        if next_pub_key_size != COMPRESSED_PUBLIC_KEY_LENGTH and next_pub_key_size != UNCOMPRESSED_PUBLIC_KEY_LENGTH:
+            raise ClaimReverted("InvalidPublicKeySize", next_pub_key_size)
+        (x, y) = pub_keys[i]
+        if x != 0 and y != 0:
+            first_part = read_script_bytes(script, position + 1, 32)
+            if x != first_part:
+                raise ClaimReverted("InvalidPublicKey", i, 0, bytes32_hex(first_part), bytes32_hex(x))
+            if next_pub_key_size == UNCOMPRESSED_PUBLIC_KEY_LENGTH:
+                second_part = read_script_bytes(script, position + 33, 32)
+                if y != second_part:
+                    raise ClaimReverted("InvalidPublicKey", i, 1, bytes32_hex(second_part), bytes32_hex(y))
+            else:
+                sign = read_script_bytes(script, position, 1)
+                if sign != sign_byte(y):
+                    raise ClaimReverted("InvalidPublicKey", i, 1, bytes32_hex(sign), bytes32_hex(sign_byte(y)))
+        position = position + next_pub_key_size
+
+
+def prepare_p2sh(claim):
+    """Same as prepare_p2pkh, for claimP2SH."""
+    dest_address = check_dest_address(claim["destAddress"])
+    signatures = [decode_hex(signature) for signature in check_list(claim["signatures"], "signatures")]
+    script = decode_hex(claim["script"])
+    pub_keys = [parse_pub_key(pub_key) for pub_key in check_list(claim["pubKeys"], "pubKeys")]
+    if len(signatures) != len(pub_keys):
+        raise ClaimReverted("InvalidSignatureArrayLength")
+    if len(signatures) > MAX_MULTISIG_KEYS:
+        raise ClaimReverted("TooManySignatures")
+    zen_address = "0x" + hash160(script).hex()
+
+    def verify():
+        if len(script) == 0:
+            raise panic(PANIC_ARRAY_OUT_OF_BOUNDS)
+        if script[0] < 80:
+            raise panic(PANIC_ARITHMETIC_UNDERFLOW)
+        min_signatures = script[0] - 80
+        verify_pub_keys_from_script(script, pub_keys)
+
+        message_hash = create_message_hash(message_prefix + zen_address + dest_address)
+        valid_signatures = 0
+        i = 0
+        while i != len(signatures) and valid_signatures < min_signatures:
+            if len(signatures[i]) != 0:
+                (x, y) = pub_keys[i]
+                if x == 0 or y == 0:
+                    raise ClaimReverted("UnexpectedZeroPublicKey", f"({bytes32_hex(x)}, {bytes32_hex(y)})")
+                signature = parse_zend_signature(signatures[i])
+                if verify_zend_signature_bool(message_hash, signature, x, y):
+                    valid_signatures = valid_signatures + 1
+            i = i + 1
+        if valid_signatures < min_signatures:
+            raise ClaimReverted("InsufficientSignatures", valid_signatures, min_signatures)
+
+    return zen_address, verify
+
+
+def verify_claims(lines):
+    """Verify a chunk of (line number, line) claims.
+
+    Return the list of (line number, claim type, vault key, error before the balance check, error after it).
+    The balance is checked by the main process, that also knows the claims of the previous lines.
+    """
+    results = []
+    for (line_number, line) in lines:
+        claim_type = ""
+        zen_address = ""
+        try:
+            claim = json.loads(line)
+            if not isinstance(claim, dict):
+                raise TypeError(f"The claim must be a json object, found {claim!r}")
+            claim_type = "p2sh" if "script" in claim else "p2pkh"
+            if claim_type == "p2sh":
+                zen_address, verify = prepare_p2sh(claim)
+            else:
+                zen_address, verify = prepare_p2pkh(claim)
+        except ClaimReverted as e:
+            results.append((line_number, claim_type, zen_address, str(e), None))
+            continue
+        except (ValueError, KeyError, TypeError) as e:
+            results.append((line_number, claim_type, zen_address, f"Invalid input: {e!r}", None))
+            continue
+        try:
+            verify()
+            results.append((line_number, claim_type, zen_address, None, None))
+        except ClaimReverted as e:
+            results.append((line_number, claim_type, zen_address, None, str(e)))
+    return results
+
+
+def set_message_prefix(prefix):
+    """Set the message prefix in the pool processes, that do not inherit the globals with the spawn start method."""
+    global message_prefix
+    message_prefix = prefix
+
+
+def read_chunks(claims_file):
+    """Yield the chunks of (line number, line) of the claims file, without the empty lines."""
+    chunk = []
+    for (line_number, line) in enumerate(claims_file, start=1):
+        if line.strip() == "":
+            continue
+        chunk.append((line_number, line))
+        if len(chunk) == CLAIMS_PER_TASK:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def main():
+    instrumentation.setup("verify_claims")
+    workers = int(pop_cli_option("--workers", os.cpu_count()))
+
+    if len(sys.argv) != 5:
+        print(
+            "Usage: verify_claims <claims file> <zend vault file> <message prefix> <output csv file> [--workers <n>]"
+        )
+        sys.exit(1)
+
+    claims_file_name = sys.argv[1]
+    zend_vault_file_name = sys.argv[2]
+    set_message_prefix(sys.argv[3])
+    output_file_name = sys.argv[4]
+
+    with instrumentation.stage("load_zend_vault") as load_zend_vault_stage:
+        zend_vault_data = dict(iter_artifact(zend_vault_file_name))
+        load_zend_vault_stage.rows = len(zend_vault_data)
+
+    claimed_keys = {}
+    errors = {}
+    total_claimable_balance = 0
+    with open(claims_file_name, 'r') as claims_file, open(output_file_name, 'w', newline='') as output_file, \
+            multiprocessing.Pool(workers, initializer=set_message_prefix, initargs=(message_prefix,)) as pool, instrumentation.stage("verify_claims") as verify_claims_stage:
+        output_writer = csv.writer(output_file)
+        for results in pool.imap(verify_claims, read_chunks(claims_file)):
+            for (line_number, claim_type, zen_address, error_before_balance, error_after_balance) in results:
+                balance = zend_vault_data.get(zen_address, 0)
+                error = error_before_balance
+                if error is None and (balance == 0 or zen_address in claimed_keys):
+                    error = f"NothingToClaim({zen_address})"
+                    if zen_address in claimed_keys:
+                        error = error + f" - already claimed at line {claimed_keys[zen_address]}"
+                if error is None:
+                    error = error_after_balance
+                if error is None:
+                    claimed_keys[zen_address] = line_number
+                    total_claimable_balance = total_claimable_balance + balance
+                else:
+                    error_name = error.split("(")[0].split(":")[0]
+                    errors[error_name] = errors.get(error_name, 0) + 1
+                output_writer.writerow((line_number, claim_type, zen_address, balance, "ok" if error is None else error))
+                verify_claims_stage.rows = verify_claims_stage.rows + 1
+
+    print(f"Valid claims: {len(claimed_keys)}")
+    print(f"Total claimable balance: {total_claimable_balance} wei")
+    for (error_name, count) in sorted(errors.items(), key=lambda item: -item[1]):
+        print(f"{error_name}: {count} claims")
+    if len(errors) != 0:
+        print(f"Found {sum(errors.values())} claims that would revert or are invalid")
+        sys.exit(1)
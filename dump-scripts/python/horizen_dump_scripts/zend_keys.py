@@ -0,0 +1,92 @@
+import hashlib
+
+"""
+Helpers to derive the ZendBackupVault keys from Zend public keys and redeem scripts.
+
+The vault stores the balances by the 20-byte hash that zend_to_horizen gets from the Base58-decoded address,
+without the prefix. This is the hash160 (ripemd160 of sha256) of:
+ - the public key, for P2PKH addresses. The same key gives two different addresses, one for the
+   compressed and one for the uncompressed format, so both are derived.
+ - the redeem script, for P2SH addresses.
+"""
+
+# secp256k1 field prime
+SECP256K1_P = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+
+COMPRESSED_PUBLIC_KEY_LENGTH = 33
+UNCOMPRESSED_PUBLIC_KEY_LENGTH = 65
+
+OP_1 = 0x51
+OP_16 = 0x60
+OP_CHECKMULTISIG = 0xae
+
+
+def _ripemd160(data):
+    try:
+        return hashlib.new("ripemd160", data).digest()
+    except ValueError:
+        # OpenSSL 3 may not provide ripemd160, pycryptodome is installed with web3
+        from Crypto.Hash import RIPEMD160
+        return RIPEMD160.new(data).digest()
+
+
+def hash160(data):
+    return _ripemd160(hashlib.sha256(data).digest())
+
+
+def decode_hex(value):
+    if not isinstance(value, str):
+        raise TypeError(f"Expected a hex string, found {value!r}")
+    value = value.strip()
+    if value.startswith("0x") or value.startswith("0X"):
+        value = value[2:]
+    return bytes.fromhex(value)
+
+
+def parse_public_key(public_key):
+    """Return the (x, y) coordinates of a compressed or uncompressed public key in bytes format."""
+    if len(public_key) == UNCOMPRESSED_PUBLIC_KEY_LENGTH and public_key[0] == 0x04:
+        x = int.from_bytes(public_key[1:33], "big")
+        y = int.from_bytes(public_key[33:], "big")
+    elif len(public_key) == COMPRESSED_PUBLIC_KEY_LENGTH and public_key[0] in (0x02, 0x03):
+        x = int.from_bytes(public_key[1:], "big")
+        y = pow((pow(x, 3, SECP256K1_P) + 7) % SECP256K1_P, (SECP256K1_P + 1) // 4, SECP256K1_P)
+        if y % 2 != public_key[0] % 2:
+            y = SECP256K1_P - y
+    else:
+        raise ValueError("Invalid public key format")
+    if x >= SECP256K1_P or y >= SECP256K1_P or (y * y - x * x * x - 7) % SECP256K1_P != 0:
+        raise ValueError("Public key is not a point of the secp256k1 curve")
+    return x, y
+
+
+def compressed_public_key(x, y):
+    return bytes([0x02 if y % 2 == 0 else 0x03]) + x.to_bytes(32, "big")
+
+
+def uncompressed_public_key(x, y):
+    return b"\x04" + x.to_bytes(32, "big") + y.to_bytes(32, "big")
+
+
+def is_public_key(data):
+    return (len(data) == COMPRESSED_PUBLIC_KEY_LENGTH and data[0] in (0x02, 0x03)) or \
+        (len(data) == UNCOMPRESSED_PUBLIC_KEY_LENGTH and data[0] == 0x04)
+
+
+def is_multisig_script(script):
+    return len(script) >= 3 and OP_1 <= script[0] <= OP_16 and OP_1 <= script[-2] <= OP_16 and \
+        script[-1] == OP_CHECKMULTISIG
+
+
+def vault_key(data):
+    """Return the vault key, in the same "0x<hex>" format used by zend_to_horizen."""
+    return "0x" + hash160(data).hex()
+
+
+def public_key_vault_keys(public_key):
+    """Return the vault keys of the compressed and uncompressed addresses of a public key."""
+    x, y = parse_public_key(public_key)
+    return {
+        "compressed": vault_key(compressed_public_key(x, y)),
+        "uncompressed": vault_key(uncompressed_public_key(x, y)),
+    }
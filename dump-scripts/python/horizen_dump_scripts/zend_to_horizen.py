@@ -1,11 +1,13 @@
-import collections
 import csv
 import json
 import sys
 from web3 import Web3
 import base58
 import pprint
-from horizen_dump_scripts.utils import dict_raise_on_duplicates
+from horizen_dump_scripts import instrumentation
+from horizen_dump_scripts.artifacts import write_artifact
+from horizen_dump_scripts.statistics_report import STATS_OUT_OPTION, StatisticsReport
+from horizen_dump_scripts.utils import dict_raise_on_duplicates, pop_cli_option
 """
 This script transforms the balances data dumped from zend in the format requested for Horizen. 
 Most accounts will be restored in ZendBackVault contract and they will need to be explicitly claimed by the owners to 
@@ -39,6 +41,9 @@ It creates as output:
 	<"decoded address":"balance">, alphabetically ordered.
  - If the mapping file was provided as input, the list of the accounts to be restored by the EonBackVault contract, as a json file with the format:
     <"Ethereum address":"balance">, alphabetically ordered.
+ - If the "--stats-out <file>" parameter is provided, a json report with the statistics of the processed addresses
+   (top addresses and collided hashes by balance, balance histograms and counters of zero balance, unknown and
+   mapped addresses).
 """
 
 Mainnet_Prefix_List = [
@@ -57,6 +62,10 @@ Testnet_Prefix_List = [
 
 
 def main():
+	instrumentation.setup("zend_to_horizen")
+	stats_file_name = pop_cli_option(STATS_OUT_OPTION)
+	report = StatisticsReport()
+
 	# 10 ^ 10
 	SATOSHI_TO_WEI_MULTIPLIER = 10 ** 10
 
@@ -89,8 +98,9 @@ def main():
 		mapping_file_name = sys.argv[3]
 		zend_vault_result_file_name = sys.argv[4]
 		eon_vault_result_file_name = sys.argv[5]
-		with open(mapping_file_name, 'r') as mapping_file:
+		with open(mapping_file_name, 'r') as mapping_file, instrumentation.stage("load_mapping") as load_mapping_stage:
 			mapped_addresses = json.load(mapping_file, object_pairs_hook=dict_raise_on_duplicates)
+			load_mapping_stage.rows = len(mapped_addresses)
 			# Sanity checks
 			print("\nChecking automapping addresses.")
 			if network_type == "mainnet":
@@ -137,13 +147,14 @@ def main():
 	total_balance_to_eon_vault = 0
 	total_balance_not_migrated = 0
 
-	with open(zend_dump_file_name, 'r') as zend_dump_file:
+	with open(zend_dump_file_name, 'r') as zend_dump_file, instrumentation.stage("convert_dump") as convert_dump_stage:
 		zend_dump_data_reader = csv.reader(zend_dump_file)
 
 		zend_vault_results = {}
 		eon_vault_results = {}
 
 		processed_zend_accounts = set()
+		collided_hashes = set()
 
 		for (zend_address, balance_in_satoshi, _) in zend_dump_data_reader:
 			if zend_address in processed_zend_accounts:
@@ -161,17 +172,24 @@ def main():
 						eon_vault_results[mapped_eth_address] = eon_vault_results.get(mapped_eth_address, 0) + balance_in_wei
 						total_balance_to_eon_vault = total_balance_to_eon_vault + balance_in_wei
 						mapped_addresses.pop(zend_address)
+						report.count("mapped_addresses")
+						report.top("mapped_addresses").add_item(zend_address, balance_in_wei)
 					else:
 						try:
 							decoded_address = base58.b58decode_check(zend_address).hex()
 							# Remove prefix
 							decoded_address = "0x" + decoded_address[4:]
 							total_balance_to_zend_vault = total_balance_to_zend_vault + balance_in_wei
+							report.count("zend_vault_addresses")
+							report.top("zend_vault_addresses").add_item(zend_address, balance_in_wei)
+							report.histogram("zend_vault_address_balances").add(balance_in_wei)
 							if decoded_address in zend_vault_results:
 								print(
 									"Found 2 equal hashes. Hash: {0}, balance 1: {1}, balance 2: {2}, current zend address: {3}"
 									.format(decoded_address, zend_vault_results[decoded_address], balance_in_wei, zend_address))
 								zend_vault_results[decoded_address] = zend_vault_results[decoded_address] + balance_in_wei
+								collided_hashes.add(decoded_address)
+								report.top("collided_hashes").update_item(decoded_address, zend_vault_results[decoded_address])
 							else:
 								zend_vault_results[decoded_address] = balance_in_wei
 						except Exception as e:
@@ -183,12 +201,16 @@ def main():
 					print(
 						"Found address with zero balance: {0}"
 						.format(zend_address))
+					report.count("zero_balance_addresses")
 			else:
 				total_balance_not_migrated = total_balance_not_migrated + balance_in_wei
+				report.count("unknown_addresses")
+				report.top("unknown_addresses").add_item(zend_address, balance_in_wei)
 				print(
 					"Found an unknown address: {0}, with balance in wei {1}"
 					.format(zend_address, balance_in_wei))
 
+		convert_dump_stage.rows = len(processed_zend_accounts)
 
 	if len(mapped_addresses) != 0:
 		print("\nFound mapped addresses without a balance: ")
@@ -201,13 +223,31 @@ def main():
 
 	assert total_balance_to_zend_vault + total_balance_to_eon_vault + total_balance_not_migrated == total_balance_from_zend, "balances don't match"
 
-	sorted_zend_vault_accounts = collections.OrderedDict(sorted(zend_vault_results.items()))
-
-	with open(zend_vault_result_file_name, "w") as jsonFile:
-		json.dump(sorted_zend_vault_accounts, jsonFile, indent=4)
+	with instrumentation.stage("sort") as sort_stage:
+		sorted_zend_vault_accounts = sorted(zend_vault_results.items())
+		sort_stage.rows = len(sorted_zend_vault_accounts)
+
+	with instrumentation.stage("write") as write_stage:
+		write_artifact(zend_vault_result_file_name, sorted_zend_vault_accounts)
+		write_stage.rows = len(sorted_zend_vault_accounts)
+
+	if stats_file_name is not None:
+		with instrumentation.stage("statistics"):
+			report.count("addresses", len(processed_zend_accounts))
+			report.count("zend_vault_hashes", len(zend_vault_results))
+			report.count("collided_hashes", len(collided_hashes))
+			report.count("eon_vault_accounts", len(eon_vault_results))
+			report.add_total("balance_from_zend", total_balance_from_zend)
+			report.add_total("balance_to_zend_vault", total_balance_to_zend_vault)
+			report.add_total("balance_to_eon_vault", total_balance_to_eon_vault)
+			report.add_total("balance_not_migrated", total_balance_not_migrated)
+			report.write(stats_file_name)
 
 	if eon_vault_result_file_name is not None:
-		sorted_eon_vault_accounts = collections.OrderedDict(sorted(eon_vault_results.items()))
+		with instrumentation.stage("sort_eon_vault") as sort_stage:
+			sorted_eon_vault_accounts = sorted(eon_vault_results.items())
+			sort_stage.rows = len(sorted_eon_vault_accounts)
 
-		with open(eon_vault_result_file_name, "w") as jsonFile:
-			json.dump(sorted_eon_vault_accounts, jsonFile, indent=4)
+		with instrumentation.stage("write_eon_vault") as write_stage:
+			write_artifact(eon_vault_result_file_name, sorted_eon_vault_accounts)
+			write_stage.rows = len(sorted_eon_vault_accounts)
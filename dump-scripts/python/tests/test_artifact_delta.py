@@ -0,0 +1,345 @@
+import csv
+import json
+import random
+import shutil
+import sys
+
+import base58
+import pytest
+from eth_utils import to_checksum_address
+
+from horizen_dump_scripts import artifact_delta, setup_eon2_json, zend_to_horizen
+from horizen_dump_scripts.artifacts import iter_artifact
+from horizen_dump_scripts.migrationhash import calculate_migration_hash
+
+# Small interval, to have many checkpoints in small artifacts
+INTERVAL = 4
+ZN_PREFIX = "2089"
+T1_PREFIX = "1cb8"
+NULL_ACCOUNT = "0x0000000000000000000000000000000000000000"
+
+
+def run_script(monkeypatch, main, *args):
+    monkeypatch.setattr(sys, "argv", [main.__module__, *map(str, args)])
+    try:
+        main()
+    except SystemExit as e:
+        return e.code
+    return 0
+
+
+def run_artifact_delta(monkeypatch, *args):
+    return run_script(monkeypatch, artifact_delta.main, *args)
+
+
+@pytest.fixture(autouse=True)
+def small_hash_index_interval(monkeypatch):
+    monkeypatch.setattr(artifact_delta, "HASH_INDEX_INTERVAL", INTERVAL)
+
+
+def zend_address(prefix, key):
+    return base58.b58encode_check(bytes.fromhex(prefix) + key).decode()
+
+
+def random_eth_address(rng):
+    return to_checksum_address("0x%040x" % rng.getrandbits(160))
+
+
+def make_zend_dump(rng):
+    """Return a zend dump {address: balance in satoshi} and its mapping file content.
+
+    The dump has unknown and zero balance addresses, addresses colliding on the same key with different prefixes
+    and mapped addresses, two of them mapped to the same Ethereum address.
+    """
+    balances = {}
+    for index in range(120):
+        key = rng.randbytes(20)
+        balances[zend_address(T1_PREFIX if index % 2 else ZN_PREFIX, key)] = rng.randint(1, 10 ** rng.randint(1, 15))
+        if index % 10 == 0:
+            balances[zend_address(ZN_PREFIX if index % 2 else T1_PREFIX, key)] = rng.randint(1, 10 ** 8)
+    for index in range(5):
+        balances[f"unknown-{index}"] = rng.randint(1, 10 ** 8)
+        balances[zend_address(T1_PREFIX, rng.randbytes(20))] = 0
+    mapping = {zend_address(ZN_PREFIX, rng.randbytes(20)): random_eth_address(rng) for _ in range(8)}
+    shared_eth_address = random_eth_address(rng)
+    mapping.update({zend_address(ZN_PREFIX, rng.randbytes(20)): shared_eth_address for _ in range(2)})
+    # The last mapped addresses are not in the dump yet
+    for zend_address_mapped in list(mapping)[:-2]:
+        balances[zend_address_mapped] = rng.randint(1, 10 ** 10)
+    return balances, mapping
+
+
+def changed_zend_dump(rng, balances, mapping):
+    """Return the dump with updated, removed and added addresses, collided and mapped ones included."""
+    new_balances = dict(balances)
+    addresses = list(balances)
+    collided_keys = {}
+    for address in addresses:
+        if not address.startswith("unknown"):
+            collided_keys.setdefault(artifact_delta.zend_vault_key(address), []).append(address)
+    collided = [group for group in collided_keys.values() if len(group) > 1]
+
+    for address in rng.sample(addresses, 15):
+        new_balances[address] = new_balances[address] + rng.randint(-new_balances[address], 10 ** 8)
+    for address in rng.sample(addresses, 10):
+        new_balances.pop(address)
+    # One address of a collision is removed, both addresses of another one
+    new_balances.pop(collided[0][0], None)
+    new_balances.pop(collided[1][0], None)
+    new_balances.pop(collided[1][1], None)
+    new_balances[collided[2][0]] = 0
+    for index in range(10):
+        new_balances[zend_address(ZN_PREFIX, rng.randbytes(20))] = rng.randint(1, 10 ** 12)
+    new_balances["unknown-new"] = 5
+    # A new address colliding with a kept one
+    kept_address = next(address for address in addresses if address in new_balances and address.startswith("t1") and address not in mapping)
+    new_balances[zend_address(ZN_PREFIX, base58.b58decode_check(kept_address)[2:])] = 10 ** 9
+    mapped_addresses = list(mapping)
+    new_balances.pop(mapped_addresses[0])
+    new_balances[mapped_addresses[1]] = new_balances[mapped_addresses[1]] + 1
+    new_balances[mapped_addresses[-1]] = 3
+    return new_balances
+
+
+def write_zend_dump(path, balances):
+    with open(path, "w", newline="") as dump_file:
+        writer = csv.writer(dump_file)
+        for address, balance in balances.items():
+            writer.writerow((address, balance, "1"))
+
+
+def convert_zend_dump(monkeypatch, tmp_path, name, balances):
+    """Run zend_to_horizen on the dump, return the paths of the dump, the zend vault and the automappings files."""
+    dump_path = tmp_path / f"{name}.csv"
+    write_zend_dump(dump_path, balances)
+    paths = (dump_path, tmp_path / f"{name}_zend.json", tmp_path / f"{name}_automappings.json")
+    assert run_script(monkeypatch, zend_to_horizen.main, "mainnet", dump_path, tmp_path / "mapping.json", *paths[1:]) == 0
+    return paths
+
+
+def saved_hash(artifact_path):
+    with open(f"{artifact_path}{artifact_delta.HASH_INDEX_SUFFIX}") as index_file:
+        return bytes.fromhex(json.load(index_file)["final_hash"])
+
+
+def assert_same_artifact(artifact_path, expected_path, is_eon):
+    assert artifact_path.read_bytes() == expected_path.read_bytes()
+    assert saved_hash(artifact_path) == calculate_migration_hash(iter_artifact(expected_path), is_eon)
+
+
+def count_hash_updates(monkeypatch):
+    calls = []
+    update_hash_bytes = artifact_delta.update_hash_bytes
+
+    def counting_update_hash_bytes(*args):
+        calls.append(args[1])
+        return update_hash_bytes(*args)
+
+    monkeypatch.setattr(artifact_delta, "update_hash_bytes", counting_update_hash_bytes)
+    return calls
+
+
+def test_zend_delta_is_equal_to_the_full_conversion(monkeypatch, tmp_path, capsys):
+    rng = random.Random(1)
+    (old_balances, mapping) = make_zend_dump(rng)
+    with open(tmp_path / "mapping.json", "w") as mapping_file:
+        json.dump(mapping, mapping_file)
+    new_balances = changed_zend_dump(rng, old_balances, mapping)
+    (old_dump, old_zend, old_automappings) = convert_zend_dump(monkeypatch, tmp_path, "old", old_balances)
+    (new_dump, new_zend, new_automappings) = convert_zend_dump(monkeypatch, tmp_path, "new", new_balances)
+    assert "Found 2 equal hashes" in capsys.readouterr().out
+
+    work = tmp_path / "work"
+    work.mkdir()
+    shutil.copy(old_zend, work / "zend.json")
+    shutil.copy(old_automappings, work / "automappings.json")
+    mapping_options = ("--mapping", tmp_path / "mapping.json", "--previous-automappings", work / "automappings.json")
+
+    # Without changes the artifacts are rewritten in place with the same content, creating their hash index
+    assert run_artifact_delta(monkeypatch, "zend", work / "zend.json", work / "zend.json", "--old-dump", old_dump, "--new-dump", old_dump,
+                              *mapping_options, "--output-automappings", work / "automappings.json") == 0
+    assert_same_artifact(work / "zend.json", old_zend, False)
+    assert_same_artifact(work / "automappings.json", old_automappings, True)
+
+    assert run_artifact_delta(monkeypatch, "zend", work / "zend.json", work / "new_zend.json", "--old-dump", old_dump, "--new-dump", new_dump,
+                              "--diff-out", tmp_path / "diff.csv", *mapping_options, "--output-automappings", work / "new_automappings.json") == 0
+    output = capsys.readouterr().out
+    assert "calculating the whole hash" not in output
+    assert f"Migration hash of {work / 'new_zend.json'}: {calculate_migration_hash(iter_artifact(new_zend), False).hex()}" in output
+    assert_same_artifact(work / "new_zend.json", new_zend, False)
+    assert_same_artifact(work / "new_automappings.json", new_automappings, True)
+
+    # The saved diff applied in place to the old artifacts, without hash index
+    shutil.copy(old_zend, tmp_path / "diff_zend.json")
+    shutil.copy(old_automappings, tmp_path / "diff_automappings.json")
+    assert not (tmp_path / f"diff_zend.json{artifact_delta.HASH_INDEX_SUFFIX}").exists()
+    assert run_artifact_delta(monkeypatch, "zend", tmp_path / "diff_zend.json", tmp_path / "diff_zend.json", "--diff", tmp_path / "diff.csv",
+                              "--mapping", tmp_path / "mapping.json", "--previous-automappings", tmp_path / "diff_automappings.json",
+                              "--output-automappings", tmp_path / "diff_automappings.json") == 0
+    assert_same_artifact(tmp_path / "diff_zend.json", new_zend, False)
+    assert_same_artifact(tmp_path / "diff_automappings.json", new_automappings, True)
+    with open(tmp_path / "diff.csv") as diff_file:
+        diff_rows = list(csv.reader(diff_file))
+    assert sorted(row[0] for row in diff_rows) == sorted(
+        address for address in old_balances.keys() | new_balances.keys() if old_balances.get(address) != new_balances.get(address)
+    )
+
+
+def test_zend_delta_after_the_last_checkpoint(monkeypatch, tmp_path):
+    rng = random.Random(2)
+    (old_balances, mapping) = make_zend_dump(rng)
+    with open(tmp_path / "mapping.json", "w") as mapping_file:
+        json.dump(mapping, mapping_file)
+    (old_dump, old_zend, _) = convert_zend_dump(monkeypatch, tmp_path, "old", old_balances)
+    # Only the address with the largest key changes
+    new_balances = dict(old_balances)
+    last_address = max((address for address in old_balances if not address.startswith("unknown") and address not in mapping),
+                       key=artifact_delta.zend_vault_key)
+    new_balances[last_address] = new_balances[last_address] + 7
+    (new_dump, new_zend, _) = convert_zend_dump(monkeypatch, tmp_path, "new", new_balances)
+
+    shutil.copy(old_zend, tmp_path / "zend.json")
+    assert run_artifact_delta(monkeypatch, "zend", tmp_path / "zend.json", tmp_path / "zend.json", "--old-dump", old_dump, "--new-dump", old_dump) == 0
+    hashed_keys = count_hash_updates(monkeypatch)
+    assert run_artifact_delta(monkeypatch, "zend", tmp_path / "zend.json", tmp_path / "zend.json", "--old-dump", old_dump, "--new-dump", new_dump) == 0
+    assert_same_artifact(tmp_path / "zend.json", new_zend, False)
+    # The hash is calculated only from the last checkpoint
+    assert 0 < len(hashed_keys) <= INTERVAL
+    assert hashed_keys[-1] == artifact_delta.zend_vault_key(last_address)
+
+
+def test_stale_hash_index_is_ignored(monkeypatch, tmp_path, capsys):
+    (old_balances, mapping) = make_zend_dump(random.Random(3))
+    with open(tmp_path / "mapping.json", "w") as mapping_file:
+        json.dump(mapping, mapping_file)
+    (old_dump, old_zend, _) = convert_zend_dump(monkeypatch, tmp_path, "old", old_balances)
+    shutil.copy(old_zend, tmp_path / "zend.json")
+    assert run_artifact_delta(monkeypatch, "zend", tmp_path / "zend.json", tmp_path / "zend.json", "--old-dump", old_dump, "--new-dump", old_dump) == 0
+    # The artifact is replaced after its index was saved
+    new_balances = dict(old_balances, **{"unknown-0": 1, next(address for address in old_balances if address.startswith("t1")): 10 ** 12})
+    (new_dump, new_zend, _) = convert_zend_dump(monkeypatch, tmp_path, "new", new_balances)
+    shutil.copy(new_zend, tmp_path / "zend.json")
+    capsys.readouterr()
+
+    assert run_artifact_delta(monkeypatch, "zend", tmp_path / "zend.json", tmp_path / "zend.json", "--old-dump", new_dump, "--new-dump", new_dump) == 0
+    assert "does not belong to" in capsys.readouterr().out
+    assert_same_artifact(tmp_path / "zend.json", new_zend, False)
+
+
+def test_zend_delta_rejects_a_diff_not_matching_the_artifact(monkeypatch, tmp_path, capsys):
+    (old_balances, mapping) = make_zend_dump(random.Random(4))
+    with open(tmp_path / "mapping.json", "w") as mapping_file:
+        json.dump(mapping, mapping_file)
+    (_, old_zend, _) = convert_zend_dump(monkeypatch, tmp_path, "old", old_balances)
+    address = next(address for address in old_balances if address.startswith("t1") and old_balances[address] > 0)
+    with open(tmp_path / "diff.csv", "w") as diff_file:
+        # More than the balance of the key, also if the address collides with another one
+        diff_file.write(f"{address},{10 ** 20},0\n")
+    capsys.readouterr()
+
+    assert run_artifact_delta(monkeypatch, "zend", old_zend, tmp_path / "zend.json", "--diff", tmp_path / "diff.csv") == 1
+    assert "becomes negative" in capsys.readouterr().out
+    assert not (tmp_path / "zend.json").exists()
+    assert not (tmp_path / "zend.json.tmp").exists()
+
+
+def make_eon_state(rng):
+    """Return an Eon dump, its stakes and automappings, with contracts, the null account and zero balances."""
+    accounts = {}
+    for index in range(100):
+        account = {"balance": str(rng.randint(0, 10 ** rng.randint(1, 24)) if index % 9 else 0), "nonce": index}
+        if index % 7 == 0:
+            account["code"] = "0x6080"
+        accounts["0x%040x" % rng.getrandbits(160)] = account
+    accounts[NULL_ACCOUNT] = {"balance": "1000", "nonce": 0}
+    addresses = sorted(accounts)
+    stakes = {to_checksum_address(address): rng.randint(1, 10 ** 20) for address in rng.sample(addresses, 20)}
+    stakes[random_eth_address(rng)] = 10 ** 18
+    automappings = {address: rng.randint(1, 10 ** 18) for address in rng.sample(addresses, 5)}
+    automappings["0x%040x" % rng.getrandbits(160)] = 10 ** 17
+    return {"root": "0x00", "accounts": accounts}, stakes, automappings
+
+
+def changed_eon_state(rng, dump, stakes, automappings):
+    accounts = json.loads(json.dumps(dump["accounts"]))
+    addresses = sorted(accounts)
+    for address in rng.sample(addresses, 10):
+        accounts[address]["balance"] = str(int(accounts[address]["balance"]) + rng.randint(1, 10 ** 18))
+    for address in rng.sample(addresses, 5):
+        accounts.pop(address)
+    for address in rng.sample(list(accounts), 3):
+        accounts[address]["balance"] = "0"
+    # An account becomes a contract, a contract is destroyed
+    eoa = next(address for address in sorted(accounts) if "code" not in accounts[address] and address != NULL_ACCOUNT)
+    accounts[eoa]["code"] = "0x6080"
+    contract = next(address for address in sorted(accounts) if "code" in accounts[address] and address != eoa)
+    accounts[contract].pop("code")
+    accounts[NULL_ACCOUNT]["balance"] = "2000"
+    for _ in range(5):
+        accounts["0x%040x" % rng.getrandbits(160)] = {"balance": str(rng.randint(1, 10 ** 20)), "nonce": 0}
+
+    new_stakes = dict(stakes)
+    for address in rng.sample(list(stakes), 5):
+        new_stakes[address] = new_stakes[address] + 1
+    for address in rng.sample(list(stakes), 3):
+        new_stakes.pop(address)
+    new_stakes[to_checksum_address(eoa)] = 10 ** 19
+    new_stakes[to_checksum_address(NULL_ACCOUNT)] = 5
+    new_automappings = dict(automappings, **{"0x%040x" % rng.getrandbits(160): 10 ** 15, sorted(automappings)[0]: 1})
+    new_automappings.pop(sorted(automappings)[1])
+    return {"root": "0x01", "accounts": accounts}, new_stakes, new_automappings
+
+
+def convert_eon_state(monkeypatch, tmp_path, name, state):
+    """Run setup_eon2_json on the Eon state, return the paths of the dump, stakes, automappings and eon files."""
+    paths = tuple(tmp_path / f"{name}_{file_type}.json" for file_type in ("dump", "stakes", "automappings", "eon"))
+    for path, data in zip(paths, state):
+        with open(path, "w") as data_file:
+            json.dump(data, data_file)
+    assert run_script(monkeypatch, setup_eon2_json.main, *paths) == 0
+    return paths
+
+
+def test_eon_delta_is_equal_to_the_full_conversion(monkeypatch, tmp_path):
+    rng = random.Random(5)
+    old_state = make_eon_state(rng)
+    new_state = changed_eon_state(rng, *old_state)
+    (old_dump, old_stakes, old_automappings, old_eon) = convert_eon_state(monkeypatch, tmp_path, "old", old_state)
+    (new_dump, new_stakes, new_automappings, new_eon) = convert_eon_state(monkeypatch, tmp_path, "new", new_state)
+    assert old_eon.read_bytes() != new_eon.read_bytes()
+
+    shutil.copy(old_eon, tmp_path / "eon.json")
+    unchanged_options = ("--old-dump", old_dump, "--new-dump", old_dump, "--old-stakes", old_stakes, "--new-stakes", old_stakes,
+                         "--old-automappings", old_automappings, "--new-automappings", old_automappings)
+    assert run_artifact_delta(monkeypatch, "eon", tmp_path / "eon.json", tmp_path / "eon.json", *unchanged_options) == 0
+    assert_same_artifact(tmp_path / "eon.json", old_eon, True)
+
+    new_options = ("--old-dump", old_dump, "--new-dump", new_dump, "--old-stakes", old_stakes, "--new-stakes", new_stakes,
+                   "--old-automappings", old_automappings, "--new-automappings", new_automappings)
+    assert run_artifact_delta(monkeypatch, "eon", tmp_path / "eon.json", tmp_path / "eon.json", *new_options) == 0
+    assert_same_artifact(tmp_path / "eon.json", new_eon, True)
+
+    # A new stake of the account with the largest key, the hash is calculated only from the last checkpoint
+    (dump, stakes, automappings) = new_state
+    last_account = max(key for key, _ in iter_artifact(new_eon) if "code" not in dump["accounts"].get(key, {}))
+    stakes = dict(stakes, **{to_checksum_address(last_account): stakes.get(to_checksum_address(last_account), 0) + 10 ** 18})
+    (_, last_stakes, _, last_eon) = convert_eon_state(monkeypatch, tmp_path, "last", (dump, stakes, automappings))
+    hashed_keys = count_hash_updates(monkeypatch)
+    assert run_artifact_delta(monkeypatch, "eon", tmp_path / "eon.json", tmp_path / "eon.json", "--old-dump", new_dump, "--new-dump", new_dump,
+                              "--old-stakes", new_stakes, "--new-stakes", last_stakes) == 0
+    assert_same_artifact(tmp_path / "eon.json", last_eon, True)
+    assert 0 < len(hashed_keys) <= INTERVAL
+    assert hashed_keys[-1] == last_account
+
+
+@pytest.mark.parametrize("args", [
+    ("zend", "a.json", "b.json"),
+    ("zend", "a.json", "b.json", "--diff", "d.csv", "--old-dump", "o.csv", "--new-dump", "n.csv"),
+    ("zend", "a.json", "b.json", "--diff", "d.csv", "--mapping", "m.json"),
+    ("eon", "a.json", "b.json", "--old-dump", "o.json", "--new-dump", "n.json", "--old-stakes", "s.json"),
+    ("eon", "a.json", "b.json", "--old-dump", "o.json", "--new-dump", "n.json", "--old-stakes", "s.json", "--new-stakes", "t.json",
+     "--old-automappings", "a.json"),
+])
+def test_artifact_delta_rejects_invalid_options(monkeypatch, capsys, args):
+    assert run_artifact_delta(monkeypatch, *args) == 1
+    assert "Usage:" in capsys.readouterr().out
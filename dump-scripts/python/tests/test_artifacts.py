@@ -0,0 +1,101 @@
+import collections
+import json
+import os
+
+import pytest
+
+from horizen_dump_scripts.artifacts import iter_artifact, write_artifact
+from horizen_dump_scripts.migrationhash import calculate_migration_hash
+
+SNAPSHOTS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "snapshots")
+# The published eon snapshots, with more items than written in a single chunk
+SNAPSHOTS = [os.path.join(SNAPSHOTS_DIR, "mainnet", "eon.json"), os.path.join(SNAPSHOTS_DIR, "testnet", "gobi.json")]
+
+ITEMS = [
+    ("0x0000000000000000000000000000000000000001", 1),
+    ("0x00000000000000000000000000000000000000ab", 10 ** 30),
+    ("0xffffffffffffffffffffffffffffffffffffffff", 12345678901234567890),
+]
+
+
+def write_text(path, text):
+    with open(path, "w", newline="") as artifact_file:
+        artifact_file.write(text)
+    return path
+
+
+def formatted(items):
+    return json.dumps(collections.OrderedDict(items), indent=4)
+
+
+def test_write_artifact_is_equal_to_json_dump(tmp_path):
+    for items in (ITEMS, ITEMS[:1], []):
+        write_artifact(tmp_path / "artifact.json", items)
+        assert (tmp_path / "artifact.json").read_text() == formatted(items)
+
+
+@pytest.mark.parametrize("text", [
+    formatted(ITEMS),
+    formatted(ITEMS) + "\n",
+    formatted(ITEMS) + "\n\n  \t\n",
+    formatted(ITEMS).replace("\n", "\r\n"),
+    formatted(ITEMS).replace("\n", "\r\n") + "\r\n",
+    formatted(ITEMS) + "  \n",
+])
+def test_iter_artifact_accepts_trailing_whitespace(tmp_path, text):
+    assert list(iter_artifact(write_text(tmp_path / "artifact.json", text))) == ITEMS
+
+
+@pytest.mark.parametrize("text", ["{}", "{}\n", "{}\r\n", "{\n}", "{\n}\n"])
+def test_iter_artifact_empty(tmp_path, text):
+    assert list(iter_artifact(write_text(tmp_path / "artifact.json", text))) == []
+
+
+def test_iter_artifact_is_equal_to_json_load(tmp_path):
+    path = tmp_path / "artifact.json"
+    write_artifact(path, ITEMS)
+    with open(path) as artifact_file:
+        assert list(iter_artifact(path)) == list(json.load(artifact_file).items())
+
+
+@pytest.mark.parametrize("text, message", [
+    (formatted(ITEMS) + "\n{}", "after the end"),
+    (formatted(ITEMS) + "\n}", "after the end"),
+    (formatted(ITEMS)[:-2], "Unexpected end of file"),
+    (formatted(ITEMS[:2]).replace("\n}", ',\n    "0x00000000000000000000000000000000000000ab": 1\n}'), "not ordered or duplicated"),
+    (formatted([ITEMS[1], ITEMS[0]]), "not ordered or duplicated"),
+    (formatted(ITEMS).replace('    "0x00000000000000000000000000000000000000ab"', '  "0x00000000000000000000000000000000000000ab"'), "Unexpected line"),
+])
+def test_iter_artifact_rejects_malformed_files(tmp_path, text, message):
+    with pytest.raises(ValueError, match=message):
+        list(iter_artifact(write_text(tmp_path / "artifact.json", text)))
+
+
+def test_iter_artifact_reads_reformatted_files(tmp_path):
+    reversed_items = dict(reversed(ITEMS))
+    path = write_text(tmp_path / "artifact.json", json.dumps(reversed_items))
+    assert list(iter_artifact(path)) == ITEMS
+
+
+def test_iter_artifact_rejects_duplicates_in_reformatted_files(tmp_path):
+    path = write_text(tmp_path / "artifact.json", '{"0x01": 1, "0x01": 2}')
+    with pytest.raises(ValueError, match="duplicate key"):
+        list(iter_artifact(path))
+
+
+@pytest.mark.parametrize("snapshot", SNAPSHOTS)
+def test_snapshot_round_trip(tmp_path, snapshot):
+    with open(snapshot) as snapshot_file:
+        items = list(json.load(snapshot_file).items())
+    write_artifact(tmp_path / "artifact.json", items)
+    with open(snapshot, "rb") as snapshot_file:
+        assert (tmp_path / "artifact.json").read_bytes() == snapshot_file.read()
+
+
+@pytest.mark.parametrize("snapshot", SNAPSHOTS)
+def test_snapshot_round_trip_with_iter_artifact(tmp_path, snapshot):
+    write_artifact(tmp_path / "artifact.json", iter_artifact(snapshot))
+    with open(snapshot, "rb") as snapshot_file:
+        assert (tmp_path / "artifact.json").read_bytes() == snapshot_file.read()
+    with open(snapshot + ".migrationhash") as migration_hash_file:
+        assert calculate_migration_hash(iter_artifact(tmp_path / "artifact.json"), True).hex() == migration_hash_file.read().strip()
@@ -0,0 +1,91 @@
+import pytest
+
+from horizen_dump_scripts.benchmark_restore_batches import (BLOCK_GAS_FILL_RATIO, MAX_TX_SIZE, TX_ENVELOPE_SIZE, BatchMeasurement,
+                                                            fit_gas_model, recommend_batch_size)
+
+BLOCK_GAS_LIMIT = 30000000
+FIXED_GAS = 52000
+BATCH_SIZES = [100, 250, 500, 1000]
+# batchInsert calldata: selector, cumulative hash, array offset and length, then 64 bytes for each account
+FIXED_CALLDATA = 4 + 32 * 3
+CALLDATA_PER_ACCOUNT = 64
+
+
+def measurements_of(gas_per_account, batch_sizes=BATCH_SIZES, rounds=3, function_name="batchInsert", calldata_per_account=CALLDATA_PER_ACCOUNT):
+    """Batches of each size, the first one of each size is the most expensive (e.g. new storage slots)."""
+    measurements = []
+    for batch_size in batch_sizes:
+        for round_index in range(rounds):
+            gas_used = FIXED_GAS + gas_per_account * batch_size - round_index * 1000 * batch_size
+            calldata_size = FIXED_CALLDATA + calldata_per_account * batch_size
+            measurements.append(BatchMeasurement(function_name, batch_size, gas_used, calldata_size, 0.1, True))
+    return measurements
+
+
+def test_fit_gas_model_uses_the_most_expensive_batch_of_each_size():
+    measurements = measurements_of(25000)
+    # Failed batches use the whole gas limit, they are not part of the model
+    measurements.append(BatchMeasurement("batchInsert", 1000, BLOCK_GAS_LIMIT, FIXED_CALLDATA + 64000, 0.1, False))
+    (fixed_gas, gas_per_account) = fit_gas_model(measurements)
+    assert fixed_gas == pytest.approx(FIXED_GAS)
+    assert gas_per_account == pytest.approx(25000)
+
+
+def test_fit_gas_model_least_squares():
+    # Points not on a line: gas = 1000 + 10 * size +- 50
+    measurements = [BatchMeasurement("batchInsert", size, 1000 + 10 * size + delta, 0, 0.1, True)
+                    for size, delta in [(10, 50), (20, -50), (30, -50), (40, 50)]]
+    (fixed_gas, gas_per_account) = fit_gas_model(measurements)
+    assert gas_per_account == pytest.approx(10)
+    assert fixed_gas == pytest.approx(1000)
+
+
+def test_fit_gas_model_with_a_single_size():
+    assert fit_gas_model(measurements_of(25000, batch_sizes=[500])) == (0, (FIXED_GAS + 25000 * 500) / 500)
+
+
+def test_fit_gas_model_without_successful_batches():
+    measurements = [BatchMeasurement("batchInsert", 100, BLOCK_GAS_LIMIT, 6500, 0.1, False)]
+    assert fit_gas_model(measurements) is None
+    assert fit_gas_model([]) is None
+    assert recommend_batch_size(measurements, BLOCK_GAS_LIMIT) is None
+
+
+def test_recommend_batch_size_bound_by_the_gas_limit():
+    recommendation = recommend_batch_size(measurements_of(25000), BLOCK_GAS_LIMIT)
+    batch_size = recommendation["recommended_batch_size"]
+    assert batch_size == int((BLOCK_GAS_LIMIT * BLOCK_GAS_FILL_RATIO - FIXED_GAS) / 25000)
+    assert FIXED_GAS + 25000 * batch_size <= BLOCK_GAS_LIMIT * BLOCK_GAS_FILL_RATIO < FIXED_GAS + 25000 * (batch_size + 1)
+    # The calldata of this size is below the limit
+    assert FIXED_CALLDATA + CALLDATA_PER_ACCOUNT * batch_size + TX_ENVELOPE_SIZE < MAX_TX_SIZE
+    assert recommendation["block_gas_limit"] == BLOCK_GAS_LIMIT
+    assert recommendation["fixed_gas"] == pytest.approx(FIXED_GAS)
+    assert recommendation["gas_per_account"] == pytest.approx(25000)
+
+
+def test_recommend_batch_size_bound_by_the_calldata_size():
+    # With cheap accounts, the 128 KiB transaction size limit is reached before the gas limit
+    recommendation = recommend_batch_size(measurements_of(5000), BLOCK_GAS_LIMIT)
+    batch_size = recommendation["recommended_batch_size"]
+    assert batch_size < int((BLOCK_GAS_LIMIT * BLOCK_GAS_FILL_RATIO - FIXED_GAS) / 5000)
+    assert batch_size == (MAX_TX_SIZE - TX_ENVELOPE_SIZE - FIXED_CALLDATA) // CALLDATA_PER_ACCOUNT
+    assert FIXED_CALLDATA + CALLDATA_PER_ACCOUNT * batch_size + TX_ENVELOPE_SIZE <= MAX_TX_SIZE
+    assert FIXED_CALLDATA + CALLDATA_PER_ACCOUNT * (batch_size + 1) + TX_ENVELOPE_SIZE > MAX_TX_SIZE
+
+
+def test_recommend_batch_size_with_constant_calldata():
+    # distribute has the same calldata for every batch size, only the gas limit applies
+    measurements = measurements_of(5000, function_name="distribute", calldata_per_account=0)
+    recommendation = recommend_batch_size(measurements, BLOCK_GAS_LIMIT)
+    assert recommendation["recommended_batch_size"] == int((BLOCK_GAS_LIMIT * BLOCK_GAS_FILL_RATIO - FIXED_GAS) / 5000)
+
+
+def test_recommend_batch_size_when_no_batch_fits():
+    # The fixed gas alone is above the usable gas: no batch size can be recommended
+    recommendation = recommend_batch_size(measurements_of(25000), FIXED_GAS)
+    assert recommendation["recommended_batch_size"] == 0
+
+
+def test_recommend_batch_size_without_cost_per_account():
+    measurements = [BatchMeasurement("batchInsert", size, FIXED_GAS, FIXED_CALLDATA, 0.1, True) for size in BATCH_SIZES]
+    assert recommend_batch_size(measurements, BLOCK_GAS_LIMIT) is None
@@ -0,0 +1,137 @@
+import random
+import sys
+
+import pytest
+
+from horizen_dump_scripts import check_total_balance_from_zend
+from horizen_dump_scripts.check_total_balance_from_zend import (HALVING_INTERVAL, MAX_SUPPLY, calculate_total_supplies,
+                                                                calculate_total_supply_from_height, halving_schedule,
+                                                                remove_shielded_pool_and_sidechains_balance)
+
+NETWORKS = ["mainnet", "testnet"]
+
+
+def loop_total_supply(height, network):
+    """The supply calculated block reward period by period, as done before the closed form."""
+    early_history_correction = 238575181127 if network == "mainnet" else 4773904298
+    if height == 0:
+        return 0
+    if (height - 1) // HALVING_INTERVAL >= 32:
+        return 2100000000000000
+    supply = 0
+    reward = 1250000000
+    while height > (HALVING_INTERVAL - 1):
+        supply += HALVING_INTERVAL * reward
+        reward >>= 1
+        height -= HALVING_INTERVAL
+    return supply + height * reward - early_history_correction
+
+
+def boundary_heights():
+    heights = [0, 1, 2]
+    for halvings in range(1, 35):
+        heights.extend([halvings * HALVING_INTERVAL - 1, halvings * HALVING_INTERVAL, halvings * HALVING_INTERVAL + 1])
+    return heights
+
+
+@pytest.mark.parametrize("network", NETWORKS)
+def test_closed_form_is_equal_to_the_loop(network):
+    rng = random.Random(1)
+    heights = boundary_heights() + [rng.randint(0, 40 * HALVING_INTERVAL) for _ in range(2000)] + [rng.randint(0, 2 * HALVING_INTERVAL) for _ in range(2000)]
+    expected_supplies = [loop_total_supply(height, network) for height in heights]
+    assert calculate_total_supplies(heights, network) == expected_supplies
+    assert [calculate_total_supply_from_height(height, network) for height in heights[:200]] == expected_supplies[:200]
+
+
+def test_halving_schedule():
+    schedule = halving_schedule()
+    assert schedule[0] == (0, 1250000000)
+    assert schedule[1] == (HALVING_INTERVAL * 1250000000, 625000000)
+    assert schedule[2] == (HALVING_INTERVAL * (1250000000 + 625000000), 312500000)
+    # The reward becomes 0 before the max supply is reached, by rounding
+    assert schedule[-1][1] == 0
+    assert schedule[-1][0] < MAX_SUPPLY
+    for (supply, reward), (next_supply, next_reward) in zip(schedule, schedule[1:]):
+        assert next_supply == supply + HALVING_INTERVAL * reward
+        assert next_reward == reward >> 1
+
+
+@pytest.mark.parametrize("network", NETWORKS)
+def test_max_supply_cap(network):
+    last_height = 32 * HALVING_INTERVAL
+    assert calculate_total_supplies([last_height + 1, 40 * HALVING_INTERVAL, 10 ** 12], network) == [MAX_SUPPLY] * 3
+    assert calculate_total_supplies([last_height], network)[0] < MAX_SUPPLY
+    # The early history correction depends on the network
+    assert calculate_total_supplies([1], network)[0] == 1250000000 - {"mainnet": 238575181127, "testnet": 4773904298}[network]
+
+
+def write_dump(path, balances):
+    with open(path, "w") as dump_file:
+        dump_file.writelines(f"zn{index},{balance},1\n" for index, balance in enumerate(balances))
+    return path
+
+
+def run_check_total_balance(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["check_total_balance_from_zend", *map(str, args)])
+    try:
+        check_total_balance_from_zend.main()
+    except SystemExit as e:
+        return e.code
+    return 0
+
+
+def dump_balance_at(height, network, eon_sidechain_balance, difference):
+    """Return the dump balance with the difference from the supply calculated at the height."""
+    supply = remove_shielded_pool_and_sidechains_balance(calculate_total_supply_from_height(height, network), network, eon_sidechain_balance)
+    return supply - difference
+
+
+@pytest.mark.parametrize("network", NETWORKS)
+def test_batch(monkeypatch, tmp_path, capsys, network):
+    rows = [(1500000, 10 ** 14, 100), (HALVING_INTERVAL * 2, 10 ** 13, -4999999), (1700000, 0, 0)]
+    batch_lines = []
+    for index, (height, eon_sidechain_balance, difference) in enumerate(rows):
+        balance = dump_balance_at(height, network, eon_sidechain_balance, difference)
+        dump_path = write_dump(tmp_path / f"dump{index}.csv", [balance // 3, balance // 3, balance - 2 * (balance // 3)])
+        batch_lines.append(f"{height},{dump_path},{eon_sidechain_balance}")
+    # The same dump one block later, the block reward went to the sidechain
+    batch_lines.append(f"1500001,{tmp_path / 'dump0.csv'},{10 ** 14 + 625000000}")
+    with open(tmp_path / "batch.csv", "w") as batch_file:
+        batch_file.write("\n".join(batch_lines) + "\n\n")
+
+    assert run_check_total_balance(monkeypatch, "--batch", tmp_path / "batch.csv", network, "--workers", 2) == 0
+    output = capsys.readouterr().out
+    assert output.count(",ok\n") == 4
+    assert f"1500000,{tmp_path / 'dump0.csv'},{10 ** 14},{dump_balance_at(1500000, network, 10 ** 14, 0)}," in output
+    assert "All the 4 differences between calculated total supply and balance from zend dump are below the defined threshold" in output
+
+    # One row above the threshold
+    balance = dump_balance_at(1500000, network, 0, 5000000)
+    write_dump(tmp_path / "dump_above_threshold.csv", [balance])
+    with open(tmp_path / "batch.csv", "a") as batch_file:
+        batch_file.write(f"1500000,{tmp_path / 'dump_above_threshold.csv'},0\n")
+    assert run_check_total_balance(monkeypatch, "--batch", tmp_path / "batch.csv", network, "--workers", 2) == 1
+    output = capsys.readouterr().out
+    assert f"1500000,{tmp_path / 'dump_above_threshold.csv'},0,{balance + 5000000},{balance},5000000,above threshold" in output
+    assert output.count(",ok\n") == 4
+    assert "Some differences between calculated total supply and balance from zend dump are higher than the defined threshold" in output
+
+
+@pytest.mark.parametrize("batch, message", [
+    ("1500000,dump.csv\n", "Wrong row"),
+    ("\n", "No rows in"),
+    ("height,dump.csv,0\n", "invalid literal for int()"),
+])
+def test_batch_rejects_invalid_files(monkeypatch, tmp_path, capsys, batch, message):
+    with open(tmp_path / "batch.csv", "w") as batch_file:
+        batch_file.write(batch)
+    assert run_check_total_balance(monkeypatch, "--batch", tmp_path / "batch.csv", "mainnet") == 1
+    output = capsys.readouterr().out
+    assert message in output
+    assert output.endswith(". Exiting.\n")
+
+
+@pytest.mark.parametrize("args", [("--batch", "batch.csv", "mainnet", "--workers", "0"), ("--batch", "batch.csv", "devnet"), ("1500000", "dump.csv")])
+def test_invalid_arguments(monkeypatch, capsys, args):
+    assert run_check_total_balance(monkeypatch, *args) == 1
+    assert capsys.readouterr().out != ""
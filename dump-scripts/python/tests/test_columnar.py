@@ -0,0 +1,116 @@
+import json
+import random
+import sys
+
+import base58
+import pytest
+from eth_utils import to_checksum_address
+
+from horizen_dump_scripts import columnar_export, columnar_query
+from horizen_dump_scripts.artifacts import write_artifact
+
+pytest.importorskip("pyarrow")
+
+# Prefixes of mainnet and testnet addresses, with the balances of the zn addresses above 2^64 wei
+PREFIXES = {"2089": ("zn", 10 ** 15), "1cb8": ("t1", 10 ** 9), "2096": ("zs", 10 ** 6), "1cbd": ("t3", 10 ** 9), "2098": ("zt", 10 ** 4)}
+SATOSHI_TO_WEI_MULTIPLIER = 10 ** 10
+
+
+def run_script(monkeypatch, main, *args):
+    monkeypatch.setattr(sys, "argv", [main.__module__, *map(str, args)])
+    try:
+        main()
+    except SystemExit as e:
+        return e.code
+    return 0
+
+
+@pytest.fixture
+def exported(monkeypatch, tmp_path, capsys):
+    """Export a generated zend dump, with its mapping, and an artifact. Return the dump rows and the artifact items."""
+    # Several row groups for each file
+    monkeypatch.setattr(columnar_export, "ROW_GROUP_SIZE", 7)
+    rng = random.Random(1)
+    rows = []
+    for index in range(100):
+        prefix = list(PREFIXES)[index % len(PREFIXES)]
+        rows.append((base58.b58encode_check(bytes.fromhex(prefix) + rng.randbytes(20)).decode(), rng.randint(0, PREFIXES[prefix][1])))
+    rows.extend((f"unknown-{index}", rng.randint(1, 10 ** 8)) for index in range(3))
+    mapping = {address: to_checksum_address("0x%040x" % rng.getrandbits(160)) for address, _ in rows[:10:2]}
+    with open(tmp_path / "zend.csv", "w") as dump_file:
+        dump_file.writelines(f"{address},{balance},1\n" for address, balance in rows)
+    with open(tmp_path / "mapping.json", "w") as mapping_file:
+        json.dump(mapping, mapping_file)
+    items = sorted(("0x%040x" % rng.getrandbits(160), rng.randint(1, 10 ** rng.randint(1, 30))) for _ in range(60))
+    write_artifact(tmp_path / "horizen2.json", items)
+
+    assert run_script(monkeypatch, columnar_export.main, tmp_path / "out", "--zend-dump", tmp_path / "zend.csv", "--mapping", tmp_path / "mapping.json",
+                      "--horizen2", tmp_path / "horizen2.json") == 0
+    assert "Exported 103 rows of" in capsys.readouterr().out
+    return [(address, balance * SATOSHI_TO_WEI_MULTIPLIER, mapping.get(address)) for address, balance in rows], items
+
+
+def query(monkeypatch, capsys, file_name, *args):
+    code = run_script(monkeypatch, columnar_query.main, file_name, *args)
+    return code, capsys.readouterr().out.splitlines()
+
+
+def address_type(address):
+    if address.startswith("unknown"):
+        return "unknown"
+    return PREFIXES[base58.b58decode_check(address)[:2].hex()][0]
+
+
+def test_total(monkeypatch, tmp_path, capsys, exported):
+    (rows, items) = exported
+    zend_total = sum(balance for _, balance, _ in rows)
+    assert zend_total > 2 ** 64
+    assert query(monkeypatch, capsys, tmp_path / "out" / "zend_dump.parquet", "total", "balance") == (0, ["rows,balance", f"{len(rows)},{zend_total}"])
+    assert query(monkeypatch, capsys, tmp_path / "out" / "horizen2.parquet", "total", "balance") == (
+        0, ["rows,balance", f"{len(items)},{sum(balance for _, balance in items)}"]
+    )
+
+    zn_rows = [balance for address, balance, _ in rows if address_type(address) == "zn"]
+    assert query(monkeypatch, capsys, tmp_path / "out" / "zend_dump.parquet", "total", "balance", "--where", "address_type=zn") == (
+        0, ["rows,balance", f"{len(zn_rows)},{sum(zn_rows)}"]
+    )
+    mapped_rows = [balance for _, balance, eth_address in rows if eth_address is not None]
+    assert query(monkeypatch, capsys, tmp_path / "out" / "zend_dump.parquet", "total", "balance", "--where", "eth_address=null") == (
+        0, ["rows,balance", f"{len(rows) - len(mapped_rows)},{zend_total - sum(mapped_rows)}"]
+    )
+
+
+def test_group_by_address_type(monkeypatch, tmp_path, capsys, exported):
+    (rows, _) = exported
+    groups = {}
+    for address, balance, _ in rows:
+        (count, group_sum) = groups.get(address_type(address), (0, 0))
+        groups[address_type(address)] = (count + 1, group_sum + balance)
+    zend_total = sum(balance for _, balance, _ in rows)
+    expected_lines = ["address_type,count,sum,share"] + [
+        f"{group},{count},{group_sum},{group_sum / zend_total:.4%}"
+        for group, (count, group_sum) in sorted(groups.items(), key=lambda group: (-group[1][1], group[0]))
+    ]
+    assert query(monkeypatch, capsys, tmp_path / "out" / "zend_dump.parquet", "group", "address_type", "balance") == (0, expected_lines)
+
+
+def test_top(monkeypatch, tmp_path, capsys, exported):
+    (rows, items) = exported
+    (code, lines) = query(monkeypatch, capsys, tmp_path / "out" / "zend_dump.parquet", "top", "balance", "5")
+    assert code == 0
+    assert lines[0] == "address,address_type,prefix,hash,balance,eth_address,share"
+    expected_rows = sorted(rows, key=lambda row: row[1], reverse=True)[:5]
+    assert [line.split(",")[0] for line in lines[1:]] == [address for address, _, _ in expected_rows]
+    assert [int(line.split(",")[4]) for line in lines[1:]] == [balance for _, balance, _ in expected_rows]
+
+    (code, lines) = query(monkeypatch, capsys, tmp_path / "out" / "horizen2.parquet", "top", "balance", "3")
+    assert code == 0
+    items_total = sum(balance for _, balance in items)
+    assert lines[1:] == [f"{address},{balance},{balance / items_total:.4%}" for address, balance in sorted(items, key=lambda item: item[1], reverse=True)[:3]]
+
+
+@pytest.mark.parametrize("args", [("total", "address"), ("group", "balance", "address_type"), ("top", "hash", "3")])
+def test_non_numeric_value_columns_are_rejected(monkeypatch, tmp_path, capsys, exported, args):
+    (code, lines) = query(monkeypatch, capsys, tmp_path / "out" / "zend_dump.parquet", *args)
+    assert code == 1
+    assert lines[-1].endswith("expected an integer or decimal column. Exiting.")
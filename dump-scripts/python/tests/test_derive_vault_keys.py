@@ -0,0 +1,70 @@
+import csv
+import sys
+
+import pytest
+
+from horizen_dump_scripts import derive_vault_keys
+from horizen_dump_scripts.artifacts import write_artifact
+from test_zend_keys import (TEST1_PUBLIC_KEY, TEST1_VAULT_KEYS, TEST2_COMPRESSED_PUBLIC_KEY, TEST2_VAULT_KEYS, TEST3_PUBLIC_KEY,
+                            TEST3_VAULT_KEYS, TEST_MULTISIG_SCRIPT, TEST_MULTISIG_VAULT_KEY)
+
+# zend.json with the balances of the uncompressed address of key 1, both addresses of key 2 and the multisig script
+ZEND_VAULT = sorted([
+    (TEST1_VAULT_KEYS["uncompressed"], 23000 * 10 ** 10),
+    (TEST2_VAULT_KEYS["compressed"], 9000000000 * 10 ** 10),
+    (TEST2_VAULT_KEYS["uncompressed"], 7 * 10 ** 10),
+    (TEST_MULTISIG_VAULT_KEY, 51095 * 10 ** 10),
+    ("0x" + "11" * 20, 10 ** 18),
+])
+
+
+def run_derive_vault_keys(monkeypatch, tmp_path, lines, workers):
+    write_artifact(tmp_path / "zend.json", ZEND_VAULT)
+    with open(tmp_path / "keys.txt", "w") as keys_file:
+        keys_file.write("\n".join(lines) + "\n")
+    monkeypatch.setattr(sys, "argv", [
+        "derive_vault_keys", str(tmp_path / "keys.txt"), str(tmp_path / "zend.json"), str(tmp_path / "output.csv"), "--workers", str(workers)
+    ])
+    try:
+        derive_vault_keys.main()
+    except SystemExit as e:
+        return e.code
+    return 0
+
+
+def read_output(tmp_path):
+    with open(tmp_path / "output.csv") as output_file:
+        return [(line, key_type, key, int(balance)) for line, key_type, key, balance in csv.reader(output_file)]
+
+
+@pytest.mark.parametrize("workers, keys_per_task", [(1, 10000), (3, 1)])
+def test_derive_vault_keys(monkeypatch, tmp_path, capsys, workers, keys_per_task):
+    monkeypatch.setattr(derive_vault_keys, "KEYS_PER_TASK", keys_per_task)
+    balances = dict(ZEND_VAULT)
+    lines = [TEST1_PUBLIC_KEY, "0x" + TEST2_COMPRESSED_PUBLIC_KEY, "", TEST3_PUBLIC_KEY, TEST_MULTISIG_SCRIPT, "  " + TEST1_PUBLIC_KEY]
+    assert run_derive_vault_keys(monkeypatch, tmp_path, lines, workers) == 0
+
+    # The input order is kept, with the compressed address before the uncompressed one
+    expected_rows = []
+    for line, vault_keys in ((TEST1_PUBLIC_KEY, TEST1_VAULT_KEYS), ("0x" + TEST2_COMPRESSED_PUBLIC_KEY, TEST2_VAULT_KEYS),
+                             (TEST3_PUBLIC_KEY, TEST3_VAULT_KEYS)):
+        expected_rows.extend((line, key_type, vault_keys[key_type], balances.get(vault_keys[key_type], 0)) for key_type in ("compressed", "uncompressed"))
+    expected_rows.append((TEST_MULTISIG_SCRIPT, "script", TEST_MULTISIG_VAULT_KEY, balances[TEST_MULTISIG_VAULT_KEY]))
+    expected_rows.extend(expected_rows[:2])
+    assert read_output(tmp_path) == expected_rows
+
+    output = capsys.readouterr().out
+    # The repeated key 1 is counted once, the balance without a key is not claimable
+    assert "Keys with a claimable balance: 4" in output
+    assert f"Total claimable balance: {sum(balances.values()) - 10 ** 18} wei" in output
+
+
+def test_derive_vault_keys_reports_invalid_inputs(monkeypatch, tmp_path, capsys):
+    invalid_lines = ["05" + TEST1_PUBLIC_KEY[2:], TEST1_PUBLIC_KEY[:-2] + "ae", "not hex", "52ae"]
+    assert run_derive_vault_keys(monkeypatch, tmp_path, [TEST_MULTISIG_SCRIPT, *invalid_lines], 2) == 1
+    assert read_output(tmp_path) == [(TEST_MULTISIG_SCRIPT, "script", TEST_MULTISIG_VAULT_KEY, dict(ZEND_VAULT)[TEST_MULTISIG_VAULT_KEY])]
+    output = capsys.readouterr().out
+    assert f"Invalid input {invalid_lines[0]}: not a public key or a multisig redeem script" in output
+    assert f"Invalid input {invalid_lines[1]}: Public key is not a point of the secp256k1 curve" in output
+    assert "Invalid input not hex: non-hexadecimal number" in output
+    assert "Found 4 invalid inputs" in output
@@ -0,0 +1,136 @@
+import http.server
+import io
+import json
+import random
+import threading
+
+import pytest
+
+from horizen_dump_scripts import eon_dump_stream
+from horizen_dump_scripts.eon_dump_stream import DumpParseError, iter_dump_chunks, iter_dump_from_rpc
+
+BLOCK_HEIGHT = 1234
+
+
+def make_dump(rng, account_count):
+    """Return a dump in the debug_dumpBlock format, with accounts of different sizes and some non ASCII data."""
+    accounts = {}
+    for index in range(account_count):
+        account = {"balance": str(rng.getrandbits(80)), "nonce": rng.randint(0, 1000), "root": "0x%064x" % rng.getrandbits(256)}
+        if index % 5 == 0:
+            account["code"] = "0x" + rng.randbytes(rng.randint(1, 2000)).hex()
+            account["storage"] = {"0x%064x" % rng.getrandbits(256): "0x%064x" % rng.getrandbits(256) for _ in range(rng.randint(0, 50))}
+        if index % 7 == 0:
+            account["note"] = 'ünïcödé "accounts": {}, ' + "€" * rng.randint(1, 20)
+        accounts["0x%040x" % rng.getrandbits(160)] = account
+    return {"root": "0x%064x" % rng.getrandbits(256), "accounts": accounts}
+
+
+def random_split(data, rng, max_size):
+    position = 0
+    while position < len(data):
+        size = rng.randint(1, max_size)
+        yield data[position:position + size]
+        position = position + size
+
+
+@pytest.fixture(scope="module")
+def recorded_dump(tmp_path_factory):
+    path = tmp_path_factory.mktemp("dump") / "dump.json"
+    with open(path, "w", encoding="utf-8") as dump_file:
+        json.dump(make_dump(random.Random(1), 300), dump_file, indent=4, ensure_ascii=False)
+    return path
+
+
+def expected_accounts(dump_bytes, is_rpc_response):
+    dump = json.load(io.BytesIO(dump_bytes))
+    return list((dump["result"] if is_rpc_response else dump)["accounts"].items())
+
+
+@pytest.mark.parametrize("max_size", [1, 7, 100, 100000])
+def test_iter_dump_chunks(recorded_dump, max_size):
+    dump_bytes = recorded_dump.read_bytes()
+    chunks = random_split(dump_bytes, random.Random(max_size), max_size)
+    assert list(iter_dump_chunks(chunks)) == expected_accounts(dump_bytes, False)
+
+
+def test_iter_dump_chunks_of_compact_rpc_response(recorded_dump):
+    with open(recorded_dump, encoding="utf-8") as dump_file:
+        response = {"jsonrpc": "2.0", "id": 0, "result": json.load(dump_file)}
+    dump_bytes = json.dumps(response, separators=(",", ":")).encode()
+    chunks = random_split(dump_bytes, random.Random(2), 13)
+    assert list(iter_dump_chunks(chunks)) == expected_accounts(dump_bytes, True)
+
+
+@pytest.mark.parametrize("text", [
+    b'{"root": "0x00", "accounts": {"0x01": {"balance": "1"}',
+    b'{"root": "0x00", "accounts": ["0x01"]}',
+    b'{"jsonrpc": "2.0", "id": 0, "error": {"code": -32601, "message": "the method does not exist"}}',
+])
+def test_iter_dump_chunks_rejects_incomplete_dumps(text):
+    with pytest.raises(DumpParseError):
+        list(iter_dump_chunks(random_split(text, random.Random(3), 5)))
+
+
+def test_iter_dump_chunks_rejects_duplicated_accounts():
+    with pytest.raises(ValueError, match="duplicate key"):
+        list(iter_dump_chunks([b'{"accounts": {"0x01": {}, "0x02": {}, "0x01": {}}}']))
+
+
+class DumpServer(http.server.ThreadingHTTPServer):
+    """Serves a recorded JSON-RPC dump response with chunked transfer encoding, in small chunks of random size."""
+    def __init__(self, response_bytes):
+        super().__init__(("127.0.0.1", 0), DumpRequestHandler)
+        self.response_bytes = response_bytes
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class DumpRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.server.requests.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in random_split(self.server.response_bytes, random.Random(4), 300):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def dump_server(recorded_dump, monkeypatch):
+    monkeypatch.setattr(eon_dump_stream, "CHUNK_SIZE", 64)
+    with open(recorded_dump, encoding="utf-8") as dump_file:
+        response = {"jsonrpc": "2.0", "id": 0, "result": json.load(dump_file)}
+    server = DumpServer(json.dumps(response, indent=2, ensure_ascii=False).encode())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_iter_dump_from_rpc(dump_server, tmp_path):
+    tee_file_name = tmp_path / "tee.json"
+    accounts = list(iter_dump_from_rpc(dump_server.url, BLOCK_HEIGHT, tee_file_name=tee_file_name))
+    assert accounts == expected_accounts(dump_server.response_bytes, True)
+    assert tee_file_name.read_bytes() == dump_server.response_bytes
+    assert dump_server.requests == [
+        {"jsonrpc": "2.0", "id": 0, "method": "debug_dumpBlock", "params": [hex(BLOCK_HEIGHT)]}
+    ]
+
+
+def test_iter_dump_from_rpc_without_tee_file(dump_server):
+    accounts = iter_dump_from_rpc(dump_server.url, BLOCK_HEIGHT, method="zen_dump")
+    assert list(accounts) == expected_accounts(dump_server.response_bytes, True)
+    assert dump_server.requests[0]["method"] == "zen_dump"
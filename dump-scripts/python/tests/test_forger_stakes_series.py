@@ -0,0 +1,159 @@
+import json
+
+import pytest
+from eth_abi import decode, encode
+from eth_utils import to_checksum_address
+
+from horizen_dump_scripts import forger_stakes_series
+from horizen_dump_scripts.forger_stakes_series import add_heights, extract_stakes, iter_series, new_series, sum_stakes
+from horizen_dump_scripts.get_all_forger_stakes import parse_heights
+
+FORGER_A = "0x" + "aa" * 32 + "a1" * 32 + "01"
+FORGER_B = "0x" + "bb" * 32 + "b1" * 32 + "02"
+FORGER_C = "0x" + "cc" * 32 + "c1" * 32 + "03"
+
+
+def delegator(index):
+    return to_checksum_address("0x%040x" % (0x1000 + index))
+
+
+class FakeForgerStakesClient:
+    """Answers the calls of forger_stakes_series with the stakes of each height.
+
+    The state is {height: {forger: [[delegator, amount], ...]}}, with the forgers in the order returned by the contract.
+    """
+    def __init__(self, state):
+        self.state = state
+        self.stakes_calls = []
+
+    def batch_call(self, calls):
+        return [self.call(method, params) for method, params in calls]
+
+    def call(self, method, params):
+        assert method == "eth_call" and params[0]["to"] == forger_stakes_series.FORGER_STAKES_NATIVE_SMART_CONTRACT
+        forgers = self.state[int(params[1], 16)]
+        data = bytes.fromhex(params[0]["data"][2:])
+        (selector, arguments) = ("0x" + data[:4].hex(), data[4:])
+        if selector == forger_stakes_series.GET_PAGED_FORGERS_SELECTOR:
+            (index, size) = decode(["int32", "int32"], arguments)
+            page = [(*forger_stakes_series.forger_key(forger), 0, forger_stakes_series.NULL_ADDRESS) for forger in list(forgers)[index:index + size]]
+            return self.page_result(index, size, len(forgers), forger_stakes_series.FORGER_INFO_LIST_TYPE, page)
+        if selector == forger_stakes_series.GET_PAGED_FORGERS_STAKES_BY_FORGER_SELECTOR:
+            (sign_pub_key, vrf1, vrf2, index, size) = decode(["bytes32", "bytes32", "bytes1", "int32", "int32"], arguments)
+            forger = forger_stakes_series.forger_id(sign_pub_key, vrf1, vrf2)
+            self.stakes_calls.append((int(params[1], 16), forger, index))
+            stakes = forgers[forger]
+            return self.page_result(index, size, len(stakes), forger_stakes_series.DELEGATOR_STAKE_LIST_TYPE, stakes[index:index + size])
+        assert selector == forger_stakes_series.STAKE_TOTAL_SELECTOR
+        (sign_pub_key, vrf1, vrf2, _, _, _) = decode(["bytes32", "bytes32", "bytes1", "address", "uint32", "uint32"], arguments)
+        if (sign_pub_key, vrf1, vrf2) == forger_stakes_series.ALL_FORGERS:
+            total = sum(amount for stakes in forgers.values() for _, amount in stakes)
+        else:
+            total = sum(amount for _, amount in forgers[forger_stakes_series.forger_id(sign_pub_key, vrf1, vrf2)])
+        return "0x" + encode(["uint256[]"], [[total]]).hex()
+
+    @staticmethod
+    def page_result(index, size, count, items_type, items):
+        next_index = index + size if index + size < count else -1
+        return "0x" + encode(["int32", items_type], [next_index, items]).hex()
+
+
+def expected_stakes(forgers):
+    return sum_stakes(list(forgers), forgers)
+
+
+def make_state():
+    """Stakes of 3 forgers at 4 heights, with more stakes than a page for FORGER_A."""
+    height_100 = {
+        FORGER_A: [[delegator(i), 10 ** 18 + i] for i in range(23)],
+        FORGER_B: [[delegator(1), 5], [delegator(30), 7]],
+    }
+    # A new forger and a new stake of FORGER_B
+    height_200 = dict(height_100, **{FORGER_C: [[delegator(40), 1]], FORGER_B: height_100[FORGER_B] + [[delegator(2), 3]]})
+    # FORGER_B moves an amount between two delegators, its total does not change
+    height_300 = dict(height_200, **{FORGER_B: [[delegator(1), 3], [delegator(30), 9], [delegator(2), 3]]})
+    # FORGER_C is removed and FORGER_A loses a stake
+    height_400 = {FORGER_A: height_100[FORGER_A][1:], FORGER_B: height_300[FORGER_B]}
+    return {100: height_100, 200: height_200, 300: height_300, 400: height_400}
+
+
+def test_add_heights_and_extract_stakes():
+    client = FakeForgerStakesClient(make_state())
+    series = new_series()
+    add_heights(client, series, [100, 200, 300, 400])
+
+    assert [snapshot["height"] for snapshot in series["snapshots"]] == [100, 200, 300, 400]
+    # Only the forgers whose stakeTotal changed are read
+    assert sorted({(height, forger) for height, forger, _ in client.stakes_calls}) == sorted([
+        (100, FORGER_A), (100, FORGER_B), (200, FORGER_B), (200, FORGER_C), (400, FORGER_A)
+    ])
+    assert [snapshot["reused"] for snapshot in series["snapshots"]] == [[], [FORGER_A], [FORGER_A, FORGER_B, FORGER_C], [FORGER_B]]
+
+    for height, forgers in make_state().items():
+        stakes = extract_stakes(series, height, client)
+        assert stakes == expected_stakes(forgers)
+        assert list(stakes) == list(expected_stakes(forgers))
+
+
+def test_extract_stakes_reads_the_reused_forgers_again():
+    client = FakeForgerStakesClient(make_state())
+    series = new_series()
+    add_heights(client, series, [100, 200, 300])
+
+    # The stakes saved for FORGER_B at height 300 are the ones of height 200, only their total is right
+    (snapshot, stakes_by_forger) = list(iter_series(series))[2]
+    assert stakes_by_forger[FORGER_B] == make_state()[200][FORGER_B]
+    assert expected_stakes(stakes_by_forger) != expected_stakes(make_state()[300])
+
+    with pytest.raises(ValueError, match="were not read at height 300"):
+        extract_stakes(series, 300)
+    client.stakes_calls = []
+    assert extract_stakes(series, 300, client) == expected_stakes(make_state()[300])
+    assert {(height, forger) for height, forger, _ in client.stakes_calls} == {(300, FORGER_A), (300, FORGER_B), (300, FORGER_C)}
+    # The first height has no reused forgers
+    assert extract_stakes(series, 100) == expected_stakes(make_state()[100])
+
+
+def test_add_heights_to_an_existing_series(tmp_path):
+    client = FakeForgerStakesClient(make_state())
+    series = new_series()
+    add_heights(client, series, [100, 200])
+    forger_stakes_series.write_series(str(tmp_path / "series.json"), series)
+
+    series = forger_stakes_series.load_series(str(tmp_path / "series.json"))
+    client.stakes_calls = []
+    add_heights(client, series, [300, 400])
+    # The totals of the last saved height are compared with the new ones
+    assert {(height, forger) for height, forger, _ in client.stakes_calls} == {(400, FORGER_A)}
+
+    full_series = new_series()
+    add_heights(client, full_series, [100, 200, 300, 400])
+    assert json.loads(json.dumps(series)) == json.loads(json.dumps(full_series))
+    for height, forgers in make_state().items():
+        assert extract_stakes(series, height, client) == expected_stakes(forgers)
+
+    with pytest.raises(ValueError, match="not greater than the last height"):
+        add_heights(client, series, [400])
+
+
+def test_extract_stakes_of_a_missing_height():
+    series = new_series()
+    add_heights(FakeForgerStakesClient(make_state()), series, [100, 200])
+    with pytest.raises(ValueError, match=r"Height 150 not found in the series, saved heights: \[100, 200\]"):
+        extract_stakes(series, 150)
+
+
+@pytest.mark.parametrize("heights, expected_heights", [
+    ("100:400:100", [100, 200, 300, 400]),
+    ("100:450:100", [100, 200, 300, 400]),
+    ("7", [7]),
+    ("300,100,200,100", [100, 200, 300]),
+])
+def test_parse_heights(heights, expected_heights):
+    assert parse_heights(heights) == expected_heights
+
+
+@pytest.mark.parametrize("heights", ["400:100:100", "100:400:-100", "100:400:0", "1:2", "a,b"])
+def test_parse_heights_rejects_invalid_heights(heights):
+    with pytest.raises(ValueError):
+        parse_heights(heights)
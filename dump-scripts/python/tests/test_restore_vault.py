@@ -0,0 +1,329 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import pytest
+from eth_abi import decode, encode
+
+from horizen_dump_scripts import reconcile_restore, restore_vault
+from horizen_dump_scripts.artifacts import write_artifact
+from horizen_dump_scripts.migrationhash import calculate_migration_hash
+from horizen_dump_scripts.rpc import JsonRpcClient, function_selector
+
+"""
+Tests of restore_vault and reconcile_restore.
+
+The distribution checks and the reconciliation reports are tested with fake clients. The whole restore, followed by
+its reconciliation, is tested against a local Hardhat node,
+with the contracts compiled by hardhat. From the erc20-migration folder:
+
+    npx hardhat compile
+    npx hardhat node
+
+then run the tests with HARDHAT_RPC_URL=http://127.0.0.1:8545. The folder of the compiled contracts can be set with
+HARDHAT_ARTIFACTS_DIR (default erc20-migration/artifacts/contracts). Without HARDHAT_RPC_URL these tests are skipped.
+"""
+
+HARDHAT_RPC_URL = os.environ.get("HARDHAT_RPC_URL")
+HARDHAT_ARTIFACTS_DIR = os.environ.get(
+    "HARDHAT_ARTIFACTS_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "..", "..", "erc20-migration", "artifacts", "contracts")
+)
+
+requires_hardhat = pytest.mark.skipif(HARDHAT_RPC_URL is None, reason="HARDHAT_RPC_URL not set")
+
+NULL_ADDRESS = "0x0000000000000000000000000000000000000000"
+TOKEN_ADDRESS = "0x00000000000000000000000000000000000000aa"
+VAULT_ADDRESS = "0x00000000000000000000000000000000000000bb"
+
+
+class FakeVaultClient:
+    """Answers the EONBackupVault reads done by distribute()."""
+    def __init__(self, zen_token, more_to_distribute, address_count, next_reward_index):
+        self.results = {
+            restore_vault.ZEN_TOKEN_SELECTOR: int(zen_token, 16),
+            restore_vault.MORE_TO_DISTRIBUTE_SELECTOR: int(more_to_distribute),
+        }
+        self.storage = {
+            restore_vault.EON_VAULT_ADDRESS_LIST_SLOT: address_count,
+            restore_vault.EON_VAULT_NEXT_REWARD_INDEX_SLOT: next_reward_index,
+        }
+
+    def eth_call(self, to, data, block_height):
+        return "0x" + encode(["uint256"], [self.results[data]]).hex()
+
+    def call(self, method, params):
+        assert method == "eth_getStorageAt"
+        return "0x" + encode(["uint256"], [self.storage[int(params[1], 16)]]).hex()
+
+
+def run_distribute(client):
+    restore_vault.distribute(client, None, None, None, VAULT_ADDRESS, 10, None)
+
+
+def test_distribute_fails_without_erc20(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        run_distribute(FakeVaultClient(NULL_ADDRESS, False, 10, 0))
+    assert exit_info.value.code == 1
+    assert "ERC20 address not set on the EONBackupVault" in capsys.readouterr().out
+
+
+def test_distribute_already_executed(capsys):
+    run_distribute(FakeVaultClient(TOKEN_ADDRESS, False, 10, 10))
+    assert "Token distribution already executed" in capsys.readouterr().out
+
+
+def test_distribute_fails_when_distribution_is_not_possible(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        run_distribute(FakeVaultClient(TOKEN_ADDRESS, False, 10, 4))
+    assert exit_info.value.code == 1
+    output = capsys.readouterr().out
+    assert "6 accounts still to be distributed" in output
+    assert "already executed" not in output
+
+
+class FakeReconcileClient:
+    """Answers the reads done by reconcile_restore from the restored balances and the vault state."""
+    batch_size = 3
+    concurrency = 2
+
+    def __init__(self, balances, vault_token_balance, cumulative_hash, checkpoint):
+        self.balances = balances
+        self.vault_token_balance = vault_token_balance
+        self.hashes = {
+            reconcile_restore.CUMULATIVE_HASH_SELECTOR: cumulative_hash,
+            reconcile_restore.CUMULATIVE_HASH_CHECKPOINT_SELECTOR: checkpoint,
+        }
+        self.batches = []
+
+    def batch_eth_call(self, to, data_list, block_height):
+        self.batches.append(len(data_list))
+        return [self.eth_call(to, data, block_height) for data in data_list]
+
+    def eth_call(self, to, data, block_height):
+        assert block_height == 100
+        if data in self.hashes:
+            assert to == VAULT_ADDRESS
+            return "0x" + self.hashes[data].hex()
+        (selector, argument) = (data[:10], bytes.fromhex(data[10:]))
+        if selector == reconcile_restore.ZEND_VAULT_BALANCES_SELECTOR:
+            assert to == VAULT_ADDRESS
+            balance = self.balances.get("0x" + decode(["bytes20"], argument)[0].hex(), 0)
+        else:
+            assert to == TOKEN_ADDRESS and selector == reconcile_restore.BALANCE_OF_SELECTOR
+            address = decode(["address"], argument)[0].lower()
+            balance = self.vault_token_balance if address == VAULT_ADDRESS else self.balances.get(address, 0)
+        return "0x" + encode(["uint256"], [balance]).hex()
+
+
+def run_fake_reconcile(monkeypatch, tmp_path, file_type, change=None):
+    """Reconcile an artifact with a fake client restoring it, after changing the restored state."""
+    monkeypatch.setattr(reconcile_restore, "failed_reconciliation", False)
+    rng = random.Random(3)
+    accounts = sorted(("0x%040x" % rng.getrandbits(160), rng.randint(1, 10 ** 21)) for _ in range(29))
+    write_artifact(tmp_path / "artifact.json", accounts)
+    migration_hash = calculate_migration_hash(accounts, file_type == "eon")
+    client = FakeReconcileClient(dict(accounts), sum(balance for _, balance in accounts), migration_hash, migration_hash)
+    if change is not None:
+        change(client, accounts)
+    reconcile_restore.reconcile(file_type, str(tmp_path / "artifact.json"), client, TOKEN_ADDRESS, VAULT_ADDRESS, 100)
+    return client, accounts
+
+
+@pytest.mark.parametrize("file_type", ["eon", "zend"])
+def test_reconcile_restored_artifact(monkeypatch, tmp_path, capsys, file_type):
+    (client, accounts) = run_fake_reconcile(monkeypatch, tmp_path, file_type)
+    assert not reconcile_restore.failed_reconciliation
+    # Rounds of batch_size * concurrency * ACCOUNTS_PER_ROUND_MULTIPLIER accounts
+    assert client.batches == [24, 5]
+    output = capsys.readouterr().out
+    total = sum(balance for _, balance in accounts)
+    assert f"Checked 29 accounts. Total balance in the artifact: {total} wei, total balance on chain: {total} wei." in output
+    assert "does not match" not in output
+
+
+def test_reconcile_reports_balance_mismatches(monkeypatch, tmp_path, capsys):
+    def change(client, accounts):
+        client.balances[accounts[2][0]] = accounts[2][1] + 5
+        client.balances[accounts[27][0]] = 0
+
+    (_, accounts) = run_fake_reconcile(monkeypatch, tmp_path, "eon", change)
+    assert reconcile_restore.failed_reconciliation
+    output = capsys.readouterr().out
+    assert f"Address {accounts[2][0]} balances do not match. Artifact: {accounts[2][1]} wei. On chain: {accounts[2][1] + 5} wei." in output
+    assert f"Address {accounts[27][0]} balances do not match. Artifact: {accounts[27][1]} wei. On chain: 0 wei." in output
+    # The hashes are calculated from the artifact, they still match
+    assert output.count("balances do not match") == 2
+    assert "hash does not match" not in output
+
+
+def test_reconcile_reports_claimed_zend_balances_and_vault_token_balance(monkeypatch, tmp_path, capsys):
+    def change(client, accounts):
+        # Claimed, the tokens left the vault
+        client.balances[accounts[4][0]] = 0
+        client.vault_token_balance = client.vault_token_balance - accounts[4][1] + 1
+
+    (_, accounts) = run_fake_reconcile(monkeypatch, tmp_path, "zend", change)
+    assert reconcile_restore.failed_reconciliation
+    output = capsys.readouterr().out
+    assert f"Zend address {accounts[4][0]} has 0 balance in the vault, expected {accounts[4][1]} wei (possibly already claimed)." in output
+    total = sum(balance for _, balance in accounts) - accounts[4][1]
+    assert f"ZenToken balance of the vault {total + 1} wei is different from the sum of the vault balances {total} wei." in output
+
+
+@pytest.mark.parametrize("changed_hash, message", [
+    (reconcile_restore.CUMULATIVE_HASH_SELECTOR, "Vault cumulative hash does not match the artifact."),
+    (reconcile_restore.CUMULATIVE_HASH_CHECKPOINT_SELECTOR, "Vault cumulative hash checkpoint does not match the artifact."),
+])
+def test_reconcile_reports_hash_mismatches(monkeypatch, tmp_path, capsys, changed_hash, message):
+    def change(client, accounts):
+        client.hashes[changed_hash] = calculate_migration_hash(accounts[:-1], False)
+
+    run_fake_reconcile(monkeypatch, tmp_path, "zend", change)
+    assert reconcile_restore.failed_reconciliation
+    output = capsys.readouterr().out
+    assert message in output
+    assert output.count("does not match") == 1
+
+
+def send_transaction(client, sender, to, data):
+    transaction = {"from": sender, "data": data}
+    if to is not None:
+        transaction["to"] = to
+    tx_hash = client.call("eth_sendTransaction", [transaction])
+    for _ in range(100):
+        receipt = client.call("eth_getTransactionReceipt", [tx_hash])
+        if receipt is not None:
+            assert int(receipt["status"], 16) == 1
+            return receipt
+        time.sleep(0.1)
+    raise AssertionError(f"Transaction {tx_hash} not mined")
+
+
+def deploy(client, sender, contract_name, types, values):
+    with open(os.path.join(HARDHAT_ARTIFACTS_DIR, contract_name + ".sol", contract_name + ".json")) as artifact_file:
+        bytecode = json.load(artifact_file)["bytecode"]
+    return send_transaction(client, sender, None, bytecode + encode(types, values).hex())["contractAddress"]
+
+
+def call_uint256(client, contract_address, signature, types=(), values=()):
+    data = function_selector(signature) + encode(list(types), list(values)).hex()
+    return decode(["uint256"], bytes.fromhex(client.eth_call(contract_address, data, "latest")[2:]))[0]
+
+
+def set_erc20(client, sender, vault_address, token_address):
+    send_transaction(client, sender, vault_address, function_selector("setERC20(address)") + encode(["address"], [token_address]).hex())
+
+
+def run_script(tmp_path, module_name, *args):
+    environment = dict(os.environ)
+    environment.pop("ADMIN_PRIVK", None)
+    return subprocess.run(
+        [sys.executable, "-c", f"from horizen_dump_scripts.{module_name} import main; main()", *args],
+        cwd=tmp_path, env=environment, capture_output=True, text=True, timeout=300
+    )
+
+
+def run_restore(tmp_path, *args):
+    return run_script(tmp_path, "restore_vault", *args)
+
+
+def run_reconcile(tmp_path, client, file_type, accounts, token, vault):
+    """Run reconcile_restore at the current block, with the accounts written in a new artifact."""
+    write_artifact(tmp_path / "reconciled.json", accounts)
+    block_height = int(client.call("eth_blockNumber", []), 16)
+    return run_script(tmp_path, "reconcile_restore", file_type, "reconciled.json", HARDHAT_RPC_URL, token, vault, str(block_height),
+                      "--batch-size", "4", "--concurrency", "2")
+
+
+@pytest.fixture
+def contracts():
+    with JsonRpcClient(HARDHAT_RPC_URL, concurrency=1) as client:
+        admin = client.call("eth_accounts", [])[0]
+        eon_vault = deploy(client, admin, "EONBackupVault", ["address"], [admin])
+        zend_vault = deploy(client, admin, "ZendBackupVault", ["address", "string"], [admin, "CLAIM"])
+        token = deploy(client, admin, "ZenToken", ["string", "string", "address", "address", "address", "address"],
+                       ["ZEN", "ZEN", eon_vault, zend_vault, admin, admin])
+        yield client, admin, eon_vault, zend_vault, token
+
+
+@requires_hardhat
+def test_restore_eon(tmp_path, contracts):
+    (client, admin, eon_vault, _, token) = contracts
+    rng = random.Random(1)
+    accounts = sorted(("0x%040x" % rng.getrandbits(160), rng.randint(1, 10 ** 21)) for _ in range(23))
+    write_artifact(tmp_path / "eon.json", accounts)
+    expected_hash = "0x" + calculate_migration_hash(accounts, True).hex()
+    arguments = ["eon", "eon.json", HARDHAT_RPC_URL, eon_vault, expected_hash, "--batch-size", "5", "--distribute-max-count", "4"]
+
+    # The accounts are inserted, but nothing can be distributed before setERC20
+    result = run_restore(tmp_path, *arguments)
+    assert result.returncode == 1, result.stdout
+    assert "ERC20 address not set on the EONBackupVault" in result.stdout
+    assert "already executed" not in result.stdout
+
+    set_erc20(client, admin, eon_vault, token)
+    result = run_restore(tmp_path, *arguments)
+    assert result.returncode == 0, result.stdout
+    assert "Restore already completed" in result.stdout
+    assert "Token distribution ended successfully" in result.stdout
+    for address, balance in accounts:
+        assert call_uint256(client, token, "balanceOf(address)", ["address"], [address]) == balance
+
+    result = run_restore(tmp_path, *arguments)
+    assert result.returncode == 0, result.stdout
+    assert "Token distribution already executed" in result.stdout
+
+    result = run_reconcile(tmp_path, client, "eon", accounts, token, eon_vault)
+    assert result.returncode == 0, result.stdout
+    assert "On-chain reconciliation successful." in result.stdout
+
+    changed_accounts = list(accounts)
+    changed_accounts[7] = (accounts[7][0], accounts[7][1] + 1)
+    result = run_reconcile(tmp_path, client, "eon", changed_accounts, token, eon_vault)
+    assert result.returncode == 1, result.stdout
+    assert f"Address {accounts[7][0]} balances do not match. Artifact: {accounts[7][1] + 1} wei. On chain: {accounts[7][1]} wei." in result.stdout
+    assert "Vault cumulative hash does not match the artifact." in result.stdout
+    assert "On-chain reconciliation failed." in result.stdout
+
+
+@requires_hardhat
+def test_restore_zend(tmp_path, contracts):
+    (client, admin, _, zend_vault, token) = contracts
+    rng = random.Random(2)
+    accounts = sorted(("0x%040x" % rng.getrandbits(160), rng.randint(1, 10 ** 21)) for _ in range(17))
+    write_artifact(tmp_path / "zend.json", accounts)
+    expected_hash = "0x" + calculate_migration_hash(accounts, False).hex()
+    arguments = ["zend", "zend.json", HARDHAT_RPC_URL, zend_vault, expected_hash, "--batch-size", "6"]
+
+    result = run_restore(tmp_path, *arguments)
+    assert result.returncode == 1, result.stdout
+    assert "ERC20 address not set on the ZendBackupVault" in result.stdout
+
+    set_erc20(client, admin, zend_vault, token)
+    result = run_restore(tmp_path, *arguments)
+    assert result.returncode == 0, result.stdout
+    for key, balance in accounts:
+        assert call_uint256(client, zend_vault, "balances(bytes20)", ["bytes20"], [bytes.fromhex(key[2:])]) == balance
+
+    result = run_reconcile(tmp_path, client, "zend", accounts, token, zend_vault)
+    assert result.returncode == 0, result.stdout
+    assert "On-chain reconciliation successful." in result.stdout
+
+    changed_accounts = list(accounts)
+    changed_accounts[3] = (accounts[3][0], accounts[3][1] - 1)
+    result = run_reconcile(tmp_path, client, "zend", changed_accounts, token, zend_vault)
+    assert result.returncode == 1, result.stdout
+    assert f"Address {accounts[3][0]} balances do not match." in result.stdout
+    assert "Vault cumulative hash checkpoint does not match the artifact." in result.stdout
+
+    # An account missing from the artifact: the vault holds more tokens than the artifact balances
+    result = run_reconcile(tmp_path, client, "zend", accounts[:5] + accounts[6:], token, zend_vault)
+    assert result.returncode == 1, result.stdout
+    assert "balances do not match" not in result.stdout
+    assert "is different from the sum of the vault balances" in result.stdout
+    assert "Vault cumulative hash does not match the artifact." in result.stdout
+    assert "On-chain reconciliation failed." in result.stdout
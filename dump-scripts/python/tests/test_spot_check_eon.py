@@ -0,0 +1,163 @@
+import http.server
+import json
+import random
+import sys
+import threading
+
+import pytest
+from eth_abi import decode, encode
+
+from horizen_dump_scripts import spot_check_eon
+from horizen_dump_scripts.artifacts import write_artifact
+from horizen_dump_scripts.forger_stakes_series import FORGER_STAKES_NATIVE_SMART_CONTRACT
+
+BLOCK_HEIGHT = 1000
+
+
+class EonNode(http.server.ThreadingHTTPServer):
+    """Answers the JSON-RPC calls done by spot_check_eon with the known state of the accounts.
+
+    The state is {address: {"balance": wei, "code": hex, "stakes": [wei, ...]}}.
+    """
+    def __init__(self, state):
+        super().__init__(("127.0.0.1", 0), EonNodeRequestHandler)
+        self.state = state
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def handle_request_item(self, request):
+        (method, params) = (request["method"], request["params"])
+        assert params[-1] == hex(BLOCK_HEIGHT)
+        if method == "eth_getBalance":
+            result = hex(self.state.get(params[0], {}).get("balance", 0))
+        elif method == "eth_getCode":
+            result = self.state.get(params[0], {}).get("code", "0x")
+        else:
+            assert method == "eth_call" and params[0]["to"] == FORGER_STAKES_NATIVE_SMART_CONTRACT
+            data = bytes.fromhex(params[0]["data"][2:])
+            assert "0x" + data[:4].hex() == spot_check_eon.GET_PAGED_FORGERS_STAKES_BY_DELEGATOR_SELECTOR
+            (address, index, size) = decode(["address", "int32", "int32"], data[4:])
+            stakes = self.state.get(address.lower(), {}).get("stakes", [])
+            next_index = index + size if index + size < len(stakes) else -1
+            page = [(bytes(32), bytes(32), bytes(1), stake) for stake in stakes[index:index + size]]
+            result = "0x" + encode(["int32", spot_check_eon.FORGER_STAKE_LIST_TYPE], [next_index, page]).hex()
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+
+class EonNodeRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if isinstance(body, list):
+            response = [self.server.handle_request_item(request) for request in body]
+        else:
+            response = self.server.handle_request_item(body)
+        response_bytes = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response_bytes)))
+        self.end_headers()
+        self.wfile.write(response_bytes)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_state(rng, account_count):
+    state = {}
+    for index in range(account_count):
+        account = {"balance": rng.randint(0, 10 ** rng.randint(1, 24))}
+        if index % 4 == 0:
+            # More stakes than a page, to read several pages
+            account["stakes"] = [rng.randint(1, 10 ** 20) for _ in range(rng.randint(1, 25))]
+        state["0x%040x" % rng.getrandbits(160)] = account
+    return state
+
+
+@pytest.fixture
+def eon_node():
+    node = EonNode(make_state(random.Random(1), 60))
+    thread = threading.Thread(target=node.serve_forever, daemon=True)
+    thread.start()
+    yield node
+    node.shutdown()
+    node.server_close()
+
+
+def write_horizen2_files(tmp_path, state, automappings):
+    accounts = {address: account["balance"] + sum(account.get("stakes", [])) for address, account in state.items()}
+    for address, amount in automappings.items():
+        accounts[address] = accounts.get(address, 0) + amount
+    write_artifact(tmp_path / "eon.json", sorted(accounts.items()))
+    with open(tmp_path / "automappings.json", "w") as automappings_file:
+        json.dump(automappings, automappings_file)
+
+
+def run_spot_check(monkeypatch, tmp_path, node, *options):
+    monkeypatch.setattr(spot_check_eon, "failed_spot_check", False)
+    monkeypatch.setattr(sys, "argv", [
+        "spot_check_eon", str(tmp_path / "eon.json"), node.url, str(BLOCK_HEIGHT),
+        "--automappings", str(tmp_path / "automappings.json"), "--batch-size", "7", *options
+    ])
+    try:
+        spot_check_eon.main()
+    except SystemExit as e:
+        return e.code
+    return 0
+
+
+def automapped(state):
+    addresses = sorted(state)
+    return {addresses[3]: 5 * 10 ** 18, "0x%040x" % 0xabc: 10 ** 18}
+
+
+@pytest.mark.parametrize("options", [(), ("--top", "5", "--sample-size", "10")])
+def test_spot_check_eon_succeeds(monkeypatch, tmp_path, capsys, eon_node, options):
+    write_horizen2_files(tmp_path, eon_node.state, automapped(eon_node.state))
+    assert run_spot_check(monkeypatch, tmp_path, eon_node, *options) == 0
+    output = capsys.readouterr().out
+    assert "do not match" not in output
+    assert "Horizen 2 spot check successful." in output
+
+
+@pytest.mark.parametrize("mismatch", ["balance", "stake", "automapping", "code"])
+def test_spot_check_eon_detects_mismatches(monkeypatch, tmp_path, capsys, eon_node, mismatch):
+    automappings = automapped(eon_node.state)
+    write_horizen2_files(tmp_path, eon_node.state, automappings)
+    # The file is correct, the state served by the node or the automappings are changed after writing it
+    stake_address = next(address for address, account in sorted(eon_node.state.items()) if "stakes" in account)
+    mismatched_address = {
+        "balance": sorted(eon_node.state)[10], "stake": stake_address, "automapping": sorted(eon_node.state)[3], "code": sorted(eon_node.state)[20]
+    }[mismatch]
+    if mismatch == "balance":
+        eon_node.state[mismatched_address]["balance"] += 1
+    elif mismatch == "stake":
+        eon_node.state[mismatched_address]["stakes"][-1] -= 1
+    elif mismatch == "automapping":
+        automappings[mismatched_address] += 1
+        with open(tmp_path / "automappings.json", "w") as automappings_file:
+            json.dump(automappings, automappings_file)
+    else:
+        eon_node.state[mismatched_address]["code"] = "0x6080"
+
+    # The mismatched account is not in the top ones, a sample including all the accounts must find it
+    assert run_spot_check(monkeypatch, tmp_path, eon_node, "--top", "5") == 1
+    output = capsys.readouterr().out
+    if mismatch == "code":
+        assert f"EON address {mismatched_address} is a smart contract at the dump height." in output
+    else:
+        assert f"EON address {mismatched_address} balances do not match." in output
+    assert "Other accounts: 1 mismatches out of" in output
+    assert "Horizen 2 spot check failed." in output
+
+
+def test_spot_check_eon_detects_top_account_mismatch(monkeypatch, tmp_path, capsys, eon_node):
+    write_horizen2_files(tmp_path, eon_node.state, {})
+    largest_address = max(eon_node.state, key=lambda address: eon_node.state[address]["balance"] + sum(eon_node.state[address].get("stakes", [])))
+    eon_node.state[largest_address]["balance"] -= 1
+    assert run_spot_check(monkeypatch, tmp_path, eon_node, "--top", "1", "--sample-size", "0") == 1
+    output = capsys.readouterr().out
+    assert f"EON address {largest_address} balances do not match." in output
+    assert "Largest accounts: 1 mismatches out of 1" in output
+    assert "Horizen 2 spot check failed." in output
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from horizen_dump_scripts.statistics_report import Histogram, TopK
+
+
+def summed_amounts(rng, item_count, update_count):
+    """Return the (item, amount) updates with amounts summed while scanning, and the final amounts."""
+    amounts = {}
+    updates = []
+    for _ in range(update_count):
+        item_id = "0x%04x" % rng.randrange(item_count)
+        amounts[item_id] = amounts.get(item_id, 0) + rng.choice([1, 10, rng.randint(1, 10 ** rng.randint(1, 20))])
+        updates.append((item_id, amounts[item_id]))
+    return updates, amounts
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_top_k_update_item_is_equal_to_the_top_k_of_the_final_amounts(seed):
+    (updates, amounts) = summed_amounts(random.Random(seed), 200, 2000)
+    top = TopK(10)
+    for item_id, amount in updates:
+        top.update_item(item_id, amount)
+    assert top.items() == sorted(amounts.items(), key=lambda item: item[1], reverse=True)[:10]
+
+
+def test_top_k_update_item_keeps_the_first_added_among_equal_amounts():
+    top = TopK(2)
+    for item_id, amount in [("a", 1), ("b", 5), ("c", 5), ("a", 5), ("d", 5)]:
+        top.update_item(item_id, amount)
+    assert top.items() == [("b", 5), ("c", 5)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_histogram_update_is_equal_to_the_histogram_of_the_final_amounts(seed):
+    (updates, amounts) = summed_amounts(random.Random(seed), 200, 2000)
+    histogram = Histogram()
+    previous_amounts = {}
+    for item_id, amount in updates:
+        if item_id in previous_amounts:
+            histogram.update(previous_amounts[item_id], amount)
+        else:
+            histogram.add(amount)
+        previous_amounts[item_id] = amount
+
+    expected_histogram = Histogram()
+    for amount in amounts.values():
+        expected_histogram.add(amount)
+    assert histogram.to_list() == expected_histogram.to_list()
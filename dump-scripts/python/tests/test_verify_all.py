@@ -0,0 +1,111 @@
+import json
+import random
+import sys
+
+import base58
+import pytest
+from eth_utils import to_checksum_address
+
+from horizen_dump_scripts import setup_eon2_json, verify_all, zend_to_horizen
+from horizen_dump_scripts.artifacts import iter_artifact, write_artifact
+from horizen_dump_scripts.check_total_balance_from_zend import calculate_total_supply_from_height, remove_shielded_pool_and_sidechains_balance
+from horizen_dump_scripts.migrationhash import calculate_migration_hash
+
+HEIGHT = 1500000
+
+
+def run_script(monkeypatch, main, *args):
+    monkeypatch.setattr(sys, "argv", [main.__module__, *map(str, args)])
+    try:
+        main()
+    except SystemExit as e:
+        return e.code
+    return 0
+
+
+@pytest.fixture
+def inputs(monkeypatch, tmp_path):
+    """Create consistent zend and Eon inputs with zend_to_horizen and setup_eon2_json. Return the verify_all options."""
+    rng = random.Random(1)
+    zend_balances = {base58.b58encode_check(bytes.fromhex("2089") + rng.randbytes(20)).decode(): rng.randint(1, 10 ** 12) for _ in range(50)}
+    zend_balances["unknown-1"] = 10 ** 6
+    mapping = {address: to_checksum_address("0x%040x" % rng.getrandbits(160)) for address in list(zend_balances)[:3]}
+    with open(tmp_path / "zend.csv", "w") as dump_file:
+        dump_file.writelines(f"{address},{balance},1\n" for address, balance in zend_balances.items())
+    with open(tmp_path / "mapping.json", "w") as mapping_file:
+        json.dump(mapping, mapping_file)
+    assert run_script(monkeypatch, zend_to_horizen.main, "mainnet", tmp_path / "zend.csv", tmp_path / "mapping.json",
+                      tmp_path / "zend.json", tmp_path / "eon_vault.json") == 0
+
+    accounts = {"0x%040x" % rng.getrandbits(160): {"balance": str(rng.randint(1, 10 ** 22)), "nonce": 0} for _ in range(50)}
+    accounts[sorted(accounts)[0]]["code"] = "0x6080"
+    stakes = {to_checksum_address(address): 10 ** 18 for address in sorted(accounts)[1:6]}
+    with open(tmp_path / "eon_dump.json", "w") as eon_dump_file:
+        json.dump({"root": "0x00", "accounts": accounts}, eon_dump_file)
+    with open(tmp_path / "stakes.json", "w") as stakes_file:
+        json.dump(stakes, stakes_file)
+    assert run_script(monkeypatch, setup_eon2_json.main, tmp_path / "eon_dump.json", tmp_path / "stakes.json",
+                      tmp_path / "eon_vault.json", tmp_path / "horizen2.json") == 0
+
+    supply = remove_shielded_pool_and_sidechains_balance(calculate_total_supply_from_height(HEIGHT, "mainnet"), "mainnet", 0)
+    monkeypatch.setattr(verify_all, "options", {})
+    monkeypatch.setattr(verify_all, "inputs", {})
+    return {
+        "--zend-dump": tmp_path / "zend.csv", "--zend-vault": tmp_path / "zend.json", "--mapping": tmp_path / "mapping.json",
+        "--eon-vault": tmp_path / "eon_vault.json", "--eon-dump": tmp_path / "eon_dump.json", "--eon-stakes": tmp_path / "stakes.json",
+        "--horizen2": tmp_path / "horizen2.json", "--height": HEIGHT, "--eon-sidechain-balance": supply - sum(zend_balances.values()),
+        "--network": "mainnet",
+        "--zend-hash": "0x" + calculate_migration_hash(iter_artifact(tmp_path / "zend.json"), False).hex(),
+        "--eon-hash": calculate_migration_hash(iter_artifact(tmp_path / "horizen2.json"), True).hex(),
+    }
+
+
+def run_verify_all(monkeypatch, options):
+    return run_script(monkeypatch, verify_all.main, *[value for option in options.items() for value in option])
+
+
+def test_verify_all_consistent_inputs(monkeypatch, capsys, inputs):
+    assert run_verify_all(monkeypatch, inputs) == 0
+    output = capsys.readouterr().out
+    assert "Running checks: zend_addresses, eon_addresses, total_balance, zend_migration_hash, eon_migration_hash" in output
+    for check_name in verify_all.CHECK_OPTIONS:
+        assert f"==== {check_name}: successful" in output
+    assert "Verification successful. 5 checks run." in output
+
+
+def change_horizen2_balance(options):
+    items = list(iter_artifact(options["--horizen2"]))
+    items[7] = (items[7][0], items[7][1] + 1)
+    write_artifact(options["--horizen2"], items)
+    # Only the Eon addresses check fails, the expected hash is not checked
+    options.pop("--eon-hash")
+
+
+def change_zend_hash(options):
+    options["--zend-hash"] = options["--zend-hash"][:-1] + ("0" if options["--zend-hash"][-1] != "0" else "1")
+
+
+def change_eon_sidechain_balance(options):
+    options["--eon-sidechain-balance"] = options["--eon-sidechain-balance"] + 10 ** 8
+
+
+@pytest.mark.parametrize("change, failed_check", [
+    (change_horizen2_balance, "eon_addresses"),
+    (change_zend_hash, "zend_migration_hash"),
+    (change_eon_sidechain_balance, "total_balance"),
+])
+def test_verify_all_inconsistent_inputs(monkeypatch, capsys, inputs, change, failed_check):
+    change(inputs)
+    assert run_verify_all(monkeypatch, inputs) == 1
+    output = capsys.readouterr().out
+    assert f"==== {failed_check}: FAILED" in output
+    assert output.count(": FAILED") == 1
+    assert f"Verification failed. Failed checks: {failed_check}" in output
+
+
+def test_verify_all_runs_only_the_checks_with_all_their_inputs(monkeypatch, capsys, inputs):
+    options = {option: inputs[option] for option in ("--zend-dump", "--zend-vault", "--mapping", "--eon-vault", "--zend-hash")}
+    assert run_verify_all(monkeypatch, options) == 0
+    output = capsys.readouterr().out
+    assert "Running checks: zend_addresses, zend_migration_hash\n" in output
+    assert "Verification successful. 2 checks run." in output
@@ -0,0 +1,284 @@
+import csv
+import hashlib
+import json
+import multiprocessing
+import sys
+
+import pytest
+from eth_keys import keys
+
+from horizen_dump_scripts import verify_claims
+from horizen_dump_scripts.artifacts import write_artifact
+from horizen_dump_scripts.zend_keys import compressed_public_key, hash160, uncompressed_public_key
+
+"""
+Tests of verify_claims, with the claims of erc20-migration/test/zenclaim_test.js. The keys are created as zencashjs
+mkPrivKey does (sha256 of the phrase) and the messages are signed as zencashjs message.sign does.
+"""
+
+# Secp256k1 group order
+SECP256K1_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+MESSAGE_PREFIX = "ZTESTSo long and thanks for all the fish"
+TEST1_DESTINATION_ADDRESS = "0xeDEb4BF692A4a1bfeCad78E09bE5C946EcF6C6da"
+TEST2_DESTINATION_ADDRESS = "0x4820e4A0BB7B8979d736CDa6Fd955E6e85e44f28"
+TEST3_DESTINATION_ADDRESS = "0x767dbb8CB5B05B506c54968FB1A5a2860280A6B2"
+TEST_MULTISIG_DESTINATION_ADDRESS = "0xA89c7db6F4f3912674372Aaf7088b56d631301e6"
+TEST_DIRECT_BASE_ADDRESS = "0x6ebacd4a2a48728e98aAAA101C59f2e0c57fA987"
+ZERO_PUBLIC_KEY = ["0x" + "00" * 32, "0x" + "00" * 32]
+
+
+def make_private_key(phrase):
+    return keys.PrivateKey(hashlib.sha256(phrase.encode()).digest())
+
+
+PRIVATE_KEY_1 = make_private_key("chris p. bacon, defender of the guardians")
+PRIVATE_KEY_2 = make_private_key("another wonderful key")
+PRIVATE_KEY_3 = make_private_key("test number 3")
+
+
+def public_key_bytes(private_key, compressed):
+    (x, y) = public_key_xy(private_key)
+    return compressed_public_key(x, y) if compressed else uncompressed_public_key(x, y)
+
+
+def public_key_xy(private_key):
+    public_key = private_key.public_key.to_bytes()
+    return int.from_bytes(public_key[:32], "big"), int.from_bytes(public_key[32:], "big")
+
+
+def public_key_pair(private_key):
+    """The [x, y] public key passed to the contract."""
+    return ["0x%064x" % coordinate for coordinate in public_key_xy(private_key)]
+
+
+def sign(message, private_key, compressed, high_s=False):
+    """Same as zencashjs message.sign: v is 27 + recovery id, + 4 for a compressed public key."""
+    signature = private_key.sign_msg_hash(verify_claims.create_message_hash(message))
+    (v, s) = (signature.v, signature.s)
+    if high_s:
+        (v, s) = (1 - v, SECP256K1_N - s)
+    return "0x" + bytes([27 + v + (4 if compressed else 0)]).hex() + "%064x" % signature.r + "%064x" % s
+
+
+def multisig_script(public_keys, min_signatures):
+    """Same as zencashjs mkMultiSigRedeemScript."""
+    script = bytes([0x50 + min_signatures])
+    for public_key in public_keys:
+        script = script + bytes([len(public_key)]) + public_key
+    return script + bytes([0x50 + len(public_keys), 0xae])
+
+
+TEST1_ZEND_ADDRESS = "0x" + hash160(public_key_bytes(PRIVATE_KEY_1, False)).hex()
+TEST2_ZEND_ADDRESS = "0x" + hash160(public_key_bytes(PRIVATE_KEY_2, True)).hex()
+TEST3_ZEND_ADDRESS = "0x" + hash160(public_key_bytes(PRIVATE_KEY_3, False)).hex()
+TEST_MULTISIG_SCRIPT = multisig_script(
+    [public_key_bytes(PRIVATE_KEY_1, False), public_key_bytes(PRIVATE_KEY_2, True), public_key_bytes(PRIVATE_KEY_3, False)], 2
+)
+TEST_MULTISIG_ADDRESS = "0x" + hash160(TEST_MULTISIG_SCRIPT).hex()
+TEST_DIRECT_MULTISIG_SCRIPT = multisig_script(
+    [public_key_bytes(PRIVATE_KEY_1, False), b"\x02" + hashlib.sha256(bytes.fromhex(TEST_DIRECT_BASE_ADDRESS[2:])).digest()], 1
+)
+TEST_DIRECT_MULTISIG_ADDRESS = "0x" + hash160(TEST_DIRECT_MULTISIG_SCRIPT).hex()
+
+MULTISIG_MESSAGE = MESSAGE_PREFIX + TEST_MULTISIG_ADDRESS + TEST_MULTISIG_DESTINATION_ADDRESS
+TEST_MULTISIG_SIGNATURE_1 = sign(MULTISIG_MESSAGE, PRIVATE_KEY_1, False)
+TEST_MULTISIG_SIGNATURE_2 = sign(MULTISIG_MESSAGE, PRIVATE_KEY_2, True)
+TEST_MULTISIG_SIGNATURE_3 = sign(MULTISIG_MESSAGE, PRIVATE_KEY_3, False)
+
+ZEND_VAULT = [
+    (TEST1_ZEND_ADDRESS, 23000), (TEST2_ZEND_ADDRESS, 9000000000), (TEST_MULTISIG_ADDRESS, 51095),
+    (TEST_DIRECT_MULTISIG_ADDRESS, 10595)
+]
+
+
+def p2pkh_claim(dest_address, signature, pub_key):
+    return {"destAddress": dest_address, "signature": signature, "pubKey": pub_key}
+
+
+def p2sh_claim(script, signatures, pub_keys, dest_address=TEST_MULTISIG_DESTINATION_ADDRESS):
+    return {"destAddress": dest_address, "signatures": signatures, "script": "0x" + script.hex(), "pubKeys": pub_keys}
+
+
+def claim_1(**changes):
+    claim = p2pkh_claim(
+        TEST1_DESTINATION_ADDRESS, sign(MESSAGE_PREFIX + TEST1_DESTINATION_ADDRESS, PRIVATE_KEY_1, False), public_key_pair(PRIVATE_KEY_1)
+    )
+    claim.update(changes)
+    return claim
+
+
+def verify(claim):
+    """Return the (claim type, vault key, error before the balance check, error after it) of a claim."""
+    verify_claims.set_message_prefix(MESSAGE_PREFIX)
+    line = claim if isinstance(claim, str) else json.dumps(claim)
+    [(_, claim_type, zen_address, error_before_balance, error_after_balance)] = verify_claims.verify_claims([(1, line)])
+    return claim_type, zen_address, error_before_balance, error_after_balance
+
+
+@pytest.mark.parametrize("claim, zen_address", [
+    (claim_1(), TEST1_ZEND_ADDRESS),
+    # The uncompressed public key can be passed as a single hex string too
+    (claim_1(pubKey="0x" + public_key_bytes(PRIVATE_KEY_1, False).hex()), TEST1_ZEND_ADDRESS),
+    # Compressed signature, v is 31 or 32, the vault key is the one of the compressed public key
+    (p2pkh_claim(
+        TEST2_DESTINATION_ADDRESS, sign(MESSAGE_PREFIX + TEST2_DESTINATION_ADDRESS, PRIVATE_KEY_2, True), public_key_pair(PRIVATE_KEY_2)
+    ), TEST2_ZEND_ADDRESS),
+    # An uncompressed signature of the same key claims the uncompressed address
+    (p2pkh_claim(
+        TEST2_DESTINATION_ADDRESS, sign(MESSAGE_PREFIX + TEST2_DESTINATION_ADDRESS, PRIVATE_KEY_2, False), public_key_pair(PRIVATE_KEY_2)
+    ), "0x" + hash160(public_key_bytes(PRIVATE_KEY_2, False)).hex()),
+    # Valid signature of a key without balance, the balance is checked by the main process
+    (p2pkh_claim(
+        TEST3_DESTINATION_ADDRESS, sign(MESSAGE_PREFIX + TEST3_DESTINATION_ADDRESS, PRIVATE_KEY_3, False), public_key_pair(PRIVATE_KEY_3)
+    ), TEST3_ZEND_ADDRESS),
+])
+def test_valid_p2pkh_claims(claim, zen_address):
+    assert verify(claim) == ("p2pkh", zen_address, None, None)
+    assert bytes.fromhex(claim["signature"][2:4])[0] in ((31, 32) if zen_address == TEST2_ZEND_ADDRESS else (27, 28))
+
+
+@pytest.mark.parametrize("signatures, pub_keys", [
+    ([TEST_MULTISIG_SIGNATURE_1, TEST_MULTISIG_SIGNATURE_2, "0x"], [public_key_pair(PRIVATE_KEY_1), public_key_pair(PRIVATE_KEY_2), ZERO_PUBLIC_KEY]),
+    ([TEST_MULTISIG_SIGNATURE_1, "0x", TEST_MULTISIG_SIGNATURE_3], [public_key_pair(PRIVATE_KEY_1), ZERO_PUBLIC_KEY, public_key_pair(PRIVATE_KEY_3)]),
+    (["0x", TEST_MULTISIG_SIGNATURE_2, TEST_MULTISIG_SIGNATURE_3], [ZERO_PUBLIC_KEY, public_key_pair(PRIVATE_KEY_2), public_key_pair(PRIVATE_KEY_3)]),
+])
+def test_valid_p2sh_2_of_3_claims(signatures, pub_keys):
+    assert verify(p2sh_claim(TEST_MULTISIG_SCRIPT, signatures, pub_keys)) == ("p2sh", TEST_MULTISIG_ADDRESS, None, None)
+
+
+def test_valid_p2sh_1_of_2_claim():
+    signature = sign(MESSAGE_PREFIX + TEST_DIRECT_MULTISIG_ADDRESS + TEST_MULTISIG_DESTINATION_ADDRESS, PRIVATE_KEY_1, False)
+    claim = p2sh_claim(TEST_DIRECT_MULTISIG_SCRIPT, [signature, "0x"], [public_key_pair(PRIVATE_KEY_1), ZERO_PUBLIC_KEY])
+    assert verify(claim) == ("p2sh", TEST_DIRECT_MULTISIG_ADDRESS, None, None)
+
+
+@pytest.mark.parametrize("claim, error_before_balance, error_after_balance", [
+    # High s, the same signature with s replaced by n - s is refused by parseZendSignature
+    (claim_1(signature=sign(MESSAGE_PREFIX + TEST1_DESTINATION_ADDRESS, PRIVATE_KEY_1, False, high_s=True)), "InvalidSignature()", None),
+    (claim_1(signature="0x1d" + claim_1()["signature"][4:]), "InvalidSignature()", None),
+    (claim_1(signature="0x1b" + "00" * 32 + claim_1()["signature"][68:]), "InvalidSignature()", None),
+    (claim_1(signature=claim_1()["signature"][:-2]), "SignatureMustBe65Bytes()", None),
+    # The signature of another destination or message prefix
+    (claim_1(destAddress=TEST2_DESTINATION_ADDRESS), None, "SignatureNotMatching()"),
+    (claim_1(signature=sign("ZENSo long and thanks for all the fish" + TEST1_DESTINATION_ADDRESS, PRIVATE_KEY_1, False)),
+     None, "SignatureNotMatching()"),
+    (claim_1(destAddress="0x" + "00" * 20), "AddressNotValid()", None),
+])
+def test_invalid_p2pkh_claims(claim, error_before_balance, error_after_balance):
+    assert verify(claim)[2:] == (error_before_balance, error_after_balance)
+
+
+def test_p2sh_claim_of_another_destination():
+    claim = p2sh_claim(
+        TEST_MULTISIG_SCRIPT, [TEST_MULTISIG_SIGNATURE_1, TEST_MULTISIG_SIGNATURE_2, "0x"],
+        [public_key_pair(PRIVATE_KEY_1), public_key_pair(PRIVATE_KEY_2), ZERO_PUBLIC_KEY], TEST1_DESTINATION_ADDRESS
+    )
+    assert verify(claim)[2:] == (None, "InsufficientSignatures(0, 2)")
+
+
+@pytest.mark.parametrize("signatures, pub_keys, error_before_balance, error_after_balance", [
+    ([TEST_MULTISIG_SIGNATURE_1, "0x", "0x"], [public_key_pair(PRIVATE_KEY_1), ZERO_PUBLIC_KEY, ZERO_PUBLIC_KEY],
+     None, "InsufficientSignatures(1, 2)"),
+    ([TEST_MULTISIG_SIGNATURE_1, TEST_MULTISIG_SIGNATURE_1, "0x"], [public_key_pair(PRIVATE_KEY_1), public_key_pair(PRIVATE_KEY_2), ZERO_PUBLIC_KEY],
+     None, "InsufficientSignatures(1, 2)"),
+    ([TEST_MULTISIG_SIGNATURE_1, TEST_MULTISIG_SIGNATURE_2], [public_key_pair(PRIVATE_KEY_1), public_key_pair(PRIVATE_KEY_2), ZERO_PUBLIC_KEY],
+     "InvalidSignatureArrayLength()", None),
+    ([TEST_MULTISIG_SIGNATURE_1, TEST_MULTISIG_SIGNATURE_2], [public_key_pair(PRIVATE_KEY_1), public_key_pair(PRIVATE_KEY_2)],
+     None, "InvalidPublicKeysArraysLength()"),
+])
+def test_invalid_p2sh_claims(signatures, pub_keys, error_before_balance, error_after_balance):
+    assert verify(p2sh_claim(TEST_MULTISIG_SCRIPT, signatures, pub_keys))[2:] == (error_before_balance, error_after_balance)
+
+
+def test_p2sh_claim_with_duplicated_public_keys():
+    claim = p2sh_claim(
+        TEST_MULTISIG_SCRIPT, [TEST_MULTISIG_SIGNATURE_1, TEST_MULTISIG_SIGNATURE_1, "0x"],
+        [public_key_pair(PRIVATE_KEY_1), public_key_pair(PRIVATE_KEY_1), ZERO_PUBLIC_KEY]
+    )
+    (_, _, error_before_balance, error_after_balance) = verify(claim)
+    assert error_before_balance is None
+    assert error_after_balance.startswith("InvalidPublicKey(1, 0, ")
+
+
+@pytest.mark.parametrize("claim", [
+    claim_1(pubKey=[]),
+    claim_1(pubKey=["0x01"]),
+    claim_1(pubKey=["0x01", "0x02", "0x03"]),
+    claim_1(pubKey={"x": "0x01", "y": "0x02"}),
+    claim_1(pubKey=[1, 2]),
+    claim_1(pubKey="0xzz"),
+    claim_1(pubKey="0x02" + "00" * 32),
+    claim_1(signature=5),
+    claim_1(signature=None),
+    claim_1(destAddress=5),
+    claim_1(destAddress=None),
+    {"destAddress": TEST1_DESTINATION_ADDRESS, "pubKey": public_key_pair(PRIVATE_KEY_1)},
+    p2sh_claim(TEST_MULTISIG_SCRIPT, TEST_MULTISIG_SIGNATURE_1, [public_key_pair(PRIVATE_KEY_1)]),
+    p2sh_claim(TEST_MULTISIG_SCRIPT, [TEST_MULTISIG_SIGNATURE_1], {"0": public_key_pair(PRIVATE_KEY_1)}),
+    p2sh_claim(TEST_MULTISIG_SCRIPT, [TEST_MULTISIG_SIGNATURE_1], [[]]),
+    p2sh_claim(TEST_MULTISIG_SCRIPT, [7], [public_key_pair(PRIVATE_KEY_1)]),
+    "[1, 2]",
+    "5",
+    "not json",
+])
+def test_malformed_claims_are_invalid_input(claim):
+    (_, _, error_before_balance, error_after_balance) = verify(claim)
+    assert error_before_balance.startswith("Invalid input: ")
+    assert error_after_balance is None
+
+
+def write_claims(path, claims):
+    with open(path, "w") as claims_file:
+        claims_file.writelines((claim if isinstance(claim, str) else json.dumps(claim)) + "\n" for claim in claims)
+
+
+def run_verify_claims(monkeypatch, tmp_path, start_method="fork"):
+    """Run main with the claims.jsonl file and return the exit code and the results of the output file."""
+    write_artifact(tmp_path / "zend.json", sorted(ZEND_VAULT))
+    # The prefix must reach the pool processes also when they do not inherit the globals of the main process
+    monkeypatch.setattr(multiprocessing, "Pool", multiprocessing.get_context(start_method).Pool)
+    monkeypatch.setattr(sys, "argv", [
+        "verify_claims", str(tmp_path / "claims.jsonl"), str(tmp_path / "zend.json"), MESSAGE_PREFIX, str(tmp_path / "out.csv"),
+        "--workers", "2"
+    ])
+    exit_code = 0
+    try:
+        verify_claims.main()
+    except SystemExit as e:
+        exit_code = e.code
+    with open(tmp_path / "out.csv") as output_file:
+        return exit_code, [row[4] for row in csv.reader(output_file)]
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_verify_claims(tmp_path, monkeypatch, start_method):
+    write_claims(tmp_path / "claims.jsonl", [
+        claim_1(destAddress=TEST2_DESTINATION_ADDRESS),
+        claim_1(),
+        p2pkh_claim(TEST3_DESTINATION_ADDRESS, sign(MESSAGE_PREFIX + TEST3_DESTINATION_ADDRESS, PRIVATE_KEY_3, False), public_key_pair(PRIVATE_KEY_3)),
+        claim_1(),
+        p2sh_claim(TEST_MULTISIG_SCRIPT, [TEST_MULTISIG_SIGNATURE_1, "0x", TEST_MULTISIG_SIGNATURE_3],
+                   [public_key_pair(PRIVATE_KEY_1), ZERO_PUBLIC_KEY, public_key_pair(PRIVATE_KEY_3)]),
+    ])
+    (exit_code, results) = run_verify_claims(monkeypatch, tmp_path, start_method)
+    assert exit_code == 1
+    assert results == [
+        "SignatureNotMatching()",
+        "ok",
+        f"NothingToClaim({TEST3_ZEND_ADDRESS})",
+        f"NothingToClaim({TEST1_ZEND_ADDRESS}) - already claimed at line 2",
+        "ok",
+    ]
+
+
+def test_verify_claims_reports_malformed_lines(tmp_path, monkeypatch, capsys):
+    write_claims(tmp_path / "claims.jsonl", [
+        claim_1(pubKey=[]), claim_1(signature=5), "not json", claim_1(),
+    ])
+    (exit_code, results) = run_verify_claims(monkeypatch, tmp_path)
+    assert exit_code == 1
+    assert [result.split(":")[0] for result in results] == ["Invalid input", "Invalid input", "Invalid input", "ok"]
+    output = capsys.readouterr().out
+    assert "Valid claims: 1" in output
+    assert "Invalid input: 3 claims" in output
@@ -0,0 +1,106 @@
+import base58
+import pytest
+
+from horizen_dump_scripts.zend_keys import (SECP256K1_P, compressed_public_key, decode_hex, is_multisig_script, is_public_key,
+                                            parse_public_key, public_key_vault_keys, uncompressed_public_key, vault_key)
+
+"""
+Tests of zend_keys, with the keys of erc20-migration/test/zenclaim_test.js (zencashjs mkPrivKey of the phrases
+"chris p. bacon, defender of the guardians", "another wonderful key" and "test number 3").
+The expected vault keys were calculated with eth_keys and the pycryptodome ripemd160.
+"""
+
+TEST1_PUBLIC_KEY = "048a789e0910b6aa314f63d2cc666bd44fa4b71d7397cb5466902dc594c1a0a0d2e4d234528ff87b83f971ab2b12cd2939ff33c7846716827a5b0e8233049d8aad"
+TEST1_COMPRESSED_PUBLIC_KEY = "038a789e0910b6aa314f63d2cc666bd44fa4b71d7397cb5466902dc594c1a0a0d2"
+TEST1_VAULT_KEYS = {"compressed": "0xed86236e297e70df7bb567f7f97312d2e4240aa5", "uncompressed": "0xda46f44467949ac9321b16402c32bbeede5e3e5f"}
+
+TEST2_PUBLIC_KEY = "049b9e37abde1df7134f0827288eb6d6a0ca2bea4b199afe4b3ed82dd3f53ff1b878cfa2a25dfc5a4ac271f3c33aec82ac28fa0780d66101931d5f6f55de3e9c16"
+TEST2_COMPRESSED_PUBLIC_KEY = "029b9e37abde1df7134f0827288eb6d6a0ca2bea4b199afe4b3ed82dd3f53ff1b8"
+TEST2_VAULT_KEYS = {"compressed": "0xc507fee98a5ef1d9080f1bfd4ac59cfd68e64b92", "uncompressed": "0x692c7012597de8b2e680aa0e13def0692672e939"}
+
+TEST3_PUBLIC_KEY = "04cc15993d5d194686da28a717970fa37111b544d54583de4a2426e91aa1aabfd4cb5c6962cc695b9f1367ac49933cf75b492f4e3cec240167ccdd8f2e2e1eac72"
+TEST3_COMPRESSED_PUBLIC_KEY = "02cc15993d5d194686da28a717970fa37111b544d54583de4a2426e91aa1aabfd4"
+TEST3_VAULT_KEYS = {"compressed": "0x37c07bd323d75e05915b4d279f57fb11ad789043", "uncompressed": "0x44f8449e971edfbaa8a0f58480e565040707787e"}
+
+# 2 of 3 multisig redeem script of the uncompressed key 1, the compressed key 2 and the uncompressed key 3
+TEST_MULTISIG_SCRIPT = "52" + "41" + TEST1_PUBLIC_KEY + "21" + TEST2_COMPRESSED_PUBLIC_KEY + "41" + TEST3_PUBLIC_KEY + "53ae"
+TEST_MULTISIG_VAULT_KEY = "0x4a2c88b7d8bf151d2e66022b954bd0a2ce9943c8"
+
+TEST_VECTORS = [
+    (TEST1_PUBLIC_KEY, TEST1_COMPRESSED_PUBLIC_KEY, TEST1_VAULT_KEYS),
+    (TEST2_PUBLIC_KEY, TEST2_COMPRESSED_PUBLIC_KEY, TEST2_VAULT_KEYS),
+    (TEST3_PUBLIC_KEY, TEST3_COMPRESSED_PUBLIC_KEY, TEST3_VAULT_KEYS),
+]
+
+
+@pytest.mark.parametrize("public_key, compressed, expected_keys", TEST_VECTORS)
+def test_public_key_vault_keys(public_key, compressed, expected_keys):
+    # Both formats of the key give both addresses
+    assert public_key_vault_keys(decode_hex(public_key)) == expected_keys
+    assert public_key_vault_keys(decode_hex(compressed)) == expected_keys
+    assert public_key_vault_keys(decode_hex("0x" + compressed)) == expected_keys
+
+
+@pytest.mark.parametrize("public_key, compressed, expected_keys", TEST_VECTORS)
+def test_public_key_formats(public_key, compressed, expected_keys):
+    (x, y) = parse_public_key(decode_hex(compressed))
+    assert (x, y) == parse_public_key(decode_hex(public_key))
+    assert compressed_public_key(x, y).hex() == compressed
+    assert uncompressed_public_key(x, y).hex() == public_key
+    assert is_public_key(decode_hex(public_key)) and is_public_key(decode_hex(compressed))
+
+
+def test_vault_key_is_the_address_without_prefix():
+    # zend_to_horizen removes the 2 bytes of the network prefix from the decoded address
+    for prefix in ("2089", "1cb8", "2098"):
+        address = base58.b58encode_check(bytes.fromhex(prefix) + bytes.fromhex(TEST1_VAULT_KEYS["uncompressed"][2:]))
+        assert "0x" + base58.b58decode_check(address).hex()[4:] == vault_key(decode_hex(TEST1_PUBLIC_KEY))
+
+
+def test_multisig_script_vault_key():
+    script = decode_hex(TEST_MULTISIG_SCRIPT)
+    assert is_multisig_script(script)
+    assert not is_public_key(script)
+    assert vault_key(script) == TEST_MULTISIG_VAULT_KEY
+
+
+@pytest.mark.parametrize("script", [
+    "",
+    "52ae",
+    TEST_MULTISIG_SCRIPT[:-2],
+    "00" + TEST_MULTISIG_SCRIPT[2:],
+    TEST_MULTISIG_SCRIPT[:-4] + "00ae",
+    TEST1_PUBLIC_KEY,
+])
+def test_is_multisig_script_rejects_other_scripts(script):
+    assert not is_multisig_script(decode_hex(script))
+
+
+def off_curve_x():
+    """Return the first x without a point of the curve, x^3 + 7 is not a square."""
+    x = 1
+    while pow(x ** 3 + 7, (SECP256K1_P - 1) // 2, SECP256K1_P) == 1:
+        x = x + 1
+    return x
+
+
+@pytest.mark.parametrize("public_key, message", [
+    ("05" + TEST1_PUBLIC_KEY[2:], "Invalid public key format"),
+    ("04" + TEST1_COMPRESSED_PUBLIC_KEY[2:], "Invalid public key format"),
+    (TEST1_PUBLIC_KEY[:-2], "Invalid public key format"),
+    ("", "Invalid public key format"),
+    (TEST1_PUBLIC_KEY[:-2] + "ae", "not a point of the secp256k1 curve"),
+    ("04" + "00" * 64, "not a point of the secp256k1 curve"),
+    ("02" + "%064x" % off_curve_x(), "not a point of the secp256k1 curve"),
+    ("02" + "%064x" % SECP256K1_P, "not a point of the secp256k1 curve"),
+    ("04" + "%064x" % SECP256K1_P + TEST1_PUBLIC_KEY[66:], "not a point of the secp256k1 curve"),
+])
+def test_parse_public_key_rejects_invalid_keys(public_key, message):
+    with pytest.raises(ValueError, match=message):
+        public_key_vault_keys(decode_hex(public_key))
+
+
+@pytest.mark.parametrize("value, error", [("0xzz", ValueError), ("123", ValueError), (None, TypeError), (123, TypeError)])
+def test_decode_hex_rejects_invalid_values(value, error):
+    with pytest.raises(error):
+        decode_hex(value)